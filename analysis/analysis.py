@@ -1,33 +1,354 @@
-# Content Recommendation Modules
-import numpy as np
-import pandas as pd
-import scipy.sparse as sp
-from implicit.als import AlternatingLeastSquares
 # Sentiment Analysis Modules
-from nltk import download as nltk_download
-from nltk import tokenize
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from sklearn.model_selection import train_test_split
+# NLTK (and the vectorized kernel built on it) is slow to import, so it is only imported on first use.
+from __future__ import annotations
+
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from math import sqrt
+from os import getenv, path
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import numpy as np
+
+from analysis.cache import SentimentCache, content_hash
+
+if TYPE_CHECKING:
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+    from analysis.vectorized import VectorizedVader
+
+# Bundled NLTK resources. Populate with `python -m util.download_nltk_data` to start without network access.
+NLTK_DATA_PATH = path.join(
+    path.dirname(path.dirname(path.abspath(__file__))), "data", "nltk_data"
+)
+# NLTK package -> the resource path it provides
+NLTK_RESOURCES = {
+    "vader_lexicon": "sentiment/vader_lexicon.zip",
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+}
+
+_nltk_loaded = False
+
+
+def load_nltk() -> None:
+    """Make the NLTK resources available, preferring the bundled copies. Missing resources are downloaded into
+    the bundled path, unless the environment variable NLTK_OFFLINE is 'true', in which case a LookupError is
+    raised instead."""
+    global _nltk_loaded
+    if _nltk_loaded:
+        return
+
+    import nltk
+
+    if NLTK_DATA_PATH not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_PATH)
+
+    for package in nltk_packages():
+        if _has_nltk_resource(NLTK_RESOURCES[package]):
+            continue
+        if getenv("NLTK_OFFLINE") == "true":
+            raise LookupError(
+                f"NLTK resource '{package}' not found in {NLTK_DATA_PATH} (offline mode)"
+            )
+        nltk.download(package, download_dir=NLTK_DATA_PATH, quiet=True)
+
+    _nltk_loaded = True
+
+
+def nltk_packages() -> list[str]:
+    """Return the NLTK packages the installed NLTK version reads. Since NLTK 3.8.2 the sentence tokenizer loads
+    'punkt_tab' instead of 'punkt'."""
+    from nltk.tokenize import punkt
+
+    tokenizer = "punkt_tab" if hasattr(punkt, "PunktTokenizer") else "punkt"
+    return ["vader_lexicon", tokenizer]
+
+
+def _has_nltk_resource(resource: str) -> bool:
+    import nltk
+
+    try:
+        nltk.data.find(resource)
+        return True
+    except LookupError:
+        return False
+
+
+def text_chunks(text: str, size: int = 4096) -> Iterator[str]:
+    """Yield `text` in pieces of `size` characters."""
+    for i in range(0, len(text), size):
+        yield text[i : i + size]
+
+
+def iter_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield the sentences of text arriving in `chunks`, only holding the current unfinished sentence in memory."""
+    from nltk import tokenize
+
+    load_nltk()
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        lines = tokenize.sent_tokenize(buffer)
+        # the last sentence may continue in the next chunk
+        yield from lines[:-1]
+        buffer = buffer[buffer.rfind(lines[-1]) :] if lines else buffer
+    yield from tokenize.sent_tokenize(buffer)
+
+
+class RunningMean:
+    """Mean and variance of a stream of values (Welford's algorithm)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def half_width(self, z: float = 1.96) -> float:
+        """Half width of the confidence interval of the mean (95% by default)."""
+        if self.count < 2:
+            return float("inf")
+        return z * sqrt(self._m2 / (self.count - 1) / self.count)
+
+
+class SentimentScorer:
+    """Long-lived sentiment scorer. The VADER lexicon is loaded once, on first use, and reused for every call.
+    If `vectorized`, sentences are scored with the NumPy kernel in `analysis.vectorized` instead of one at a time.
+    If a `cache` is attached, texts and sentences that have been scored before are not scored again.
+    """
 
-nltk_download("vader_lexicon")
-nltk_download("punkt")
+    # Texts longer than this (characters) are scored incrementally with `score_stream`
+    STREAM_THRESHOLD = 20_000
+    # Minimum number of sentences before a streamed score may stop early on a narrow confidence interval
+    MIN_SENTENCES = 10
+
+    def __init__(
+        self,
+        vectorized: bool = False,
+        cache: SentimentCache | None = None,
+        max_sentences: int | None = None,
+        confidence_width: float | None = None,
+    ):
+        self.vectorized = vectorized
+        self.cache = cache
+        self.max_sentences = max_sentences
+        self.confidence_width = confidence_width
+        self._analyzer: SentimentIntensityAnalyzer | None = None
+        self._kernel: VectorizedVader | None = None
+
+    @property
+    def analyzer(self) -> SentimentIntensityAnalyzer:
+        if self._analyzer is None:
+            from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+            load_nltk()
+            self._analyzer = SentimentIntensityAnalyzer()
+        return self._analyzer
+
+    @property
+    def kernel(self) -> VectorizedVader:
+        if self._kernel is None:
+            from analysis.vectorized import VectorizedVader
+
+            self._kernel = VectorizedVader.from_analyzer(self.analyzer)
+        return self._kernel
+
+    def sentence_scores(self, sentences: list[str]) -> list[float]:
+        """Return the compound score of each sentence."""
+        if self.vectorized:
+            return self.kernel.polarity_compound(sentences).tolist()
+        polarity_scores = self.analyzer.polarity_scores
+        return [polarity_scores(sentence)["compound"] for sentence in sentences]
+
+    def text_key(self, text: str) -> str:
+        """Cache key of the score of `text`. Scores from the exact and vectorized kernels are kept apart, and the
+        key of a text long enough to be streamed includes the limits it is streamed with, as those make its score an
+        estimate."""
+        key = ("tv" if self.vectorized else "te") + content_hash(text)
+        if len(text) > self.STREAM_THRESHOLD:
+            key = f"{key}:{self.max_sentences}:{self.confidence_width}"
+        return key
+
+    def sentence_key(self, sentence: str) -> str:
+        """Cache key of the score of one sentence, kept apart per kernel."""
+        return ("sv" if self.vectorized else "se") + content_hash(sentence)
+
+    def score(self, text: str) -> float:
+        """Return the mean compound score of the sentences in `text`."""
+        return self.score_batch([text])[0]
+
+    def stream_scores(
+        self,
+        chunks: Iterable[str],
+        max_sentences: int | None = None,
+        confidence_width: float | None = None,
+        batch_size: int = 16,
+    ) -> Iterator[RunningMean]:
+        """Score text arriving in `chunks` sentence by sentence, yielding the running mean after every batch of
+        `batch_size` sentences. Stops after `max_sentences` sentences, or once the 95% confidence interval of the
+        mean is narrower than +/- `confidence_width`."""
+        estimate = RunningMean()
+        batch = []
+        for sentence in iter_sentences(chunks):
+            batch.append(sentence)
+            if (
+                max_sentences is not None
+                and estimate.count + len(batch) >= max_sentences
+            ):
+                break
+            if len(batch) >= batch_size:
+                for score in self.sentence_scores(batch):
+                    estimate.add(score)
+                batch = []
+                yield estimate
+                if (
+                    confidence_width is not None
+                    and estimate.count >= self.MIN_SENTENCES
+                    and estimate.half_width() <= confidence_width
+                ):
+                    return
+        if batch:
+            for score in self.sentence_scores(batch):
+                estimate.add(score)
+            yield estimate
+
+    def score_stream(
+        self,
+        chunks: Iterable[str],
+        max_sentences: int | None = None,
+        confidence_width: float | None = None,
+    ) -> float:
+        """Return the (estimated) mean compound score of text arriving in `chunks`. See `stream_scores`."""
+        estimate = RunningMean()
+        for estimate in self.stream_scores(chunks, max_sentences, confidence_width):
+            pass
+        return estimate.mean
+
+    def score_batch(self, texts: list[str], processes: int = 0) -> list[float]:
+        """Return the score of each text in `texts`. If `processes` > 1, sentences are scored by a pool of that many
+        worker processes."""
+        from nltk import tokenize
+
+        load_nltk()
+        text_keys = [self.text_key(text) for text in texts]
+        scores = self.cache.get_many(text_keys) if self.cache is not None else {}
+
+        # split the texts that are not cached into sentences, scoring each distinct sentence once
+        lines: dict[str, list[str]] = {}
+        sentences: dict[str, str] = {}
+        streamed = {}
+        for key, text in zip(text_keys, texts):
+            if key in scores or key in lines or key in streamed:
+                continue
+            if len(text) > self.STREAM_THRESHOLD:
+                # bound the memory and time spent on very long articles
+                streamed[key] = self.score_stream(
+                    text_chunks(text), self.max_sentences, self.confidence_width
+                )
+            else:
+                text_lines = tokenize.sent_tokenize(text)
+                lines[key] = [self.sentence_key(line) for line in text_lines]
+                sentences.update(zip(lines[key], text_lines))
+        sentence_scores = (
+            self.cache.get_many(list(sentences))
+            if self.cache is not None and sentences
+            else {}
+        )
+        missing = [key for key in sentences if key not in sentence_scores]
+        computed = dict(
+            zip(
+                missing,
+                self._compute([sentences[key] for key in missing], processes),
+            )
+        )
+        sentence_scores.update(computed)
+
+        new_scores = streamed
+        for key, line_keys in lines.items():
+            values = [sentence_scores[line_key] for line_key in line_keys]
+            new_scores[key] = float(np.mean(values)) if len(values) > 0 else 0.0
+        scores.update(new_scores)
+
+        if self.cache is not None and (computed or new_scores):
+            self.cache.put_many({**computed, **new_scores})
+
+        return [scores[key] for key in text_keys]
+
+    def _compute(self, sentences: list[str], processes: int) -> list[float]:
+        """Score sentences, in this process or split across a process pool."""
+        if processes > 1 and len(sentences) > 1:
+            chunk_size = -(-len(sentences) // processes)  # ceiling division
+            chunks = [
+                sentences[i : i + chunk_size]
+                for i in range(0, len(sentences), chunk_size)
+            ]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                return [
+                    score
+                    for chunk in executor.map(
+                        _score_sentences, chunks, [self.vectorized] * len(chunks)
+                    )
+                    for score in chunk
+                ]
+        return self.sentence_scores(sentences)
+
+
+_scorers = {False: SentimentScorer(), True: SentimentScorer(vectorized=True)}
+
+
+def get_scorer(vectorized: bool = False) -> SentimentScorer:
+    """Return the shared sentiment scorer of this process."""
+    return _scorers[vectorized]
+
+
+def enable_sentiment_cache(path: str, capacity: int = 500_000) -> SentimentCache:
+    """Attach a persistent cache, stored at `path`, to the shared sentiment scorers."""
+    cache = SentimentCache(path, capacity)
+    atexit.register(cache.flush)
+    for scorer in _scorers.values():
+        scorer.cache = cache
+    return cache
+
+
+def set_sentiment_limits(
+    max_sentences: int | None, confidence_width: float | None
+) -> None:
+    """Limit how many sentences of a long text the shared sentiment scorers read. See `stream_scores`."""
+    for scorer in _scorers.values():
+        scorer.max_sentences = max_sentences
+        scorer.confidence_width = confidence_width
+
+
+def _score_sentences(sentences: list[str], vectorized: bool) -> list[float]:
+    """Score a chunk of sentences inside a worker process."""
+    return get_scorer(vectorized).sentence_scores(sentences)
 
 
 def sentiment_label(text: str) -> dict:
     """Returns a dictionary with the appropriate label and score for the text."""
-    sid = SentimentIntensityAnalyzer()
-    lines_list = tokenize.sent_tokenize(text)
-    sid = SentimentIntensityAnalyzer()
-    score = []
-    for line in lines_list:
-        analysis = sid.polarity_scores(line)
-        score.append(analysis["compound"])
-
-    score = np.mean(np.array(score))
+    score = get_scorer().score(text)
 
     return {"score": score, "label": sentiment_score_to_text(score)}
 
 
+def sentiment_label_batch(
+    texts: list[str], processes: int = 0, vectorized: bool = False
+) -> list[dict]:
+    """Returns `sentiment_label` for every text in `texts`, in order. If `processes` > 1, sentences are scored by a
+    pool of that many worker processes. If `vectorized`, the NumPy kernel is used."""
+    scores = get_scorer(vectorized).score_batch(texts, processes)
+
+    return [
+        {"score": score, "label": sentiment_score_to_text(score)} for score in scores
+    ]
+
+
 def sentiment_score_to_text(score: float) -> str:
     """Given a sentiment score, return the appropriate label."""
     if score >= 0.5:
@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import unicodedata
+from hashlib import blake2b
+from time import time
+
+# Largest number of variables bound in one SQLite statement
+_BATCH = 500
+# Cache hits whose last used time is kept in memory before being written
+_TOUCH_BATCH = 1000
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing, so that re-scraped copies of the same story share a key. Case is kept as
+    VADER treats capitalised words differently."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_hash(text: str) -> str:
+    """Return the hash of the normalized text."""
+    return blake2b(normalize_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SentimentCache:
+    """Persistent sentiment scores keyed by a hash of the normalized text, stored in SQLite. When more than
+    `capacity` entries are stored, the least recently used ones are evicted. The last used times of cache hits are
+    written in batches, with the next stored scores, rather than on every lookup."""
+
+    def __init__(self, path: str, capacity: int = 500_000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS SentimentCache "
+            "(hash TEXT PRIMARY KEY, score REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_SentimentCache_last_used "
+            "ON SentimentCache (last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COUNT(*) FROM SentimentCache"
+        ).fetchone()[0]
+        self._touched: dict[str, float] = {}
+
+    def get_many(self, keys: list[str]) -> dict[str, float]:
+        """Return the cached score of every key that is present, marking them as recently used."""
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _BATCH):
+                chunk = keys[i : i + _BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT hash, score FROM SentimentCache WHERE hash IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+            now = time()
+            self._touched.update(dict.fromkeys(found, now))
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._write_touched()
+                self._conn.commit()
+        return found
+
+    def flush(self) -> None:
+        """Write the last used times of the cache hits not written yet."""
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+
+    def _write_touched(self) -> None:
+        """Write the pending last used times. Must hold the lock; DOES NOT commit."""
+        self._conn.executemany(
+            "UPDATE SentimentCache SET last_used = ? WHERE hash = ?",
+            [(last_used, key) for key, last_used in self._touched.items()],
+        )
+        self._touched = {}
+
+    def put_many(self, scores: dict[str, float]) -> None:
+        """Store the given scores, then evict the least recently used entries if over capacity."""
+        now = time()
+        with self._lock:
+            # eviction orders by last use, so it must see every hit
+            self._write_touched()
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO SentimentCache (hash, score, last_used) VALUES (?, ?, ?)",
+                [(key, score, now) for key, score in scores.items()],
+            ).rowcount
+            self._size += max(inserted, 0)
+            if self._size > self.capacity:
+                self._conn.execute(
+                    "DELETE FROM SentimentCache WHERE hash IN "
+                    "(SELECT hash FROM SentimentCache ORDER BY last_used LIMIT ?)",
+                    (self._size - self.capacity,),
+                )
+                self._size = self.capacity
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every cached score."""
+        with self._lock:
+            self._conn.execute("DELETE FROM SentimentCache")
+            self._conn.commit()
+            self._size = 0
+            self._touched = {}
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,310 @@
+"""Vectorized, VADER-compatible sentiment scoring.
+
+The lexicon is compiled once into token-id -> valence arrays. A batch of sentences is tokenized into flat
+per-token arrays, and the VADER rules (capitalization, boosters, negation, "never so", idioms, "least", "but"
+and punctuation emphasis) are applied as NumPy operations over the whole batch.
+
+Compound scores match `SentimentIntensityAnalyzer.polarity_scores` within `TOLERANCE`; the only expected
+differences come from floating point summation order before the compound score is rounded.
+"""
+
+import string
+
+import numpy as np
+from nltk import tokenize
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+
+# Maximum absolute difference from the NLTK compound score of a sentence
+TOLERANCE = 1e-4
+
+_PUNCTUATION = set(string.punctuation)
+
+
+class VectorizedVader:
+    """VADER scorer operating on batches of sentences at once."""
+
+    def __init__(self, lexicon: dict[str, float]):
+        constants = VaderConstants()
+        self.constants = constants
+
+        # Vocabulary of lower-case words. Id 0 is reserved for words the rules know nothing about.
+        words = set(lexicon) | set(constants.BOOSTER_DICT) | constants.NEGATE
+        words |= {"kind", "of", "least", "at", "very", "but"}
+        self.ids: dict[str, int] = {
+            word: i for i, word in enumerate(sorted(words), start=1)
+        }
+
+        size = len(self.ids) + 1
+        self.valence = np.zeros(size)
+        self.in_lexicon = np.zeros(size, dtype=bool)
+        self.booster = np.zeros(size)
+        self.is_booster = np.zeros(size, dtype=bool)
+        self.negate = np.zeros(size, dtype=bool)
+        for word, i in self.ids.items():
+            if word in lexicon:
+                self.valence[i] = lexicon[word]
+                self.in_lexicon[i] = True
+            if word in constants.BOOSTER_DICT:
+                self.booster[i] = constants.BOOSTER_DICT[word]
+                self.is_booster[i] = True
+            self.negate[i] = word in constants.NEGATE or "n't" in word
+
+        # Case-sensitive words used by the multi-word rules (idioms, booster bi-grams, "never so/this")
+        phrases = [tuple(idiom.split()) for idiom in constants.SPECIAL_CASE_IDIOMS]
+        self.booster_bigrams = [
+            tuple(key.split()) for key in constants.BOOSTER_DICT if " " in key
+        ]
+        self.idioms = [
+            (phrase, value)
+            for phrase, value in zip(phrases, constants.SPECIAL_CASE_IDIOMS.values())
+        ]
+        phrase_words = {"never", "so", "this"}
+        for phrase in phrases + self.booster_bigrams:
+            phrase_words.update(phrase)
+        self.phrase_ids: dict[str, int] = {
+            word: i for i, word in enumerate(sorted(phrase_words))
+        }
+
+    @classmethod
+    def from_analyzer(cls, analyzer: SentimentIntensityAnalyzer):
+        """Compile the lexicon of an existing NLTK analyzer."""
+        return cls(analyzer.lexicon)
+
+    @staticmethod
+    def tokenize(sentence: str) -> list[str]:
+        """Split a sentence into words the same way as VADER: whitespace separated, single characters removed
+        and one leading or trailing punctuation sequence stripped from otherwise punctuation-free words.
+        """
+        words = []
+        for word in sentence.split():
+            if len(word) <= 1:
+                continue
+            if word[0] in _PUNCTUATION or word[-1] in _PUNCTUATION:
+                for punc in VaderConstants.PUNC_LIST:
+                    if word.startswith(punc):
+                        stripped = word[len(punc) :]
+                    elif word.endswith(punc):
+                        stripped = word[: -len(punc)]
+                    else:
+                        continue
+                    if len(stripped) > 1 and not _PUNCTUATION.intersection(stripped):
+                        word = stripped
+                        break
+            words.append(word)
+        return words
+
+    def polarity_compound(self, sentences: list[str]) -> np.ndarray:
+        """Return the VADER compound score of every sentence."""
+        sentence_count = len(sentences)
+        # flat per-word lists over the whole batch
+        ids, upper, nt, phrase = [], [], [], []
+        first, sentence_of, position = [], [], []
+        get_id, get_phrase = self.ids.get, self.phrase_ids.get
+        for s, sentence in enumerate(sentences):
+            offset = len(ids)
+            first_seen: dict[str, int] = {}
+            for i, word in enumerate(self.tokenize(sentence)):
+                lower = word.lower()
+                ids.append(get_id(lower, 0))
+                upper.append(word.isupper())
+                nt.append("n't" in lower)
+                phrase.append(get_phrase(word, -1))
+                first.append(first_seen.setdefault(word, offset + i))
+                sentence_of.append(s)
+                position.append(i)
+
+        compound = np.zeros(sentence_count)
+        if len(ids) == 0:
+            return compound
+
+        ids = np.array(ids)
+        upper = np.array(upper)
+        phrase = np.array(phrase)
+        first = np.array(first)
+        sentence_of = np.array(sentence_of)
+        position = np.array(position)
+        index = np.arange(len(ids))
+
+        lengths = np.bincount(sentence_of, minlength=sentence_count)
+        caps = np.bincount(sentence_of, weights=upper, minlength=sentence_count)
+        cap_diff = ((lengths - caps > 0) & (lengths - caps < lengths))[sentence_of]
+        remaining = lengths[sentence_of] - position
+
+        def back(values: np.ndarray, k: int, fill) -> np.ndarray:
+            """`values` of the word `k` places before each word (`fill` at the start of a sentence)."""
+            out = np.full(len(values), fill, dtype=values.dtype)
+            valid = position >= k
+            out[valid] = values[index[valid] - k]
+            return out
+
+        def ahead(values: np.ndarray, k: int, fill) -> np.ndarray:
+            """`values` of the word `k` places after each word (`fill` at the end of a sentence)."""
+            out = np.full(len(values), fill, dtype=values.dtype)
+            valid = remaining > k
+            out[valid] = values[index[valid] + k]
+            return out
+
+        def word_is(word: str) -> np.ndarray:
+            return ids == self.ids[word]
+
+        def phrase_is(values: np.ndarray, word: str) -> np.ndarray:
+            return values == self.phrase_ids[word]
+
+        c = self.constants
+        lex = self.in_lexicon[ids]
+        negated = self.negate[ids] | np.array(nt)
+        booster = self.booster[ids]
+        is_booster = self.is_booster[ids]
+
+        # Boosters and "kind of" carry no valence of their own
+        skip = is_booster | (word_is("kind") & ahead(word_is("of"), 1, False))
+        scored = lex & ~skip
+
+        valence = np.where(scored, self.valence[ids], 0.0)
+        capped = scored & upper & cap_diff
+        valence = np.where(
+            capped,
+            np.where(valence > 0, valence + c.C_INCR, valence - c.C_INCR),
+            valence,
+        )
+
+        phrase_back = [phrase] + [back(phrase, k, -1) for k in range(1, 4)]
+        never_so = [
+            phrase_is(phrase_back[k], "so") | phrase_is(phrase_back[k], "this")
+            for k in range(4)
+        ]
+        for start_i, dampen in enumerate((1.0, 0.95, 0.9)):
+            k = start_i + 1
+            active = scored & (position > start_i) & ~back(lex, k, True)
+
+            # booster / dampener words preceding the item
+            prev_booster = back(is_booster, k, False)
+            scalar = back(booster, k, 0.0)
+            scalar = np.where(valence < 0, -scalar, scalar)
+            scalar = np.where(
+                prev_booster & back(upper, k, False) & cap_diff,
+                np.where(valence > 0, scalar + c.C_INCR, scalar - c.C_INCR),
+                scalar,
+            )
+            valence = np.where(active, valence + scalar * dampen, valence)
+
+            # negation
+            prev_negated = back(negated, k, False)
+            if start_i == 0:
+                valence = np.where(active & prev_negated, valence * c.N_SCALAR, valence)
+            elif start_i == 1:
+                emphasis = phrase_is(phrase_back[2], "never") & never_so[1]
+                valence = np.where(
+                    active & emphasis,
+                    valence * 1.5,
+                    np.where(active & prev_negated, valence * c.N_SCALAR, valence),
+                )
+            else:
+                emphasis = (
+                    phrase_is(phrase_back[3], "never") & never_so[2]
+                ) | never_so[1]
+                valence = np.where(
+                    active & emphasis,
+                    valence * 1.25,
+                    np.where(active & prev_negated, valence * c.N_SCALAR, valence),
+                )
+                valence = self._idioms_check(
+                    valence, active, phrase, phrase_back, ahead
+                )
+
+        # negation using "least"
+        after_least = word_is("least")
+        after_least = back(after_least, 1, False) & ~back(lex, 1, True)
+        at_very = back(word_is("at") | word_is("very"), 2, False)
+        least = scored & after_least & (((position > 1) & ~at_very) | (position == 1))
+        valence = np.where(least, valence * c.N_SCALAR, valence)
+
+        # repeated words are scored in the context of their first occurrence
+        sentiments = valence[first]
+
+        # words before the first "but" are halved, words after it are amplified
+        but = word_is("but")
+        but_position = np.full(sentence_count, len(ids))
+        np.minimum.at(but_position, sentence_of[but], position[but])
+        has_but = but_position < len(ids)
+        word_but = but_position[sentence_of]
+        sentiments = np.where(
+            has_but[sentence_of],
+            np.where(
+                position < word_but,
+                sentiments * 0.5,
+                np.where(position > word_but, sentiments * 1.5, sentiments),
+            ),
+            sentiments,
+        )
+
+        total = np.bincount(sentence_of, weights=sentiments, minlength=sentence_count)
+        amplifier = np.array([self._punctuation_emphasis(s) for s in sentences])
+        total = np.where(
+            total > 0, total + amplifier, np.where(total < 0, total - amplifier, total)
+        )
+        compound = total / np.sqrt(total * total + 15)
+        return np.where(lengths > 0, np.round(compound, 4), 0.0)
+
+    def _idioms_check(self, valence, active, phrase, phrase_back, ahead) -> np.ndarray:
+        """Special case idioms and booster bi-grams such as 'kind of' around each word."""
+        p0, p1, p2, p3 = phrase_back
+        f1, f2 = ahead(phrase, 1, -1), ahead(phrase, 2, -1)
+
+        def matches(sequence: tuple, words: tuple) -> np.ndarray:
+            if len(sequence) != len(words) or any(
+                w not in self.phrase_ids for w in words
+            ):
+                return np.zeros(len(valence), dtype=bool)
+            out = np.ones(len(valence), dtype=bool)
+            for values, word in zip(sequence, words):
+                out &= values == self.phrase_ids[word]
+            return out
+
+        def idiom_value(sequence: tuple) -> tuple[np.ndarray, np.ndarray]:
+            found = np.zeros(len(valence), dtype=bool)
+            value = np.zeros(len(valence))
+            for words, idiom in self.idioms:
+                match = matches(sequence, words) & ~found
+                value[match] = idiom
+                found |= match
+            return found, value
+
+        # the first matching preceding sequence wins, so apply them in reverse order
+        preceding = [(p1, p0), (p2, p1, p0), (p2, p1), (p3, p2, p1), (p3, p2)]
+        result = valence
+        for sequence in reversed(preceding):
+            found, value = idiom_value(sequence)
+            result = np.where(active & found, value, result)
+        for sequence in [(p0, f1), (p0, f1, f2)]:
+            found, value = idiom_value(sequence)
+            result = np.where(active & found, value, result)
+
+        bigram = np.zeros(len(valence), dtype=bool)
+        for words in self.booster_bigrams:
+            bigram |= matches((p3, p2), words) | matches((p2, p1), words)
+        return np.where(active & bigram, result + self.constants.B_DECR, result)
+
+    @staticmethod
+    def _punctuation_emphasis(sentence: str) -> float:
+        """Emphasis added by exclamation points and question marks."""
+        question_marks = sentence.count("?")
+        if question_marks <= 1:
+            question_amplifier = 0
+        elif question_marks <= 3:
+            question_amplifier = question_marks * 0.18
+        else:
+            question_amplifier = 0.96
+        return min(sentence.count("!"), 4) * 0.292 + question_amplifier
+
+    def score_batch(self, texts: list[str]) -> list[float]:
+        """Return the mean compound score of the sentences of each text in `texts`."""
+        sentences = [tokenize.sent_tokenize(text) for text in texts]
+        compound = self.polarity_compound([s for lines in sentences for s in lines])
+        counts = np.array([len(lines) for lines in sentences], dtype=int)
+        text_of = np.repeat(np.arange(len(texts)), counts)
+        totals = np.bincount(text_of, weights=compound, minlength=len(texts))
+        return [
+            float(total / count) if count > 0 else 0.0
+            for total, count in zip(totals, counts)
+        ]
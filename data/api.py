@@ -1,9 +1,7 @@
 from datetime import datetime, timedelta
 from os import getenv
 
-import yfinance as yf
 from aiohttp import ClientSession
-from newspaper import Article
 
 
 async def get_company_info(symbol: str) -> dict:
@@ -11,7 +9,9 @@ async def get_company_info(symbol: str) -> dict:
     Returns a dictionary with the company's name, website, description, location, market cap, CEO, and sector.
     If the company is not found, returns an empty dictionary."""
     try:
-        # first try to get the info from yfinance
+        # first try to get the info from yfinance (slow to import, so loaded on first use)
+        import yfinance as yf
+
         info = yf.Ticker(symbol).info
         ceo = info.get("companyOfficers", "")
         ceo = (
@@ -50,34 +50,22 @@ async def get_company_info(symbol: str) -> dict:
 
 async def get_stock_info(symbol: str) -> dict:
     """Get stock info given a stock symbol.
-    Returns a dictionary with the stock's price, open, high, low, volume, and previous close.
-    If the stock is not found, returns an empty dictionary."""
+    Returns a dictionary with the stock's market cap, exchange, and price series of the last day, week, month and
+    year as (unix timestamp, close) pairs, oldest first. If the stock is not found, the series are empty.
+    """
     try:
         # first try to get the info from yfinance
         # TODO: multithreading/async?
+        import yfinance as yf
+
         ticker = yf.Ticker(symbol)
+        # need to use 5d for the last 24 hours as 1d cuts off at midnight
+        hourly = history_points(ticker, "5d", "1h")
         return {
-            "stock_day": (
-                # get the last 24 hours of stock data (need to use 5d interval as 1d cuts off at midnight)
-                ticker.history(period="5d", interval="1h")["Close"].to_list()[-24:]
-                if len(ticker.history(period="5d", interval="1h")) > 0
-                else []  # if no data, return an empty list
-            ),
-            "stock_week": (
-                ticker.history(period="5d", interval="1h")["Close"].to_list()
-                if len(ticker.history(period="5d", interval="1h")) > 0
-                else []
-            ),
-            "stock_month": (
-                ticker.history(period="1mo", interval="1d")["Close"].to_list()
-                if len(ticker.history(period="1mo", interval="1d")) > 0
-                else []
-            ),
-            "stock_year": (
-                ticker.history(period="1y", interval="1wk")["Close"].to_list()
-                if len(ticker.history(period="1y", interval="1wk")) > 0
-                else []
-            ),
+            "stock_day": hourly[-24:],
+            "stock_week": hourly,
+            "stock_month": history_points(ticker, "1mo", "1d"),
+            "stock_year": history_points(ticker, "1y", "1wk"),
             "market_cap": ticker.info.get("marketCap", ""),
             "exchange": ticker.info.get("exchange", ""),
         }
@@ -95,8 +83,16 @@ async def get_stock_info(symbol: str) -> dict:
         }
 
 
-async def get_stock_period(symbol: str, period: str, num: int, interval="") -> list:
-    """Get stock info for a given period."""
+def history_points(ticker, period: str, interval: str) -> list[tuple[float, float]]:
+    """(unix timestamp, close) pairs of a yfinance ticker's history."""
+    closes = ticker.history(period=period, interval=interval)["Close"]
+    return [(time.timestamp(), close) for time, close in closes.items()]
+
+
+async def get_stock_period(
+    symbol: str, period: str, num: int, interval=""
+) -> list[tuple[float, float]]:
+    """Get the last `num` (unix timestamp, close) pairs of a stock for a given period, oldest first."""
     # ping alphavantage for stock data
     url = (
         f"https://www.alphavantage.co/query?function={period}&symbol={symbol}&interval={interval}&apikey={getenv('ALPHAVANTAGE_API_KEY')}"
@@ -111,15 +107,13 @@ async def get_stock_period(symbol: str, period: str, num: int, interval="") -> l
                     key for key in data.keys() if "Time Series" in key
                 ]  # get the time series key
 
-                return (
-                    [
-                        float(entry["4. close"])  # only get close prive
-                        for entry in list(data[keys[0]].values())[
-                            :num
-                        ]  # get the last num entries
-                    ]
-                    if len(keys) > 0
-                    else []
+                if len(keys) == 0:
+                    return []
+                # entries are keyed by date (or date and time), newest first
+                entries = list(data[keys[0]].items())[:num]
+                return sorted(
+                    (datetime.fromisoformat(time).timestamp(), float(entry["4. close"]))
+                    for time, entry in entries
                 )
             else:
                 return []
@@ -263,7 +257,9 @@ async def get_symbols(name: str) -> list[str]:
 def get_article_content(url: str) -> str:
     """Get the text of an article given its url."""
     try:
-        # use newspaper4 to get the article text
+        # use newspaper4 to get the article text (slow to import, so loaded on first use)
+        from newspaper import Article
+
         article = Article(url, language="en")
         article.download()
         article.parse()
@@ -1,21 +1,65 @@
 from __future__ import annotations
 
-from datetime import datetime
+import html
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-import scipy.sparse as sp
+import numpy as np
 import werkzeug.security
 from flask_sqlalchemy import SQLAlchemy
-from implicit.als import AlternatingLeastSquares
-from joblib import dump, load
-from sqlalchemy import and_, desc
+from sqlalchemy import (
+    LargeBinary,
+    TypeDecorator,
+    desc,
+    event,
+    literal,
+    select,
+    text,
+)
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, selectinload
 
 from analysis.analysis import sentiment_label, sentiment_score_to_text
 from data.api import get_article_content
+from data.recommender import (
+    interactions,
+    precompute_recommendations,
+    registry,
+    sector_index,
+    trainer,
+)
+from server import constants
 
 # Create database
 db = SQLAlchemy()
 
 
+@contextmanager
+def unit_of_work():
+    """Group every change made inside the block into one transaction, committed when the block ends or rolled back
+    if it raises. Nested blocks join the outermost one. Model methods never commit themselves; fetch from APIs
+    before entering the block, so the database is not locked while waiting on the network.
+    """
+    depth = db.session.info.get("unit_of_work", 0)
+    db.session.info["unit_of_work"] = depth + 1
+    try:
+        yield db.session
+        if depth == 0:
+            db.session.commit()
+    except BaseException:
+        if depth == 0:
+            db.session.rollback()
+        raise
+    finally:
+        db.session.info["unit_of_work"] = depth
+
+
+# A price series as given to Stock: (unix timestamp, close) pairs, oldest first
+PriceSeriesPoints = list[tuple[float, float]] | np.ndarray
+
+
 class User(db.Model):
     __tablename__ = "User"
 
@@ -27,6 +71,8 @@ class User(db.Model):
     hard_ready = db.Column(db.Integer, default=-5)
     # Starts at -k. When the user follow k companies it is ready to be included in hard training
     # when it exceeds k then the user needs to be retrained.
+    recommendations_stale = db.Column(db.Boolean, default=True)
+    # True when the user's follows have changed since their UserRecommendation rows were computed
 
     def __init__(self, email: str, name: str, password: str, opt_email: bool = False):
         self.email = email
@@ -34,6 +80,7 @@ class User(db.Model):
         self.password = werkzeug.security.generate_password_hash(password)
         self.opt_email = opt_email
         self.hard_ready = -5
+        self.recommendations_stale = True
 
     def update_password(self, password: str) -> None:
         """Update this user's password."""
@@ -69,7 +116,6 @@ class User(db.Model):
         ):
             db.session.add(UserSector(user_id=self.id, sector_id=sector_id))
             db.session.commit()
-            self.set_distances()  # Distance need to be recalculated
         return db.session.query(Sector).where(Sector.id == sector_id).first()
 
     def remove_sector(self, sector_id: int) -> None:
@@ -78,7 +124,6 @@ class User(db.Model):
             UserSector.user_id == self.id, UserSector.sector_id == sector_id
         ).delete()
         db.session.commit()
-        self.set_distances()  # Distance need to be recalculated
 
     def get_companies(self) -> list[Company]:
         """Return list of companies this user is interested in."""
@@ -99,11 +144,12 @@ class User(db.Model):
             .first()
         )
 
+        self.recommendations_stale = True
         if current:
             if (
                 current.distance != -2 or self.hard_ready > 0
             ):  # Make sure the user is not refollowing again since this would not count as new activty
-                self.hard_ready += 1  # User has increased its activity by one
+                self.add_activity()  # User has increased its activity by one
             db.session.query(UserCompany).filter_by(
                 user_id=self.id, company_id=company_id
             ).update({"distance": -1})
@@ -113,8 +159,9 @@ class User(db.Model):
             db.session.add(
                 UserCompany(user_id=self.id, company_id=company_id, distance=-1)
             )
-            self.hard_ready += 1  # User has increased its activity by one
+            self.add_activity()  # User has increased its activity by one
             db.session.commit()
+        interactions.set(self.id, company_id, 1)
 
         if self.hard_ready == 0:
             self.hard_train(
@@ -130,76 +177,51 @@ class User(db.Model):
         )
 
         if existing_record:
+            self.recommendations_stale = True
             if (
                 self.hard_ready > 0
             ):  # Make sure the user is not unfollowing since this would not count as new activty
-                self.hard_ready += 1
+                self.add_activity()
             existing_record.distance = (
                 -2
             )  # Note that the user has unfollowed this company for recommendation purpouses
         db.session.commit()
+        if existing_record:
+            interactions.set(self.id, company_id, -1)
 
         if self.hard_ready == 0:
             self.hard_train(
                 True
             )  # User is finally ready to train since it has enough activity
 
-    def set_distances(self):
-        # get list of all companies a user is not following
-        non_followed = (
-            db.session.query(Company.id)
-            .outerjoin(
-                UserCompany,
-                and_(
-                    UserCompany.user_id == self.id, Company.id == UserCompany.company_id
-                ),
-            )
-            .filter((UserCompany.user_id == None) | (UserCompany.distance != -1))
-            .all()
-        )  # Get all companies the user doesn't follow
-
-        for company in non_followed:
-            # compute distance between user and company
-            distance = (
-                db.session.query(UserSector)
-                .outerjoin(
-                    CompanySector,
-                    and_(
-                        UserSector.user_id == self.id,
-                        CompanySector.company_id == company[0],
-                        UserSector.sector_id == CompanySector.sector_id,
-                    ),
-                )
-                .filter(
-                    (UserSector.user_id == None) | (CompanySector.company_id == None)
-                )
-                .count()
-            )  # Calculate the number of differences in sectors between the user and the company (the distance)
-
-            existing_record = (
-                db.session.query(UserCompany)
-                .filter_by(user_id=self.id, company_id=company[0])
-                .first()
-            )
-
-            if not existing_record:
-                db.session.add(
-                    UserCompany(
-                        user_id=self.id, company_id=company[0], distance=distance
-                    )
-                )
-            else:
-                existing_record.distance = distance
-            db.session.commit()
+    def add_activity(self) -> None:
+        """Count one more follow or unfollow towards the user's next training. The count is incremented in SQL, as
+        the training worker resets it concurrently. DOES NOT commit."""
+        db.session.query(User).filter(User.id == self.id).update(
+            {User.hard_ready: User.hard_ready + 1}, synchronize_session=False
+        )
+        db.session.expire(self, ["hard_ready"])
 
     def soft_recommend(self, k: int) -> list[UserCompany]:
-        """Return `k` user recommendations. It gets the usercompany elements the user doesn't follow with the lowest distance"""
-        recommendations = (
-            db.session.query(UserCompany)
-            .filter(UserCompany.user_id == self.id, UserCompany.distance != -1)
-            .order_by(UserCompany.distance.asc())
-        )
-        return recommendations[:k]
+        """Return `k` user recommendations: the companies the user doesn't follow with the lowest distance (the
+        number of the user's sectors the company is not in). The returned UserCompany's are not stored.
+        """
+        sector_ids = [
+            sector_id
+            for (sector_id,) in db.session.query(UserSector.sector_id).filter(
+                UserSector.user_id == self.id
+            )
+        ]
+        followed = [
+            company_id
+            for (company_id,) in db.session.query(UserCompany.company_id).filter(
+                UserCompany.user_id == self.id, UserCompany.distance == -1
+            )
+        ]
+        return [
+            UserCompany(user_id=self.id, company_id=company_id, distance=distance)
+            for company_id, distance in sector_index.recommend(sector_ids, followed, k)
+        ]
 
     def hard_train(self, first=False) -> bool:
         if (
@@ -207,73 +229,40 @@ class User(db.Model):
         ):  # Check if the user needs training or retraining
 
             return False
-        user_id = self.id
-
-        user_items = (
-            db.session.query(UserCompany).filter(UserCompany.distance < 0).all()
-        )
-
-        users = []
-        items = []
-        feedback = []
-        for entry in user_items:
-            users.append(entry.user_id)
-            items.append(entry.company_id)
-            if entry.distance == -1:
-                feedback.append(1)
-            else:
-                feedback.append(-1)
-
-        sparse_data = sp.csr_matrix((feedback, (users, items)))
-        sparse_data1 = sp.csr_matrix((feedback, (items, users)))
-
-        model = AlternatingLeastSquares()
-        model = load("data/rec_model.npz")
-
-        # Retrain model only on the new data
-
-        model.partial_fit_users([user_id], sparse_data[[user_id]])
-
-        model.partial_fit_items(items, sparse_data1[items])
-
-        dump(model, "data/rec_model.npz")  # Save the model
-
-        self.hard_ready = 0  # Restart count to know when to retrain
-        db.session.commit()
+        trainer.submit(self.id)  # Retrained in the background
         return True
 
     def hard_recommend(self, k: int) -> list[int]:
         """Return `k` user recommendations."""
+        model, _ = registry.get()  # The trained model, already in memory
+        if model is None or self.id >= model.user_factors.shape[0]:
+            return []  # Not trained yet
 
-        user_items = db.session.query(UserCompany).filter(UserCompany.distance < 0)
-
-        last = 0
-        users = []
-        items = []
-        feedback = []
-        for entry in user_items:
-            users.append(entry.user_id)
-            items.append(entry.company_id)
-            if entry.distance == -1:
-                feedback.append(1)
-            else:
-                feedback.append(-1)
-            if entry.company_id > last:
-                last = entry.company_id
-
-        last_item = int(db.session.query(Company).count())
-        if last < last_item:
+        # Companies followed for the first time since the model was trained have no factors yet
+        if model.item_factors.shape[0] < interactions.item_count:
             self.hard_train(True)
 
-        model = load("data/rec_model.npz")  # Load the trained model
-
-        sparse_data = sp.csr_matrix((feedback, (users, items)))
+        sparse_data = interactions.user_row(self.id, model.item_factors.shape[0])
 
         recommendations, scores = model.recommend(
-            self.id, sparse_data[[self.id]], N=k, filter_already_liked_items=True
+            self.id, sparse_data, N=k, filter_already_liked_items=True
         )  # Get recommended companies
         return recommendations
 
+    def get_recommendations(self, k: int) -> list[int]:
+        """Return `k` hard recommendations, read from the precomputed UserRecommendation rows. They are computed
+        now if the user's follows changed since, or if fewer than `k` are stored."""
+        if not self.recommendations_stale:
+            stored = UserRecommendation.get_by_user(self.id, k)
+            if len(stored) >= k:
+                return [recommendation.company_id for recommendation in stored]
+
+        precompute_recommendations([self.id], max(k, constants.REC_PRECOMPUTE_K))
+        return [
+            recommendation.company_id
+            for recommendation in UserRecommendation.get_by_user(self.id, k)
+        ]
+
     def to_dict(self) -> dict:
         """Return object information to send to front-end."""
         return {
@@ -319,11 +308,26 @@ class Notification(db.Model):
         )
 
     def add_users(self, user_ids: list[int]) -> None:
-        """Add users to this notification."""
+        """Add users to this notification. DOES NOT commit."""
         for user_id in user_ids:
             db.session.add(UserNotification(user_id=user_id, notification_id=self.id))
 
-        db.session.commit()
+    def add_followers(self, company_id: int) -> int:
+        """Give this notification to every user following the company, in a single INSERT ... SELECT. Returns the
+        number of users notified. DOES NOT commit."""
+        if self.id is None:
+            db.session.flush()
+        followers = select(
+            UserCompany.user_id,
+            literal(self.id),
+            literal(datetime.now()),
+            literal(False),
+        ).where(UserCompany.company_id == company_id, UserCompany.distance == -1)
+        return db.session.execute(
+            insert(UserNotification).from_select(
+                ["user_id", "notification_id", "received", "read"], followers
+            )
+        ).rowcount
 
     @staticmethod
     def get_by_id(notification_id: int) -> Notification | None:
@@ -345,9 +349,8 @@ class Notification(db.Model):
 
     @staticmethod
     def add_to_database(notification: Notification):
-        """Add notification to the database."""
+        """Add notification to the database. DOES NOT commit."""
         db.session.add(notification)
-        db.session.commit()
 
 
 class UserNotification(db.Model):
@@ -442,13 +445,16 @@ class Company(db.Model):
     __tablename__ = "Company"
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, index=True)
     url = db.Column(db.String)
     description = db.Column(db.String)
     location = db.Column(db.String)
     market_cap = db.Column(db.Integer)
     ceo = db.Column(db.String)
     sentiment = db.Column(db.Float, default=0.0)
+    # running totals over linked articles, so sentiment can be updated without re-reading every article
+    sentiment_sum = db.Column(db.Float, default=0.0)
+    article_count = db.Column(db.Integer, default=0)
     last_scraped = db.Column(db.DateTime)
 
     def __init__(
@@ -479,7 +485,7 @@ class Company(db.Model):
         ceo: str,
         last_scraped: datetime,
     ) -> None:
-        """Update the company's information."""
+        """Update the company's information. DOES NOT commit."""
         self.name = name
         self.url = url
         self.description = description
@@ -487,18 +493,104 @@ class Company(db.Model):
         self.market_cap = market_cap
         self.ceo = ceo
         self.last_scraped = last_scraped
-        db.session.commit()
 
         # TODO method to add all sectors to it
 
     def update_sentiment(self) -> None:
-        """Update the sentiment of this company."""
-        articles = self.get_articles()
-        if len(articles) == 0:
+        """Update the sentiment of this company. DOES NOT commit."""
+        if not self.article_count:
             return 0
         # sentiment is the average of all article's sentiment
-        self.sentiment = sum(map(lambda a: a.sentiment, articles)) / len(articles)
-        db.session.commit()
+        self.sentiment = self.sentiment_sum / self.article_count
+        self.update_sentiment_windows()
+
+    def add_article(self, article: Article) -> None:
+        """Link an article to this company, adding its sentiment to the running totals and to the daily rollup of
+        the day it was published. Articles without a date are in no daily rollup, as `CompanySentimentDaily.rebuild`
+        leaves them out. DOES NOT commit."""
+        db.session.add(ArticleCompany(article.id, self.id))
+        db.session.query(Company).filter(Company.id == self.id).update(
+            {
+                Company.sentiment_sum: Company.sentiment_sum + article.sentiment,
+                Company.article_count: Company.article_count + 1,
+            }
+        )
+        if article.date is not None:
+            CompanySentimentDaily.add(self.id, article.day(), article.sentiment)
+
+    def update_sentiment_windows(self, today: date = None) -> None:
+        """Recompute the sentiment over each of `CompanySentimentWindow.WINDOWS` from the daily rollup. DOES NOT
+        commit."""
+        today = today or date.today()
+        longest = max(CompanySentimentWindow.WINDOWS)
+        days = CompanySentimentDaily.get_range(
+            self.id, today - timedelta(days=longest - 1), today
+        )
+
+        values = []
+        for window in CompanySentimentWindow.WINDOWS:
+            total = count = decayed_total = decayed_count = 0.0
+            for day in days:
+                age = (today - day.day).days
+                if age >= window:
+                    continue
+                weight = 0.5 ** (age / CompanySentimentWindow.HALF_LIFE)
+                total += day.sentiment_sum
+                count += day.article_count
+                decayed_total += weight * day.sentiment_sum
+                decayed_count += weight * day.article_count
+            values.append(
+                {
+                    "company_id": self.id,
+                    "days": window,
+                    "article_count": int(count),
+                    "sentiment": total / count if count else None,
+                    "decayed_sentiment": (
+                        decayed_total / decayed_count if decayed_count else None
+                    ),
+                }
+            )
+
+        statement = insert(CompanySentimentWindow).values(values)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["company_id", "days"],
+                set_={
+                    "article_count": statement.excluded.article_count,
+                    "sentiment": statement.excluded.sentiment,
+                    "decayed_sentiment": statement.excluded.decayed_sentiment,
+                },
+            )
+        )
+
+    def get_sentiment_windows(self) -> list[CompanySentimentWindow]:
+        """Return the precomputed sentiment windows of this company."""
+        return (
+            db.session.query(CompanySentimentWindow)
+            .filter(CompanySentimentWindow.company_id == self.id)
+            .order_by(CompanySentimentWindow.days)
+            .all()
+        )
+
+    @staticmethod
+    def rebuild_sentiment_totals() -> None:
+        """Recompute every company's running sentiment totals from its articles. DOES NOT commit."""
+        linked = (
+            db.session.query(ArticleCompany.company_id)
+            .join(Article, Article.id == ArticleCompany.article_id)
+            .where(ArticleCompany.company_id == Company.id)
+        )
+        db.session.query(Company).update(
+            {
+                Company.sentiment_sum: linked.with_entities(
+                    db.func.coalesce(db.func.sum(Article.sentiment), 0.0)
+                ).scalar_subquery(),
+                Company.article_count: linked.with_entities(
+                    db.func.count(Article.id)
+                ).scalar_subquery(),
+            },
+            synchronize_session=False,
+        )
 
     def to_dict(self) -> dict:
         """Return object information to send to front-end."""
@@ -521,16 +613,26 @@ class Company(db.Model):
         """Return list of stocks that have this company."""
         return db.session.query(Stock).where(Stock.company_id == self.id).all()
 
-    def get_articles(self) -> list[Article]:
-        """Return list of articles that have this company."""
+    def get_articles(self, limit: int = None) -> list[Article]:
+        """Return list of articles that have this company, most recent first, with their companies loaded."""
         return (
             db.session.query(Article)
             .join(ArticleCompany, Article.id == ArticleCompany.article_id)
             .where(ArticleCompany.company_id == self.id)
             .order_by(desc(Article.date))
+            .limit(limit)
+            .options(Article.with_companies())
             .all()
         )
 
+    def has_articles(self) -> bool:
+        """Return if any article has this company."""
+        return db.session.query(
+            db.session.query(ArticleCompany)
+            .where(ArticleCompany.company_id == self.id)
+            .exists()
+        ).scalar()
+
     def get_stories(self) -> list[Story]:
         """Return list of stories that have this company."""
         return (
@@ -574,19 +676,156 @@ class Company(db.Model):
         return db.session.query(Company).filter_by(id=company_id).first()
 
 
+class CompanySentimentDaily(db.Model):
+    """Sum and count of the sentiment of a company's articles, per day of publication."""
+
+    __tablename__ = "CompanySentimentDaily"
+
+    company_id = db.Column(db.Integer, db.ForeignKey("Company.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    sentiment_sum = db.Column(db.Float, default=0.0)
+    article_count = db.Column(db.Integer, default=0)
+
+    def __init__(
+        self, company_id: int, day: date, sentiment_sum: float, article_count: int
+    ):
+        self.company_id = company_id
+        self.day = day
+        self.sentiment_sum = sentiment_sum
+        self.article_count = article_count
+
+    def to_dict(self) -> dict:
+        """Return object information to send to front-end."""
+        return {
+            "date": self.day.isoformat(),
+            "sentiment": (
+                self.sentiment_sum / self.article_count if self.article_count else None
+            ),
+            "articleCount": self.article_count,
+        }
+
+    @staticmethod
+    def add(company_id: int, day: date, sentiment: float) -> None:
+        """Add an article's sentiment to the company's rollup for that day. DOES NOT commit."""
+        statement = insert(CompanySentimentDaily).values(
+            company_id=company_id, day=day, sentiment_sum=sentiment, article_count=1
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["company_id", "day"],
+                set_={
+                    "sentiment_sum": CompanySentimentDaily.sentiment_sum
+                    + statement.excluded.sentiment_sum,
+                    "article_count": CompanySentimentDaily.article_count + 1,
+                },
+            )
+        )
+
+    @staticmethod
+    def get_range(
+        company_id: int, start: date, end: date
+    ) -> list[CompanySentimentDaily]:
+        """Return the company's daily rollups between `start` and `end` (inclusive), oldest first."""
+        return (
+            db.session.query(CompanySentimentDaily)
+            .filter(
+                CompanySentimentDaily.company_id == company_id,
+                CompanySentimentDaily.day >= start,
+                CompanySentimentDaily.day <= end,
+            )
+            .order_by(CompanySentimentDaily.day)
+            .all()
+        )
+
+    @staticmethod
+    def rebuild() -> None:
+        """Recompute every daily rollup from the articles; articles without a date are left out, as
+        `Company.add_article` does. DOES NOT commit."""
+        db.session.query(CompanySentimentDaily).delete()
+        day = db.func.date(Article.date)
+        db.session.execute(
+            insert(CompanySentimentDaily).from_select(
+                ["company_id", "day", "sentiment_sum", "article_count"],
+                db.session.query(
+                    ArticleCompany.company_id,
+                    day,
+                    db.func.sum(Article.sentiment),
+                    db.func.count(Article.id),
+                )
+                .join(Article, Article.id == ArticleCompany.article_id)
+                .where(Article.date != None)
+                .group_by(ArticleCompany.company_id, day),
+            )
+        )
+
+
+class CompanySentimentWindow(db.Model):
+    """A company's sentiment over the last `days` days, plain and exponentially time-decayed."""
+
+    __tablename__ = "CompanySentimentWindow"
+
+    WINDOWS = (1, 7, 30, 365)  # window lengths, in days
+    # days after which an article's weight in the decayed sentiment halves
+    HALF_LIFE = 7
+
+    company_id = db.Column(db.Integer, db.ForeignKey("Company.id"), primary_key=True)
+    days = db.Column(db.Integer, primary_key=True)
+    article_count = db.Column(db.Integer, default=0)
+    sentiment = db.Column(db.Float)
+    decayed_sentiment = db.Column(db.Float)
+
+    def to_dict(self) -> dict:
+        """Return object information to send to front-end."""
+        return {
+            "days": self.days,
+            "articleCount": self.article_count,
+            "sentiment": self.sentiment,
+            "decayedSentiment": self.decayed_sentiment,
+        }
+
+
+class PriceSeries(TypeDecorator):
+    """A price series stored as a BLOB of packed float64 (unix timestamp, close) pairs, loaded as an (n, 2) array
+    oldest first."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    @staticmethod
+    def to_array(points) -> np.ndarray:
+        """(n, 2) array of (timestamp, close) from a list of pairs, an array or packed bytes."""
+        if points is None:
+            return np.empty((0, 2))
+        if isinstance(points, bytes):
+            return np.frombuffer(points, dtype=np.float64).reshape(-1, 2)
+        return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    def process_bind_param(self, value, dialect) -> bytes | None:
+        return None if value is None else PriceSeries.to_array(value).tobytes()
+
+    def process_result_value(self, value, dialect) -> np.ndarray:
+        return PriceSeries.to_array(value)
+
+    def compare_values(self, x, y) -> bool:
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(PriceSeries.to_array(x), PriceSeries.to_array(y))
+
+
 class Stock(db.Model):
     __tablename__ = "Stock"
 
     symbol = db.Column(db.String, primary_key=True)
-    company_id = db.Column(db.Integer, db.ForeignKey("Company.id"))
+    company_id = db.Column(db.Integer, db.ForeignKey("Company.id"), index=True)
     exchange = db.Column(db.String)
     market_cap = db.Column(db.Integer)
     stock_price = db.Column(db.Float)
     stock_change = db.Column(db.Float)
-    stock_day = db.Column(db.String)
-    stock_week = db.Column(db.String)
-    stock_month = db.Column(db.String)
-    stock_year = db.Column(db.String)
+    # (timestamp, close) series of the last day (hourly), week (hourly), month (daily) and year (weekly)
+    stock_day = db.Column(PriceSeries)
+    stock_week = db.Column(PriceSeries)
+    stock_month = db.Column(PriceSeries)
+    stock_year = db.Column(PriceSeries)
 
     def __init__(
         self,
@@ -596,10 +835,10 @@ class Stock(db.Model):
         market_cap: int,
         stock_price: float,
         stock_change: float,
-        stock_day: str,
-        stock_week: str,
-        stock_month: str,
-        stock_year: str,
+        stock_day: PriceSeriesPoints,
+        stock_week: PriceSeriesPoints,
+        stock_month: PriceSeriesPoints,
+        stock_year: PriceSeriesPoints,
     ):
         self.symbol = symbol
         self.company_id = company_id
@@ -617,12 +856,12 @@ class Stock(db.Model):
         market_cap: int,
         stock_price: float,
         stock_change: float,
-        stock_day: str,
-        stock_week: str,
-        stock_month: str,
-        stock_year: str,
+        stock_day: PriceSeriesPoints,
+        stock_week: PriceSeriesPoints,
+        stock_month: PriceSeriesPoints,
+        stock_year: PriceSeriesPoints,
     ) -> None:
-        """Update the stock information."""
+        """Update the stock information. DOES NOT commit."""
         self.market_cap = market_cap
         self.stock_price = stock_price
         self.stock_change = stock_change
@@ -630,23 +869,27 @@ class Stock(db.Model):
         self.stock_week = stock_week
         self.stock_month = stock_month
         self.stock_year = stock_year
-        db.session.commit()
 
     def to_dict(self) -> dict:
-        from data.interface import string_to_list
-
-        return {
+        data = {
             "symbol": self.symbol,
             "companyId": self.company_id,
             "exchange": self.exchange,
             "marketCap": self.market_cap,
             "stockPrice": self.stock_price,
             "stockChange": self.stock_change,
-            "stockDay": string_to_list(self.stock_day, float, " "),
-            "stockWeek": string_to_list(self.stock_week, float, " "),
-            "stockMonth": string_to_list(self.stock_month, float, " "),
-            "stockYear": string_to_list(self.stock_year, float, " "),
         }
+        for key, series in (
+            ("stockDay", self.stock_day),
+            ("stockWeek", self.stock_week),
+            ("stockMonth", self.stock_month),
+            ("stockYear", self.stock_year),
+        ):
+            series = PriceSeries.to_array(series)
+            data[key] = series[:, 1].tolist()
+            # milliseconds since the epoch, as used by JavaScript dates
+            data[key + "Times"] = (series[:, 0] * 1000).astype(np.int64).tolist()
+        return data
 
     @staticmethod
     def get_by_company(company_id: int) -> Stock | None:
@@ -661,10 +904,12 @@ class Stock(db.Model):
 
 class UserCompany(db.Model):
     __tablename__ = "UserCompany"
+    # followers of a company
+    __table_args__ = (db.Index("ix_UserCompany_company_id", "company_id", "distance"),)
 
     user_id = db.Column(db.Integer, db.ForeignKey("User.id"), primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey("Company.id"), primary_key=True)
-    distance = db.Column(db.Integer)
+    distance = db.Column(db.Integer)  # -1 if following, -2 if unfollowed
 
     company = db.relationship("Company", backref="followed_companies", lazy=True)
     user = db.relationship("User", backref="followed_users", lazy=True)
@@ -713,14 +958,67 @@ class UserCompany(db.Model):
         )
 
 
+class UserRecommendation(db.Model):
+    """Precomputed hard recommendations of a user, best first."""
+
+    __tablename__ = "UserRecommendation"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("User.id"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("Company.id"))
+    score = db.Column(db.Float)
+
+    def __init__(self, user_id: int, rank: int, company_id: int, score: float):
+        self.user_id = user_id
+        self.rank = rank
+        self.company_id = company_id
+        self.score = score
+
+    def to_dict(self) -> dict:
+        """Return object information to send to front-end."""
+        return {
+            "userId": self.user_id,
+            "rank": self.rank,
+            "companyId": self.company_id,
+            "score": self.score,
+        }
+
+    @staticmethod
+    def get_by_user(user_id: int, k: int) -> list[UserRecommendation]:
+        """Return the user's best `k` recommendations."""
+        return (
+            db.session.query(UserRecommendation)
+            .filter(UserRecommendation.user_id == user_id)
+            .order_by(UserRecommendation.rank)
+            .limit(k)
+            .all()
+        )
+
+    @staticmethod
+    def replace(user_ids: list[int], rows: list[dict]) -> None:
+        """Replace the recommendations of the given users with `rows` (dictionaries of column values), and mark
+        them as up to date. DOES NOT commit."""
+        db.session.query(UserRecommendation).filter(
+            UserRecommendation.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        if rows:
+            db.session.execute(insert(UserRecommendation), rows)
+        db.session.query(User).filter(User.id.in_(user_ids)).update(
+            {"recommendations_stale": False}, synchronize_session=False
+        )
+
+
 class Article(db.Model):
     __tablename__ = "Article"
 
+    # Query parameters that only track where a reader came from; they do not change the article
+    TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ocid", "ref", "cmpid"}
+
     id = db.Column(db.Integer, primary_key=True)
-    url = db.Column(db.String)
+    url = db.Column(db.String, index=True, unique=True)  # normalized, see normalize_url
     headline = db.Column(db.String)
     publisher = db.Column(db.String)
-    date = db.Column(db.DateTime)
+    date = db.Column(db.DateTime, index=True)
     summary = db.Column(db.String)
     sentiment = db.Column(db.Float, default=0.0)
 
@@ -732,16 +1030,46 @@ class Article(db.Model):
         date: datetime,
         summary: str,
     ):
-        self.url = url
+        self.url = Article.normalize_url(url)
         self.headline = headline
         self.publisher = publisher
         self.date = date
         self.summary = summary
 
     def update_sentiment(self, sentiment: float) -> None:
-        """Update the sentiment of this article."""
+        """Update the sentiment of this article, and the running totals of the companies it is linked to. DOES NOT
+        commit."""
+        delta = sentiment - (self.sentiment or 0.0)
         self.sentiment = sentiment
-        db.session.commit()
+        if delta != 0:
+            db.session.query(Company).filter(
+                Company.id.in_(
+                    db.session.query(ArticleCompany.company_id).where(
+                        ArticleCompany.article_id == self.id
+                    )
+                )
+            ).update(
+                {Company.sentiment_sum: Company.sentiment_sum + delta},
+                synchronize_session="fetch",
+            )
+            db.session.query(CompanySentimentDaily).filter(
+                CompanySentimentDaily.day == self.day(),
+                CompanySentimentDaily.company_id.in_(
+                    db.session.query(ArticleCompany.company_id).where(
+                        ArticleCompany.article_id == self.id
+                    )
+                ),
+            ).update(
+                {
+                    CompanySentimentDaily.sentiment_sum: CompanySentimentDaily.sentiment_sum
+                    + delta
+                },
+                synchronize_session=False,
+            )
+
+    def day(self) -> date | None:
+        """Return the day this article was published, None if unknown."""
+        return self.date.date() if self.date else None
 
     def to_dict(self) -> dict:
         """Return object information to send to front-end."""
@@ -784,10 +1112,9 @@ class Article(db.Model):
         )
 
     def set_score(self):
-        """Set the sentiment score of the article"""
+        """Set the sentiment score of the article. DOES NOT commit."""
         # Should probably use entire text instead
-        self.sentiment = sentiment_label(self.summary)["score"]
-        db.session.commit()
+        self.update_sentiment(sentiment_label(self.summary)["score"])
 
     def get_content(self) -> str:
         """Return the content of the article."""
@@ -799,9 +1126,85 @@ class Article(db.Model):
     def __eq__(self, other):
         return self.url == other.url
 
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """The canonical form of an article's url: https, lowercase host, no fragment, tracking parameters or
+        trailing slash, and the remaining query parameters sorted."""
+        parts = urlsplit(url.strip())
+        query = sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in Article.TRACKING_PARAMS
+            and not key.lower().startswith("utm_")
+        )
+        return urlunsplit(
+            (
+                "https" if parts.scheme in ("http", "https", "") else parts.scheme,
+                parts.netloc.lower(),
+                parts.path.rstrip("/"),
+                urlencode(query),
+                "",
+            )
+        )
+
+    @staticmethod
+    def upsert_many(news: list[dict]) -> list[int]:
+        """Insert articles, or update the headline, publisher and summary of those whose (normalized) url is already
+        stored, in a single statement. Stored articles keep their first-seen date, the day their sentiment counts
+        towards. Each dict has the constructor's arguments, and the `sentiment` of an article that is not stored yet.
+        Returns the article ids, in the order of `news`. DOES NOT commit.
+        """
+        if not news:
+            return []
+        rows = {}
+        for item in news:
+            url = Article.normalize_url(item["url"])
+            rows[url] = {
+                "url": url,
+                "headline": item["headline"],
+                "publisher": item["publisher"],
+                "date": item["date"],
+                "summary": item["summary"],
+                "sentiment": item.get("sentiment") or 0.0,
+            }
+        statement = insert(Article).values(list(rows.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=[Article.url],
+            set_={
+                "headline": statement.excluded.headline,
+                "publisher": statement.excluded.publisher,
+                "summary": statement.excluded.summary,
+            },
+        ).returning(Article.id, Article.url)
+        ids = {url: article_id for article_id, url in db.session.execute(statement)}
+        return [ids[Article.normalize_url(item["url"])] for item in news]
+
+    @staticmethod
+    def known_urls(urls: list[str]) -> set[str]:
+        """Return which of the (normalized) urls are stored already."""
+        return {
+            url
+            for (url,) in db.session.query(Article.url).where(
+                Article.url.in_([Article.normalize_url(url) for url in urls])
+            )
+        }
+
+    @staticmethod
+    def with_companies():
+        """Loader option fetching the companies of every loaded article in one more query, so that `to_dict` does
+        not query per article and company."""
+        return selectinload(Article.related_companies).joinedload(
+            ArticleCompany.company
+        )
+
     @staticmethod
     def get_by_id(article_id: int) -> Article | None:
-        return db.session.query(Article).filter(Article.id == article_id).first()
+        return (
+            db.session.query(Article)
+            .filter(Article.id == article_id)
+            .options(Article.with_companies())
+            .first()
+        )
 
 
 class Story(db.Model):
@@ -817,9 +1220,8 @@ class Story(db.Model):
         self.title = title
 
     def update_sentiment(self, sentiment: float) -> None:
-        """Update the sentiment of this story."""
+        """Update the sentiment of this story. DOES NOT commit."""
         self.sentiment = sentiment
-        db.session.commit()
 
     def to_dict(self) -> dict:
         """Return object information to send to front-end."""
@@ -862,7 +1264,9 @@ class ArticleCompany(db.Model):
     __tablename__ = "ArticleCompany"
 
     article_id = db.Column(db.Integer, db.ForeignKey("Article.id"), primary_key=True)
-    company_id = db.Column(db.Integer, db.ForeignKey("Company.id"), primary_key=True)
+    company_id = db.Column(
+        db.Integer, db.ForeignKey("Company.id"), primary_key=True, index=True
+    )
 
     company = db.relationship("Company", backref="related_articles", lazy=True)
     article = db.relationship("Article", backref="related_companies", lazy=True)
@@ -881,3 +1285,161 @@ class StoryCompany(db.Model):
     def __init__(self, story_id: int, company_id: int):
         self.story_id = story_id
         self.company_id = company_id
+
+
+class SearchIndex:
+    """An FTS5 full-text index over text columns of a model's table. The index is an external content table: it
+    stores only the index and reads the text from the model's table, and triggers keep it in sync with every insert,
+    update and delete. It is created and dropped together with the model's table.
+    """
+
+    # Wrap the matched tokens in a snippet; no text of the index contains these characters
+    MATCH_START = "\x02"
+    MATCH_END = "\x03"
+
+    def __init__(self, model: type[db.Model], columns: dict[str, float], loader=None):
+        """Index the given columns of `model`, each with its weight in the bm25 ranking. `loader` returns the loader
+        option of the instances returned by `search`, such as `Article.with_companies`.
+        """
+        self.model = model
+        self.loader = loader
+        self.table = model.__tablename__
+        self.name = f"{self.table}Search"
+        self.columns = columns
+        event.listen(model.__table__, "after_create", self.create)
+        event.listen(model.__table__, "before_drop", self.drop)
+
+    def statements(self) -> list[str]:
+        """SQL creating the index and its triggers, if they do not exist yet."""
+        columns = ", ".join(self.columns)
+        new = ", ".join(f"new.{column}" for column in self.columns)
+        old = ", ".join(f"old.{column}" for column in self.columns)
+        insert_new = (
+            f'INSERT INTO "{self.name}"(rowid, {columns}) VALUES (new.id, {new});'
+        )
+        delete_old = (
+            f'INSERT INTO "{self.name}"("{self.name}", rowid, {columns}) '
+            f"VALUES ('delete', old.id, {old});"
+        )
+        return [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{self.name}" USING fts5({columns}, content="{self.table}", '
+            f'content_rowid="id", tokenize="unicode61 remove_diacritics 2", prefix="2 3")',
+            f'CREATE TRIGGER IF NOT EXISTS "{self.name}_insert" AFTER INSERT ON "{self.table}" BEGIN '
+            f"{insert_new} END",
+            f'CREATE TRIGGER IF NOT EXISTS "{self.name}_delete" AFTER DELETE ON "{self.table}" BEGIN '
+            f"{delete_old} END",
+            f'CREATE TRIGGER IF NOT EXISTS "{self.name}_update" AFTER UPDATE OF {columns} ON "{self.table}" '
+            f"BEGIN {delete_old} {insert_new} END",
+        ]
+
+    def create(self, _table, connection, **_kwargs) -> None:
+        """Create the index and its triggers on `connection`, if they do not exist yet."""
+        for statement in self.statements():
+            connection.execute(text(statement))
+
+    def drop(self, _table, connection, **_kwargs) -> None:
+        """Drop the index; its triggers are dropped with the model's table."""
+        connection.execute(text(f'DROP TABLE IF EXISTS "{self.name}"'))
+
+    def rebuild(self) -> None:
+        """Index every row of the model's table again. DOES NOT commit."""
+        db.session.execute(
+            text(f'INSERT INTO "{self.name}"("{self.name}") VALUES (\'rebuild\')')
+        )
+
+    @staticmethod
+    def match_expression(query: str) -> str | None:
+        """FTS5 query matching rows containing every word of `query`, the last word taken as a prefix (it may still
+        be being typed). None if `query` has no words."""
+        words = [f'"{word}"' for word in re.findall(r"\w+", query)]
+        if not words:
+            return None
+        return " ".join(words) + "*"
+
+    def search(
+        self, query: str, limit: int, candidates: int | None = None
+    ) -> list[tuple[db.Model, float, str]]:
+        """Return the best `limit` rows matching `query` (see `match_expression`), best first, as (instance, score,
+        snippet) tuples. Higher scores are better matches. The snippet is HTML: the text around the matches, escaped,
+        with the matched words in <mark> tags. With `candidates`, only that many of the latest matching rows are
+        ranked, so older rows are never returned however well they match.
+        """
+        expression = SearchIndex.match_expression(query)
+        if expression is None:
+            return []
+        weights = ", ".join(str(weight) for weight in self.columns.values())
+        # the rowid of the oldest candidate; walking matches in rowid order is cheap, ranking them is not
+        oldest = (
+            f'AND rowid >= coalesce((SELECT rowid FROM "{self.name}" WHERE "{self.name}" MATCH :expression '
+            f"ORDER BY rowid DESC LIMIT 1 OFFSET :offset), 0) "
+            if candidates is not None
+            else ""
+        )
+        hits = db.session.execute(
+            text(
+                f'SELECT rowid, bm25("{self.name}", {weights}) AS rank, '
+                f"snippet(\"{self.name}\", -1, :start, :end, '…', :tokens) "
+                f'FROM "{self.name}" WHERE "{self.name}" MATCH :expression '
+                f"{oldest}ORDER BY rank LIMIT :limit"
+            ),
+            {
+                "start": SearchIndex.MATCH_START,
+                "end": SearchIndex.MATCH_END,
+                "tokens": constants.SEARCH_SNIPPET_TOKENS,
+                "expression": expression,
+                "offset": (candidates or 1) - 1,
+                "limit": limit,
+            },
+        ).all()
+        query = db.session.query(self.model).where(
+            self.model.id.in_([hit[0] for hit in hits])
+        )
+        if self.loader is not None:
+            query = query.options(self.loader())
+        instances = {instance.id: instance for instance in query}
+        return [
+            (instances[row_id], -rank, SearchIndex.highlight(snippet))
+            for row_id, rank, snippet in hits
+            if row_id in instances
+        ]
+
+    @staticmethod
+    def highlight(snippet: str) -> str:
+        """Escape a snippet and replace its match markers with <mark> tags."""
+        return (
+            html.escape(snippet or "")
+            .replace(SearchIndex.MATCH_START, "<mark>")
+            .replace(SearchIndex.MATCH_END, "</mark>")
+        )
+
+
+def track_sectors(session: Session, _context) -> None:
+    """Remember the companies and company sectors flushed in the session's transaction."""
+    added = session.info.setdefault("sector_index", [])
+    for instance in session.new:
+        if isinstance(instance, Company):
+            added.append((instance.id, None))
+        elif isinstance(instance, CompanySector):
+            added.append((instance.company_id, instance.sector_id))
+
+
+def update_sector_index(session: Session) -> None:
+    """Add the companies and company sectors of a committed transaction to the sector index, however they were
+    created."""
+    for company_id, sector_id in session.info.pop("sector_index", []):
+        sector_index.add(company_id, sector_id)
+
+
+def forget_sectors(session: Session) -> None:
+    session.info.pop("sector_index", None)
+
+
+event.listen(Session, "after_flush", track_sectors)
+event.listen(Session, "after_commit", update_sector_index)
+event.listen(Session, "after_rollback", forget_sectors)
+
+# Company names weigh most, then CEOs, then descriptions; article headlines weigh more than summaries
+COMPANY_SEARCH = SearchIndex(Company, {"name": 10.0, "ceo": 5.0, "description": 1.0})
+ARTICLE_SEARCH = SearchIndex(
+    Article, {"headline": 3.0, "summary": 1.0}, Article.with_companies
+)
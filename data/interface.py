@@ -1,33 +1,20 @@
 from asyncio import run
-from datetime import datetime
+from datetime import datetime, timedelta
 from time import sleep
-from typing import Callable, Optional
+from typing import Optional
 
 from flask import Flask
 from sqlalchemy import and_, asc, desc
 
 import data.api as api
 import data.database as db
-from analysis.analysis import sentiment_label, sentiment_score_to_text
+from analysis.analysis import sentiment_label_batch, sentiment_score_to_text
+from data.recommender import similar_companies
+from server import constants
 
 FloatRange = tuple[float, float]
 
 
-def string_to_list(
-    string: str, convert_fn: Callable[[str], any], seperator: str = ","
-) -> list:
-    """Attempt to convert the input string to a list. String is in the form 'x<separator>y<separator>z...]. `convert_fn`
-    is called on each element."""
-
-    def func(x: str):
-        try:
-            return convert_fn(x.strip())
-        except:
-            return None
-
-    return list(filter(lambda x: x is not None, map(func, string.split(seperator))))
-
-
 def get_user_by_id(user_id: int) -> db.User | None:
     """Get a user by their ID."""
     return db.db.session.query(db.User).where(db.User.id == user_id).one_or_none()
@@ -119,56 +106,86 @@ def get_company_details(
     article_count: int = 0,
 ) -> dict:
     """Get company details, given the company object."""
+    details = company_cards([company], user_id, load_stock)[0]
 
-    # add pre-existing company details
-    details = {
-        **company.to_dict(),
-    }
+    # returns article_count most recent articles(default 0)
+    if load_articles:
+        # fetch new articles, if not scraped recently
+        if (news := fetch_company_news(company)) is not None:
+            with db.unit_of_work():
+                save_company_news(company, news)
+        details["articles"] = list(
+            map(db.Article.to_dict, company.get_articles(article_count))
+        )
 
-    # Add sectors that a company is in
-    company_sectors = db.CompanySector.get_by_company(company.id)
-    sectors = []
-    for sector_db in company_sectors:
-        sector = (
-            db.db.session.query(db.Sector)
-            .where(db.Sector.id == sector_db.sector_id)
-            .one_or_none()
+    return details
+
+
+def get_company_details_many(
+    company_ids: list[int], user_id: int = None, load_stock=False
+) -> list[dict]:
+    """Get the details of many companies, in the order of `company_ids`. Ids of missing companies are skipped."""
+    companies = {
+        company.id: company
+        for company in db.db.session.query(db.Company).where(
+            db.Company.id.in_(company_ids)
         )
-        if sector:
-            sectors.append(sector)
-    details["sectors"] = [sector.to_dict() for sector in sectors]
+    }
+    return company_cards(
+        [companies[i] for i in company_ids if i in companies], user_id, load_stock
+    )
 
-    # Gets all stocks for a company
-    stocks = db.Stock.get_all_by_company(company.id)
 
-    # Calculate stock change
-    details["stockDelta"] = stocks[0].stock_change if len(stocks) > 0 else 0
+def company_cards(
+    companies: list[db.Company], user_id: int = None, load_stock=False
+) -> list[dict]:
+    """Details of each company (sectors, stocks and whether the user follows it), loaded for all companies at
+    once."""
+    company_ids = [company.id for company in companies]
 
-    if load_stock:
-        details["stocks"] = list(map(db.Stock.to_dict, stocks))
+    # Add sectors that a company is in
+    sectors = {company_id: [] for company_id in company_ids}
+    for company_id, sector in (
+        db.db.session.query(db.CompanySector.company_id, db.Sector)
+        .join(db.Sector, db.Sector.id == db.CompanySector.sector_id)
+        .where(db.CompanySector.company_id.in_(company_ids))
+    ):
+        sectors[company_id].append(sector.to_dict())
+
+    # Gets all stocks for a company
+    stocks = {company_id: [] for company_id in company_ids}
+    for stock in db.db.session.query(db.Stock).where(
+        db.Stock.company_id.in_(company_ids)
+    ):
+        stocks[stock.company_id].append(stock)
 
     # If user was provided, check if they are following the company
+    following = set()
     if user_id is not None:
-        user_company = db.UserCompany.get(user_id, company.id)
-        details["isFollowing"] = (
-            False if user_company is None else user_company.is_following()
-        )
-
-    # returns article_count most recent articles(default 0)
-    if load_articles:
-        articles = get_company_articles(company.id)
-        if len(articles) > 0:
-            # article can return a list of articles or a list of article objects
-            if type(articles[0]) == db.Article:
-                details["articles"] = list(
-                    map(db.Article.to_dict, articles[:article_count])
-                )
-            else:
-                details["articles"] = articles[:article_count]
-        else:
-            details["articles"] = []
-
-    return details
+        following = {
+            company_id
+            for (company_id,) in db.db.session.query(db.UserCompany.company_id).where(
+                db.UserCompany.user_id == user_id,
+                db.UserCompany.company_id.in_(company_ids),
+                db.UserCompany.distance == -1,
+            )
+        }
+
+    cards = []
+    for company in companies:
+        company_stocks = stocks[company.id]
+        details = {
+            **company.to_dict(),
+            "sectors": sectors[company.id],
+            # Calculate stock change
+            "stockDelta": company_stocks[0].stock_change if company_stocks else 0,
+        }
+        if load_stock:
+            details["stocks"] = list(map(db.Stock.to_dict, company_stocks))
+        if user_id is not None:
+            details["isFollowing"] = company.id in following
+        cards.append(details)
+    return cards
 
 
 def get_all_sectors() -> list[db.Sector]:
@@ -176,20 +193,15 @@ def get_all_sectors() -> list[db.Sector]:
     return db.db.session.query(db.Sector).order_by(asc(db.Sector.id)).all()
 
 
-def get_followed_companies(user_id: int) -> list[tuple[db.Company, dict]] | None:
-    """Return list of (company, company_details)"""
+def get_followed_companies(user_id: int) -> list[dict]:
+    """Return the details of every company the user follows."""
     followed_ids: list[int] = list(
         map(
             lambda uc: uc.company_id,
             filter(db.UserCompany.is_following, db.UserCompany.get_by_user(user_id)),
         )
     )
-    return list(
-        map(
-            lambda company_id: get_company_details_by_id(company_id, user_id),
-            followed_ids,
-        )
-    )
+    return get_company_details_many(followed_ids, user_id)
 
 
 def search_companies(
@@ -284,75 +296,78 @@ def add_company(symbol: str, get_news=False) -> db.Company | None:
             .one_or_none()
         )
 
-    # get indo from api and add
+    # get info from api, then add everything in one transaction
     info = run(api.get_company_info(symbol))
-    company = db.Company(
-        name=info["name"],
-        url=info["url"],
-        description=info["description"],
-        location=info["location"],
-        market_cap=info["market_cap"],
-        ceo=info["ceo"],
-        last_scraped=datetime.now(),
-    )
-    db.db.session.add(company)
-    db.db.session.commit()
+    stock_info = run(api.get_stock_info(symbol))
+    with db.unit_of_work():
+        company = db.Company(
+            name=info["name"],
+            url=info["url"],
+            description=info["description"],
+            location=info["location"],
+            market_cap=info["market_cap"],
+            ceo=info["ceo"],
+            last_scraped=datetime.now(),
+        )
+        db.db.session.add(company)
 
-    sector_name = info["sector"]
-    if not (
-        sector := db.db.session.query(db.Sector)
-        .where(db.Sector.name == sector_name)
-        .one_or_none()
-    ):
-        # add sector if it does not exist
-        sector = db.Sector(sector_name)
-        db.db.session.add(sector)
-        db.db.session.commit()
+        sector_name = info["sector"]
+        if not (
+            sector := db.db.session.query(db.Sector)
+            .where(db.Sector.name == sector_name)
+            .one_or_none()
+        ):
+            # add sector if it does not exist
+            sector = db.Sector(sector_name)
+            db.db.session.add(sector)
+        db.db.session.flush()
 
-    # create company sector relationship
-    db.db.session.add(db.CompanySector(company.id, sector.id))
-    db.db.session.commit()
+        # create company sector relationship
+        db.db.session.add(db.CompanySector(company.id, sector.id))
 
-    # add stocks to company
-    add_stock(symbol, company.id)
+        # add stocks to company
+        add_stock(symbol, company.id, stock_info)
 
     # if requested, get news articles and update sentiment
     if get_news:
         get_company_articles(company.id)
-        company.update_sentiment()
+        with db.unit_of_work():
+            company.update_sentiment()
     return company
 
 
-def add_stock(symbol: str, company_id: int) -> db.Stock | None:
-    """Add a stock to a company."""
+def stock_price_change(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """Return the latest price of a (timestamp, close) series and its change over the series. Both default to 0 if
+    the series is empty."""
+    if not points:
+        return 0, 0
+    return points[-1][1], points[-1][1] - points[0][1]
+
+
+def add_stock(symbol: str, company_id: int, stock_info: dict = None) -> db.Stock | None:
+    """Add a stock to a company. `stock_info` is fetched from the api if not given."""
     if db.db.session.query(db.Stock).where(db.Stock.symbol == symbol).one_or_none():
         return None
 
-    stock_info = run(api.get_stock_info(symbol))
-    stock = db.Stock(
-        symbol,
-        company_id,
-        stock_info["exchange"],
-        stock_info["market_cap"],
-        # default to 0 if no stock day to avoid errors
-        stock_info["stock_day"][-1] if stock_info["stock_day"] else 0,
-        (
-            stock_info["stock_day"][-1] - stock_info["stock_day"][0]
-            if stock_info["stock_day"]
-            else 0
-        ),
-        " ".join(map(str, stock_info["stock_day"])),
-        " ".join(map(str, stock_info["stock_week"])),
-        " ".join(map(str, stock_info["stock_month"])),
-        " ".join(map(str, stock_info["stock_year"])),
-    )
-    db.db.session.add(stock)
-    db.db.session.commit()
+    stock_info = stock_info or run(api.get_stock_info(symbol))
+    with db.unit_of_work():
+        stock = db.Stock(
+            symbol,
+            company_id,
+            stock_info["exchange"],
+            stock_info["market_cap"],
+            *stock_price_change(stock_info["stock_day"]),
+            stock_info["stock_day"],
+            stock_info["stock_week"],
+            stock_info["stock_month"],
+            stock_info["stock_year"],
+        )
+        db.db.session.add(stock)
     return stock
 
 
 def update_company_info(company_id: int) -> None:
-    """Update company info."""
+    """Update company info. Everything is fetched from the apis first, then written in a single transaction."""
     company = (  # get company to update
         db.db.session.query(db.Company).where(db.Company.id == company_id).one_or_none()
     )
@@ -361,70 +376,73 @@ def update_company_info(company_id: int) -> None:
         return
 
     company_symbols = company.get_stocks()  # get all stocks for company
-    combined_cap = 0  # combined market cap of all stocks
     new_symbols = run(api.get_symbols(company.name))
-
-    for symbol in company_symbols:
-        # if symbol does not exist in new symbols, delete it
-        if symbol.symbol not in new_symbols:
-            db.db.session.delete(symbol)
-            db.db.session.commit()
-            continue
-
-        # get stock info and update stock
-        stock_info = run(api.get_stock_info(symbol.symbol))
-
-        for key, value in stock_info.items():  # update stock info
-            if value != "":
-                if type(value) == list:
-                    setattr(symbol, key, " ".join(map(str, value)))
-                else:
+    # symbols already stored for another company are left alone
+    taken = {
+        symbol
+        for (symbol,) in db.db.session.query(db.Stock.symbol).where(
+            db.Stock.symbol.in_(new_symbols), db.Stock.company_id != company_id
+        )
+    }
+    stock_infos = {
+        symbol: run(api.get_stock_info(symbol))
+        for symbol in new_symbols
+        if symbol not in taken
+    }
+    company_info = run(api.get_company_info(company_symbols[0].symbol))
+    news = fetch_company_news(company)
+
+    with db.unit_of_work():
+        combined_cap = 0  # combined market cap of all stocks
+        for symbol in company_symbols:
+            # if symbol does not exist in new symbols, delete it
+            if symbol.symbol not in new_symbols:
+                db.db.session.delete(symbol)
+                continue
+
+            # update stock info
+            stock_info = stock_infos[symbol.symbol]
+            for key, value in stock_info.items():
+                if value != "":
                     setattr(symbol, key, value)
 
-        symbol.stock_price = (
-            stock_info["stock_day"][-1] if stock_info["stock_day"] else 0
-        )
-        symbol.stock_change = (
-            stock_info["stock_day"][-1] - stock_info["stock_day"][0]
-            if stock_info["stock_day"]
-            else 0
-        )
-        db.db.session.commit()
+            symbol.stock_price, symbol.stock_change = stock_price_change(
+                stock_info["stock_day"]
+            )
 
-        # add market cap to combined cap
-        combined_cap += symbol.market_cap if symbol.market_cap else 0
+            # add market cap to combined cap
+            combined_cap += symbol.market_cap if symbol.market_cap else 0
 
-    # add new symbols
-    for symbol in new_symbols:
-        if not (
-            db.db.session.query(db.Stock).where(db.Stock.symbol == symbol).one_or_none()
-        ):
-            add_stock(symbol, company_id)
+        # add new symbols
+        for symbol, stock_info in stock_infos.items():
+            add_stock(symbol, company_id, stock_info)
 
-    # update company info
-    company_info = run(api.get_company_info(company_symbols[0].symbol))
-    for key, value in company_info.items():
-        if value != "":
-            setattr(company, key, value)
-    company.last_scraped = datetime.now()
-    company.market_cap = combined_cap
-    db.db.session.commit()
+        # update company info
+        for key, value in company_info.items():
+            if value != "":
+                setattr(company, key, value)
+        company.last_scraped = datetime.now()
+        company.market_cap = combined_cap
 
-    # get new articles and update sentiment
-    articles = get_company_articles(company_id)
+        # add new articles and update sentiment
+        articles = (
+            company.get_articles() if news is None else save_company_news(company, news)
+        )
 
-    # sort articles by sentiment and add notification if very positive/negative
-    articles.sort(key=lambda x: abs(x.sentiment), reverse=True)
-    if len(articles) > 0:
-        if sentiment_score_to_text(abs(articles[0].sentiment)) == "Very Positive":
-            add_article_notification(company, articles[0])
-    old_sentiment = company.sentiment
+        # sort articles by sentiment and add notification if very positive/negative
+        articles.sort(key=lambda x: abs(x.sentiment), reverse=True)
+        if len(articles) > 0:
+            if sentiment_score_to_text(abs(articles[0].sentiment)) == "Very Positive":
+                add_article_notification(company, articles[0])
+        old_sentiment = company.sentiment
 
-    # update sentiment (average of all articles) then add notigication if significant change
-    company.update_sentiment()
-    if abs(old_sentiment - company.sentiment) > 0.25:
-        diff_percent = abs(old_sentiment - company.sentiment) / old_sentiment * 100
-        add_company_notification(company, diff_percent)
+        # update sentiment (average of all articles) then add notigication if significant change
+        company.update_sentiment()
+        diff = abs(old_sentiment - company.sentiment)
+        if diff > 0.25:
+            # relative to the old sentiment, or to the full scale if there was none
+            diff_percent = diff / (abs(old_sentiment) or 1) * 100
+            add_company_notification(company, diff_percent)
 
 
 def add_article_notification(company: db.Company, article: db.Article) -> None:
@@ -435,19 +453,11 @@ def add_article_notification(company: db.Company, article: db.Article) -> None:
     {article.headline} by {article.publisher}.
     You can read it at <a href="{article.url}">{article.url}</a>"""
 
-    # add notification to db
-    notification = db.Notification.create_article_notification(article.id, message)
-    db.db.session.add(notification)
-    db.db.session.commit()
-
-    # add notification to all users following the company
-    users = [
-        get_user_by_id(user_company.user_id)
-        for user_company in db.UserCompany.get_by_company(company.id)
-    ]
-    for user in users:
-        db.db.session.add(db.UserNotification(user.id, notification.id))
-    db.db.session.commit()
+    # add notification to db, and to all users following the company
+    with db.unit_of_work():
+        notification = db.Notification.create_article_notification(article.id, message)
+        db.db.session.add(notification)
+        notification.add_followers(company.id)
 
 
 def add_company_notification(company: db.Company, sentiment_diff: float) -> None:
@@ -455,16 +465,10 @@ def add_company_notification(company: db.Company, sentiment_diff: float) -> None
     It's sentiment score has changed by {sentiment_diff}%.
     Find out more at <a href="localhost:5000/#company/{company.id}">localhost:5000/#company/{company.id}</a>"""
 
-    notification = db.Notification.create_company_notification(company.id, message)
-    db.db.session.add(notification)
-    db.db.session.commit()
-    users = [
-        get_user_by_id(user_company.user_id)
-        for user_company in db.UserCompany.get_by_company(company.id)
-    ]
-    for user in users:
-        db.db.session.add(db.UserNotification(user.id, notification.id))
-    db.db.session.commit()
+    with db.unit_of_work():
+        notification = db.Notification.create_company_notification(company.id, message)
+        db.db.session.add(notification)
+        notification.add_followers(company.id)
 
 
 def get_company_articles(company_id: int) -> list[db.Article] | None:
@@ -474,55 +478,140 @@ def get_company_articles(company_id: int) -> list[db.Article] | None:
     if not company:
         return None
 
-    # if company has been scraped in the last day, return articles (avoids excessive api calls)
-    if not (
-        company.last_scraped is None or (datetime.now() - company.last_scraped).days > 1
+    news = fetch_company_news(company)
+    if news is None:
+        return company.get_articles()
+    with db.unit_of_work():
+        return save_company_news(company, news)
+
+
+def fetch_company_news(company: db.Company) -> list[dict] | None:
+    """Fetch a company's news and score the articles whose url is not stored yet, without writing to the
+    database. Returns the news, with a `sentiment` for each new article, or None if the company has been scraped
+    recently and already has articles."""
+    # if company has been scraped in the last day, keep its articles (avoids excessive api calls)
+    if (
+        not (
+            company.last_scraped is None
+            or (datetime.now() - company.last_scraped).days > 1
+        )
+        and company.has_articles()
     ):
-        articles = company.get_articles()
-        if len(articles) > 0:
-            return articles
+        return None
 
     news = run(api.get_news(company.name))  # get new news
-    news_in_db = company.get_articles()  # get news in db
-    articles: list[db.Article] = []
-
-    # iterate through news and update db with new articles
-    for i in range(len(news)):
-        if i >= len(news_in_db):
-            # if new article add it
-            article = db.Article(
-                news[i]["url"],
-                news[i]["headline"],
-                news[i]["publisher"],
-                news[i]["date"],
-                news[i]["summary"],
-            )
-            db.db.session.add(article)
-            db.db.session.commit()
-            article.update_sentiment(sentiment_label(news[i]["full_text"])["score"])
-            db.db.session.add(db.ArticleCompany(article.id, company_id))
-            db.db.session.commit()
-            articles.append(article)
-        else:
-            # add new info to existing article
-            for key, value in news[i].items():
-                if value != "":
-                    setattr(news_in_db[i], key, value)
-            articles.append(news_in_db[i])
-    db.db.session.commit()
-    return articles
+    known = db.Article.known_urls([item["url"] for item in news])
+    new_news = [
+        item for item in news if db.Article.normalize_url(item["url"]) not in known
+    ]
+
+    # score all new articles in one batch
+    labels = sentiment_label_batch(
+        [item["full_text"] for item in new_news],
+        constants.SENTIMENT_PROCESSES,
+        constants.SENTIMENT_VECTORIZED,
+    )
+    for item, label in zip(new_news, labels):
+        item["sentiment"] = label["score"]
+    return news
+
+
+def save_company_news(company: db.Company, news: list[dict]) -> list[db.Article]:
+    """Upsert the news fetched by `fetch_company_news` by url, and link the articles that are not linked to the
+    company yet. Returns the articles in the order of the news. DOES NOT commit."""
+    article_ids = db.Article.upsert_many(news)
+    articles = {
+        article.id: article
+        for article in db.db.session.query(db.Article)
+        .where(db.Article.id.in_(article_ids))
+        .populate_existing()
+    }
+    linked = {
+        article_id
+        for (article_id,) in db.db.session.query(db.ArticleCompany.article_id).where(
+            db.ArticleCompany.company_id == company.id,
+            db.ArticleCompany.article_id.in_(article_ids),
+        )
+    }
+    for article_id in dict.fromkeys(article_ids):
+        if article_id not in linked:
+            company.add_article(articles[article_id])
+    return [articles[article_id] for article_id in article_ids]
 
 
 def recent_articles(count: int = 10) -> Optional[list[dict]]:
     """accepts "count" of articles to display, returns list of articles mapped to a dictionary, sorted by date"""
     articles = set(
-        db.db.session.query(db.Article).order_by(desc(db.Article.date)).limit(50).all()
+        db.db.session.query(db.Article)
+        .order_by(desc(db.Article.date))
+        .limit(50)
+        .options(db.Article.with_companies())
+        .all()
+    )
+    # Sort the articles based on the date attribute, then map them to dictionaries
+    sorted_articles = sorted(articles, key=lambda x: x.date, reverse=True)[:count]
+    return list(map(db.Article.to_dict, sorted_articles))
+
+
+def search(query: str, limit: int = constants.SEARCH_LIMIT) -> dict:
+    """Full-text search of company names, CEOs and descriptions, and of article headlines and summaries. Returns the
+    best `limit` companies and articles, best first, each with its relevance score and a snippet around the matches.
+    """
+    return {
+        "companies": [
+            {**company.to_dict(), "score": score, "snippet": snippet}
+            for company, score, snippet in db.COMPANY_SEARCH.search(
+                query, limit, constants.SEARCH_CANDIDATES
+            )
+        ],
+        "articles": [
+            {**article.to_dict(), "score": score, "snippet": snippet}
+            for article, score, snippet in db.ARTICLE_SEARCH.search(
+                query, limit, constants.SEARCH_CANDIDATES
+            )
+        ],
+    }
+
+
+def get_sentiment_history(company_id: int, days: int = 365) -> dict | None:
+    """Return a company's daily sentiment over the last `days` days (oldest first) and its precomputed sentiment
+    windows."""
+    company = db.Company.get_details(company_id)
+    if not company:
+        return None
+
+    today = datetime.now().date()
+    series = db.CompanySentimentDaily.get_range(
+        company_id, today - timedelta(days=days - 1), today
     )
-    # Map the articles to dictionaries and sort them based on the date attribute
-    sorted_articles = sorted(
-        map(db.Article.to_dict, articles), key=lambda x: x["published"], reverse=True
-    )[:count]
-    return sorted_articles
+    return {
+        "companyId": company_id,
+        "series": list(map(db.CompanySentimentDaily.to_dict, series)),
+        "windows": list(
+            map(db.CompanySentimentWindow.to_dict, company.get_sentiment_windows())
+        ),
+    }
+
+
+def get_similar_companies(
+    company_id: int, user_id: int = None, count: int = 5
+) -> list[dict] | None:
+    """Return up to `count` companies most similar to the company, according to the recommender model."""
+    if not db.Company.get_details(company_id):
+        return None
+
+    similar = similar_companies.similar(company_id, count)
+    details = {
+        company["id"]: company
+        for company in get_company_details_many(
+            [similar_id for similar_id, _ in similar], user_id
+        )
+    }
+    return [
+        {"companyId": similar_id, "similarity": score, "company": details[similar_id]}
+        for similar_id, score in similar
+        if similar_id in details
+    ]
 
 
 def article_by_id(article_id: int = None) -> db.Article | None:
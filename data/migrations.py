@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, text
+
+from data.database import (
+    Article,
+    Company,
+    CompanySentimentDaily,
+    Stock,
+    UserCompany,
+    db,
+)
+
+# Versioned, in-place upgrades of an existing database. The version of a database is stored in SQLite's
+# `user_version` pragma; migration N (1-based index into MIGRATIONS) upgrades a database from version N-1 to N.
+# Migrations must be safe to run on a database created by `db.create_all()`, which already has the latest tables.
+# Their DDL is written out as it was at the time, rather than read from the models, which describe the latest schema.
+
+
+def add_column(table: str, column: str, definition: str) -> None:
+    """Add a column to a table, if it does not exist yet."""
+    columns = inspect(db.session.connection()).get_columns(table)
+    if column not in {c["name"] for c in columns}:
+        db.session.execute(
+            text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}')
+        )
+
+
+def add_index(
+    name: str, table: str, columns: tuple[str, ...], unique: bool = False
+) -> None:
+    """Create an index on the given columns of a table, if it does not exist yet."""
+    db.session.execute(
+        text(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{name}" '
+            f'ON "{table}" ({", ".join(columns)})'
+        )
+    )
+
+
+def company_sentiment_totals() -> None:
+    """Running sentiment totals on Company (sentiment_sum, article_count)."""
+    add_column("Company", "sentiment_sum", "FLOAT DEFAULT 0.0")
+    add_column("Company", "article_count", "INTEGER DEFAULT 0")
+    Company.rebuild_sentiment_totals()
+
+
+def company_sentiment_daily() -> None:
+    """Daily sentiment rollup (CompanySentimentDaily), backfilled from existing articles."""
+    CompanySentimentDaily.rebuild()
+
+
+def user_recommendations() -> None:
+    """Precomputed recommendations (UserRecommendation), computed when first requested."""
+    add_column("User", "recommendations_stale", "BOOLEAN DEFAULT 1")
+
+
+def follows_only() -> None:
+    """UserCompany only stores follows and unfollows; sector distances are computed when needed."""
+    db.session.query(UserCompany).filter(UserCompany.distance >= 0).delete()
+
+
+def hot_column_indexes() -> None:
+    """Indexes on the columns the hot queries filter and sort on."""
+    add_index("ix_ArticleCompany_company_id", "ArticleCompany", ("company_id",))
+    add_index("ix_UserCompany_company_id", "UserCompany", ("company_id", "distance"))
+    add_index("ix_Stock_company_id", "Stock", ("company_id",))
+    add_index("ix_Article_url", "Article", ("url",))
+    add_index("ix_Article_date", "Article", ("date",))
+    add_index("ix_Company_name", "Company", ("name",))
+
+
+def stock_price_series() -> None:
+    """Stock price series are stored as packed (timestamp, close) arrays instead of space separated prices. The old
+    strings had no timestamps, so the prices are spread evenly over their period up to now.
+    """
+    now = datetime.now().timestamp()
+    periods = {
+        "stock_day": timedelta(days=1),
+        "stock_week": timedelta(days=7),
+        "stock_month": timedelta(days=30),
+        "stock_year": timedelta(days=365),
+    }
+    rows = db.session.execute(
+        text(f'SELECT symbol, {", ".join(periods)} FROM "Stock"')
+    ).all()
+    for symbol, *series in rows:
+        values = {}
+        for (column, period), prices in zip(periods.items(), series):
+            if not isinstance(prices, str):
+                continue  # already converted
+            prices = [float(price) for price in prices.split()]
+            step = period.total_seconds() / max(len(prices) - 1, 1)
+            start = now - step * (len(prices) - 1)
+            values[column] = [(start + i * step, p) for i, p in enumerate(prices)]
+        if values:
+            db.session.query(Stock).filter(Stock.symbol == symbol).update(
+                {getattr(Stock, column): points for column, points in values.items()}
+            )
+
+
+def unique_article_urls() -> None:
+    """Article urls are normalized and unique. Duplicate articles are merged into the oldest one, then the
+    sentiment totals are recomputed. Articles without a url are kept as they are, with an empty url stored as
+    NULL, which the unique index allows any number of."""
+    # the plain index on url is replaced by a unique one once the urls are unique
+    db.session.execute(text('DROP INDEX IF EXISTS "ix_Article_url"'))
+
+    kept = {}
+    merged = []
+    db.session.execute(text("UPDATE \"Article\" SET url = NULL WHERE url = ''"))
+    for article_id, url in db.session.execute(
+        text('SELECT id, url FROM "Article" WHERE url IS NOT NULL ORDER BY id')
+    ):
+        url = Article.normalize_url(url)
+        if url in kept:
+            merged.append({"old": article_id, "new": kept[url]})
+        else:
+            kept[url] = article_id
+    if merged:
+        for table in ("ArticleCompany", "StoryArticle"):
+            db.session.execute(
+                text(
+                    f'UPDATE OR IGNORE "{table}" SET article_id = :new WHERE article_id = :old'
+                ),
+                merged,
+            )
+            db.session.execute(
+                text(f'DELETE FROM "{table}" WHERE article_id = :old'), merged
+            )
+        db.session.execute(
+            text(
+                'UPDATE "Notification" SET target_id = :new WHERE target_type = 2 AND target_id = :old'
+            ),
+            merged,
+        )
+        db.session.execute(text('DELETE FROM "Article" WHERE id = :old'), merged)
+    if kept:
+        db.session.execute(
+            text('UPDATE "Article" SET url = :url WHERE id = :id'),
+            [{"url": url, "id": article_id} for url, article_id in kept.items()],
+        )
+    Company.rebuild_sentiment_totals()
+    CompanySentimentDaily.rebuild()
+    add_index("ix_Article_url", "Article", ("url",), unique=True)
+
+
+# The full-text indexes and the triggers keeping them in sync, as `SearchIndex` created them when they were added
+FULL_TEXT_SEARCH = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS "CompanySearch" USING fts5(name, ceo, description, content="Company", content_rowid="id",
+    tokenize="unicode61 remove_diacritics 2", prefix="2 3")""",
+    """CREATE TRIGGER IF NOT EXISTS "CompanySearch_insert" AFTER INSERT ON "Company" BEGIN
+    INSERT INTO "CompanySearch"(rowid, name, ceo, description) VALUES (new.id, new.name, new.ceo, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "CompanySearch_delete" AFTER DELETE ON "Company" BEGIN
+    INSERT INTO "CompanySearch"("CompanySearch", rowid, name, ceo, description) VALUES ('delete', old.id, old.name, old.ceo, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "CompanySearch_update" AFTER UPDATE OF name, ceo, description ON "Company" BEGIN
+    INSERT INTO "CompanySearch"("CompanySearch", rowid, name, ceo, description) VALUES ('delete', old.id, old.name, old.ceo, old.description);
+    INSERT INTO "CompanySearch"(rowid, name, ceo, description) VALUES (new.id, new.name, new.ceo, new.description);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS "ArticleSearch" USING fts5(headline, summary, content="Article", content_rowid="id",
+    tokenize="unicode61 remove_diacritics 2", prefix="2 3")""",
+    """CREATE TRIGGER IF NOT EXISTS "ArticleSearch_insert" AFTER INSERT ON "Article" BEGIN
+    INSERT INTO "ArticleSearch"(rowid, headline, summary) VALUES (new.id, new.headline, new.summary);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "ArticleSearch_delete" AFTER DELETE ON "Article" BEGIN
+    INSERT INTO "ArticleSearch"("ArticleSearch", rowid, headline, summary) VALUES ('delete', old.id, old.headline, old.summary);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "ArticleSearch_update" AFTER UPDATE OF headline, summary ON "Article" BEGIN
+    INSERT INTO "ArticleSearch"("ArticleSearch", rowid, headline, summary) VALUES ('delete', old.id, old.headline, old.summary);
+    INSERT INTO "ArticleSearch"(rowid, headline, summary) VALUES (new.id, new.headline, new.summary);
+    END""",
+]
+
+
+def full_text_search() -> None:
+    """Full-text indexes over companies (CompanySearch) and articles (ArticleSearch), built from the existing rows."""
+    for statement in FULL_TEXT_SEARCH:
+        db.session.execute(text(statement))
+    for index in ("CompanySearch", "ArticleSearch"):
+        db.session.execute(
+            text(f'INSERT INTO "{index}"("{index}") VALUES (\'rebuild\')')
+        )
+
+
+MIGRATIONS = [
+    company_sentiment_totals,
+    company_sentiment_daily,
+    user_recommendations,
+    follows_only,
+    hot_column_indexes,
+    stock_price_series,
+    unique_article_urls,
+    full_text_search,
+]
+
+
+def get_version() -> int:
+    """Return the schema version of the database."""
+    return db.session.execute(text("PRAGMA user_version")).scalar()
+
+
+def upgrade_database() -> int:
+    """Create missing tables, then apply every migration newer than the database's version, each in its own
+    transaction. Returns the new version. Must be called within an app context."""
+    db.create_all()
+    version = get_version()
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration()
+        db.session.execute(text(f"PRAGMA user_version = {number}"))
+        db.session.commit()
+    return len(MIGRATIONS)
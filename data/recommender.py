@@ -0,0 +1,650 @@
+# Recommender model registry, interaction matrix, training worker and sector index
+# The ALS model is kept in memory and shared by every request. Training never modifies the published model:
+# it trains a copy and publishes it as a new version, which is then saved to disk in the background.
+# The user-company feedback the model is trained on is loaded from the database once and then kept up to date
+# by follows and unfollows. Training runs on a background worker, so requests never wait for it.
+# Soft (sector based) recommendations are scored when requested, from the sectors of every company held in memory.
+from __future__ import annotations
+
+import atexit
+import json
+import threading
+import traceback
+from copy import deepcopy
+from hashlib import blake2b
+from os import path, replace
+from time import monotonic, time
+from typing import TYPE_CHECKING, Callable
+
+import numpy as np
+
+from server import constants
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from implicit.cpu.als import AlternatingLeastSquares
+    from scipy.sparse import csr_matrix
+
+
+class ModelRegistry:
+    """The current recommender model and its version. Reading the model never touches the disk once it has been
+    loaded or published; publishing swaps the model and version together. Metadata describing the data a model
+    was trained on is saved next to it, as JSON."""
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self.metadata_path = path.splitext(model_path)[0] + ".json"
+        self._metadata: dict | None = None
+        # (model, version) is replaced as a whole, so readers never see a model with the wrong version
+        self._current: tuple[AlternatingLeastSquares | None, int] = (None, 0)
+        self._lock = threading.Lock()
+        self._saved_version = 0
+        self._writer: threading.Thread | None = None
+        self._listeners: list[Callable[[AlternatingLeastSquares, int], None]] = []
+
+    @property
+    def version(self) -> int:
+        return self._current[1]
+
+    @property
+    def metadata(self) -> dict | None:
+        """Metadata of the current model."""
+        return self._metadata
+
+    def switch(self, model_path: str) -> None:
+        """Use the model saved at `model_path` from now on (loaded on first use), e.g. to benchmark on a scratch
+        database without replacing the app's model."""
+        self.flush()
+        with self._lock:
+            self.model_path = model_path
+            self.metadata_path = path.splitext(model_path)[0] + ".json"
+            self._current = (None, self._current[1])
+            self._metadata = None
+            self._saved_version = self._current[1]
+
+    def get(self) -> tuple[AlternatingLeastSquares | None, int]:
+        """Return the current model and its version, loading the saved model on first use. The model is None if
+        no model has been trained yet."""
+        model, version = self._current
+        if model is None:
+            with self._lock:
+                if self._current[0] is None and path.exists(self.model_path):
+                    from joblib import load
+
+                    self._current = (load(self.model_path), self._current[1] + 1)
+                    self._metadata = self.saved_metadata()
+                    self._saved_version = self._current[1]
+                model, version = self._current
+        return model, version
+
+    def copy(self) -> AlternatingLeastSquares | None:
+        """Return a copy of the current model to train, or None if there is no model yet."""
+        model, _ = self.get()
+        return deepcopy(model) if model is not None else None
+
+    def saved_metadata(self) -> dict | None:
+        """Return the metadata of the saved model, or None if there is no saved model or it has no metadata."""
+        if not path.exists(self.model_path) or not path.exists(self.metadata_path):
+            return None
+        try:
+            with open(self.metadata_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def subscribe(
+        self, listener: Callable[[AlternatingLeastSquares, int], None]
+    ) -> None:
+        """Call `listener` with every newly published model and its version."""
+        self._listeners.append(listener)
+
+    def publish(
+        self,
+        model: AlternatingLeastSquares,
+        metadata: dict | None = None,
+        persist: bool = True,
+    ) -> int:
+        """Make `model` the current model and return its version. If `persist`, it is saved to disk, with its
+        `metadata`, by a background thread; only the newest version is written if several are published in quick
+        succession."""
+        with self._lock:
+            version = self._current[1] + 1
+            self._current = (model, version)
+            self._metadata = metadata
+            if persist and self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._persist, name="model-writer", daemon=True
+                )
+                self._writer.start()
+        for listener in self._listeners:
+            listener(model, version)
+        return version
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until the current model has been saved. Returns False on timeout."""
+        writer = self._writer
+        if writer is not None:
+            writer.join(timeout)
+            return not writer.is_alive()
+        return True
+
+    def _persist(self) -> None:
+        """Save the newest model until no newer version has been published."""
+        from joblib import dump
+
+        while True:
+            with self._lock:
+                model, version = self._current
+                metadata = self._metadata
+                if version <= self._saved_version:
+                    self._writer = None
+                    return
+            # write temporary files first so the saved model is never half-written
+            temporary = self.model_path + ".tmp"
+            dump(model, temporary)
+            replace(temporary, self.model_path)
+            temporary = self.metadata_path + ".tmp"
+            with open(temporary, "w") as f:
+                json.dump(metadata, f)
+            replace(temporary, self.metadata_path)
+            self._saved_version = version
+
+
+class InteractionMatrix:
+    """Feedback of every user on every company they have followed: 1 if they follow it, -1 if they unfollowed
+    it. Loaded from the database on first use, then updated with `set` whenever a user follows or unfollows.
+    """
+
+    def __init__(self):
+        self._rows: dict[int, dict[int, int]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        # one more than the largest user id and company id with feedback
+        self.user_count = 0
+        self.item_count = 0
+
+    def load(self) -> None:
+        """(Re)load the feedback from the database. Must be called within an app context."""
+        from data.database import UserCompany, db
+
+        entries = db.session.query(
+            UserCompany.user_id, UserCompany.company_id, UserCompany.distance
+        ).filter(UserCompany.distance < 0)
+        rows: dict[int, dict[int, int]] = {}
+        user_count = item_count = 0
+        for user_id, company_id, distance in entries:
+            rows.setdefault(user_id, {})[company_id] = 1 if distance == -1 else -1
+            user_count = max(user_count, user_id + 1)
+            item_count = max(item_count, company_id + 1)
+        with self._lock:
+            self._rows = rows
+            self.user_count = user_count
+            self.item_count = item_count
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def clear(self) -> None:
+        """Forget the loaded feedback; it is loaded again on first use."""
+        with self._lock:
+            self._rows = {}
+            self.user_count = self.item_count = 0
+            self._loaded = False
+
+    def set(self, user_id: int, company_id: int, value: int) -> None:
+        """Record the feedback of a user on a company (1 for a follow, -1 for an unfollow)."""
+        if not self._loaded:
+            return  # the change is read from the database when the matrix is loaded
+        with self._lock:
+            self._rows.setdefault(user_id, {})[company_id] = value
+            self.user_count = max(self.user_count, user_id + 1)
+            self.item_count = max(self.item_count, company_id + 1)
+
+    def user_row(self, user_id: int, item_count: int | None = None) -> csr_matrix:
+        """Return the feedback of one user as a 1 x item_count matrix. If `item_count` is given, feedback on
+        companies with a larger id is left out."""
+        import scipy.sparse as sp
+
+        self._ensure_loaded()
+        with self._lock:
+            item_count = self.item_count if item_count is None else item_count
+            row = {
+                item: value
+                for item, value in self._rows.get(user_id, {}).items()
+                if item < item_count
+            }
+        return sp.csr_matrix(
+            (list(row.values()), ([0] * len(row), list(row.keys()))),
+            shape=(1, item_count),
+        )
+
+    def user_items(self, user_ids: set[int] | None = None) -> csr_matrix:
+        """Return the feedback of every user (or only of `user_ids`) as a users x items matrix, indexed by id. Only
+        the rows of the selected users are read, so selecting a few users is cheap however many there are.
+        """
+        import scipy.sparse as sp
+
+        self._ensure_loaded()
+        users, items, feedback = [], [], []
+        with self._lock:
+            selected = self._rows.keys() if user_ids is None else user_ids
+            for user_id in selected:
+                row = self._rows.get(user_id, {})
+                users.extend([user_id] * len(row))
+                items.extend(row.keys())
+                feedback.extend(row.values())
+            user_count = self.user_count
+            item_count = self.item_count
+        return sp.csr_matrix((feedback, (users, items)), shape=(user_count, item_count))
+
+    def items(self) -> list[int]:
+        """Return the ids of every company with feedback, in ascending order."""
+        self._ensure_loaded()
+        with self._lock:
+            return sorted({item for row in self._rows.values() for item in row})
+
+
+# Number of users recommended to in one call to the model
+PRECOMPUTE_BATCH = 1000
+# Number of companies compared with every company in one matrix product
+SIMILARITY_BLOCK = 1024
+
+
+def training_data() -> tuple[csr_matrix, dict]:
+    """Return the feedback of every user with enough activity, and metadata describing it: the number of
+    interactions and a checksum. Must be called within an app context."""
+    from data.database import User, db
+
+    # Only users with enough activity are included in a full training
+    ready = {
+        user_id for (user_id,) in db.session.query(User.id).filter(User.hard_ready >= 0)
+    }
+    sparse_data = interactions.user_items(ready)
+
+    entries = sparse_data.tocoo()
+    order = np.lexsort((entries.col, entries.row))
+    triples = np.stack([entries.row, entries.col, entries.data]).astype(np.int64)
+    checksum = blake2b(triples[:, order].tobytes(), digest_size=16).hexdigest()
+    return sparse_data, {"interactions": int(sparse_data.nnz), "checksum": checksum}
+
+
+def fit_model() -> None:
+    """Train a new model on the feedback of every user with enough activity, and publish it. Must be called within
+    an app context."""
+    from implicit.als import AlternatingLeastSquares
+
+    interactions.load()
+    sparse_data, metadata = training_data()
+
+    model = AlternatingLeastSquares(factors=10, regularization=0.5, iterations=50)
+    model.fit(sparse_data)
+    metadata["fitted"] = metadata["updated"] = time()
+    registry.publish(model, metadata)
+
+
+def load_model(max_age: float) -> bool:
+    """Use the saved model if it was trained on the current data less than `max_age` seconds ago. Otherwise
+    serve the saved model, if any, while a full refit is queued on the training worker. If there is no saved
+    model, one is trained now. Returns True if the saved model is up to date. Must be called within an app
+    context."""
+    if registry.get()[0] is None:
+        fit_model()
+        return False
+
+    interactions.load()
+    _, metadata = training_data()
+    saved = registry.metadata
+    age = time() - saved["fitted"] if saved is not None else max_age
+    if (
+        saved is not None
+        and saved["checksum"] == metadata["checksum"]
+        and age < max_age
+    ):
+        # the next scheduled refit is due when the saved model reaches max_age
+        trainer.delay_refit(max_age - age)
+        return True
+    trainer.refit(background=True)
+    return False
+
+
+def partial_fit(user_ids: list[int]) -> None:
+    """Retrain the given users, and the companies, on the latest feedback and publish the result. Takes the
+    activity counted so far off the users' activity count; follows made while training count towards the next
+    training. Must be called within an app context."""
+    from data.database import User, db
+
+    consumed = {}
+    for user_id, hard_ready in db.session.query(User.id, User.hard_ready).filter(
+        User.id.in_(user_ids)
+    ):
+        consumed.setdefault(max(hard_ready, 0), []).append(user_id)
+    model = registry.copy()
+    if model is None:
+        fit_model()
+    else:
+        sparse_data = interactions.user_items()
+        items = interactions.items()
+        sparse_data1 = sparse_data.T.tocsr()
+        trained = [user_id for user_id in user_ids if user_id < sparse_data.shape[0]]
+
+        # Retrain model only on the new data; implicit fails on an empty selection (new users, no feedback)
+        if trained:
+            model.partial_fit_users(trained, sparse_data[trained])
+        if items:
+            model.partial_fit_items(items, sparse_data1[items])
+
+    # Restart count to know when to retrain; requests increment it concurrently, so it is not simply set to 0
+    for activity, ids in consumed.items():
+        db.session.query(User).filter(User.id.in_(ids)).update(
+            {User.hard_ready: User.hard_ready - activity}, synchronize_session=False
+        )
+    db.session.commit()
+
+    if model is not None:
+        # the model now reflects the latest data, but keeps the age of its last full fit
+        _, metadata = training_data()
+        metadata["fitted"] = (registry.metadata or {}).get("fitted", time())
+        metadata["updated"] = time()
+        registry.publish(model, metadata)
+
+
+def precompute_recommendations(
+    user_ids: list[int] | None = None, k: int = constants.REC_PRECOMPUTE_K
+) -> int:
+    """Compute and store the best `k` recommendations of the given users (by default, every user with enough
+    activity) with the current model, in batches. Returns the number of users with recommendations. Must be called
+    within an app context."""
+    from data.database import User, UserRecommendation, db
+
+    if user_ids is None:
+        user_ids = [
+            user_id
+            for (user_id,) in db.session.query(User.id).filter(User.hard_ready >= 0)
+        ]
+    model, _ = registry.get()
+    if model is None:
+        return 0
+
+    # Users without factors can't be recommended to, and companies without factors can't be recommended
+    user_count, item_count = model.user_factors.shape[0], model.item_factors.shape[0]
+    trained = [user_id for user_id in user_ids if user_id < user_count]
+
+    rows = []
+    for i in range(0, len(trained), PRECOMPUTE_BATCH):
+        batch = trained[i : i + PRECOMPUTE_BATCH]
+        # only the batch's feedback: refreshing one user must not build every user's row
+        sparse_data = interactions.user_items(set(batch))
+        sparse_data.resize((max(sparse_data.shape[0], user_count), item_count))
+        ids, scores = model.recommend(
+            batch, sparse_data[batch], N=k, filter_already_liked_items=True
+        )
+        for user_id, user_ids_row, user_scores in zip(batch, ids, scores):
+            rows.extend(
+                {
+                    "user_id": user_id,
+                    "rank": rank,
+                    "company_id": int(company_id),
+                    "score": float(score),
+                }
+                for rank, (company_id, score) in enumerate(
+                    zip(user_ids_row, user_scores)
+                )
+                # 0 is not a company, and filtered companies are padded with -1
+                if company_id > 0
+            )
+
+    UserRecommendation.replace(user_ids, rows)
+    db.session.commit()
+    return len(trained)
+
+
+class TrainingWorker:
+    """Background thread that trains the recommender. Users to retrain are queued with `submit`; every user
+    submitted until no new submission has arrived for `debounce` seconds is retrained in one partial fit. A full
+    refit runs every `refit_interval` seconds, or when requested with `refit`. After training, the recommendations
+    of the retrained users (every user, after a full refit) are precomputed."""
+
+    def __init__(self, debounce: float, refit_interval: float):
+        self.debounce = debounce
+        self.refit_interval = refit_interval
+        self._pending: set[int] = set()
+        self._refit_requested = False
+        self._last_submit = 0.0
+        self._next_refit = monotonic() + refit_interval
+        self._condition = threading.Condition()
+        self.running = False
+
+    def submit(self, user_id: int) -> None:
+        """Queue a user to be retrained. If the worker is not running, the user is retrained immediately."""
+        if not self.running:
+            partial_fit([user_id])
+            return
+        with self._condition:
+            self._pending.add(user_id)
+            self._last_submit = monotonic()
+            self._condition.notify()
+
+    def refit(self, background: bool = False) -> None:
+        """Queue a full refit of the model. If the worker is not running, the model is refitted immediately, unless
+        `background`, in which case the refit waits for the worker to start."""
+        if not self.running and not background:
+            fit_model()
+            return
+        with self._condition:
+            self._refit_requested = True
+            self._condition.notify()
+
+    def delay_refit(self, seconds: float) -> None:
+        """Schedule the next full refit `seconds` from now."""
+        with self._condition:
+            self._next_refit = monotonic() + seconds
+            self._condition.notify()
+
+    def _next_job(self) -> tuple[list[int], bool]:
+        """Wait until there is work to do and return (users to retrain, whether to do a full refit)."""
+        with self._condition:
+            while True:
+                now = monotonic()
+                refit = self._refit_requested or now >= self._next_refit
+                quiet_for = now - self._last_submit
+                if refit or (self._pending and quiet_for >= self.debounce):
+                    break
+                if self._pending:
+                    timeout = self.debounce - quiet_for
+                else:
+                    timeout = self._next_refit - now
+                self._condition.wait(timeout)
+            users = sorted(self._pending)
+            self._pending = set()
+            self._refit_requested = False
+            if refit:
+                self._next_refit = monotonic() + self.refit_interval
+            return users, refit
+
+    def run(self, app: Flask) -> None:
+        """Train until the process exits."""
+        from data.database import db
+
+        self.running = True
+        with app.app_context():
+            while True:
+                users, refit = self._next_job()
+                try:
+                    # a new model changes everyone's recommendations, a partial fit only those of its users
+                    if refit:
+                        fit_model()
+                    if users:
+                        partial_fit(users)
+                    precompute_recommendations(None if refit else users)
+                except Exception:
+                    # keep serving the last published model, and keep training on later requests
+                    db.session.rollback()
+                    traceback.print_exc()
+
+
+class SimilarityIndex:
+    """The `size` most similar companies of every company: the cosine similarity of their ALS item factors.
+    Rebuilt for every published model; the most similar companies of one company are then a lookup.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # (neighbours, scores, model version), replaced as a whole
+        self._current: tuple[np.ndarray, np.ndarray, int] | None = None
+        self._lock = threading.Lock()
+
+    def build(self, model: AlternatingLeastSquares, version: int) -> None:
+        """Compute the neighbours of every company, comparing blocks of SIMILARITY_BLOCK companies at a time."""
+        factors = np.asarray(model.item_factors, dtype=np.float32)
+        norms = np.linalg.norm(factors, axis=1)
+        known = norms > 0  # companies no one has followed have no factors
+        unit = np.divide(
+            factors, norms[:, None], out=np.zeros_like(factors), where=known[:, None]
+        )
+
+        count = len(factors)
+        size = min(self.size, max(count - 1, 0))
+        neighbours = np.full((count, size), -1, dtype=np.int32)
+        scores = np.full((count, size), -np.inf, dtype=np.float32)
+        for start in range(0, count, SIMILARITY_BLOCK):
+            stop = min(start + SIMILARITY_BLOCK, count)
+            similarity = unit[start:stop] @ unit.T
+            similarity[:, ~known] = -np.inf
+            similarity[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            if size == 0:
+                continue
+            # unordered top `size` of every row, then sorted best first
+            top = np.argpartition(-similarity, size - 1, axis=1)[:, :size]
+            top_scores = np.take_along_axis(similarity, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            neighbours[start:stop] = np.take_along_axis(top, order, axis=1)
+            scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+        scores[~known] = -np.inf
+
+        with self._lock:
+            if self._current is None or self._current[2] < version:
+                self._current = (neighbours, scores, version)
+
+    def similar(self, company_id: int, k: int) -> list[tuple[int, float]]:
+        """Return up to `k` (company id, similarity) pairs most similar to the company, best first."""
+        current = self._current
+        if current is None or current[2] != registry.version:
+            model, version = registry.get()
+            if model is None:
+                return []
+            self.build(model, version)
+            current = self._current
+
+        neighbours, scores, _ = current
+        if not 0 <= company_id < len(neighbours):
+            return []
+        return [
+            (int(neighbour), float(score))
+            for neighbour, score in zip(
+                neighbours[company_id][:k], scores[company_id][:k]
+            )
+            # 0 is not a company
+            if neighbour > 0 and score > -np.inf
+        ]
+
+
+class SectorIndex:
+    """The sectors of every company, as a companies x sectors boolean matrix indexed by id. Loaded from the database
+    on first use, then updated with `add` whenever a company or a company sector is committed.
+    """
+
+    def __init__(self):
+        self._sectors = np.zeros((0, 0), dtype=bool)
+        self._companies = np.zeros(0, dtype=bool)  # ids of existing companies
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self) -> None:
+        """(Re)load the sectors from the database. Must be called within an app context."""
+        from data.database import Company, CompanySector, db
+
+        company_ids = [company_id for (company_id,) in db.session.query(Company.id)]
+        pairs = db.session.query(
+            CompanySector.company_id, CompanySector.sector_id
+        ).all()
+        company_count = max(company_ids + [c for c, _ in pairs], default=-1) + 1
+        sector_count = max((s for _, s in pairs), default=-1) + 1
+
+        companies = np.zeros(company_count, dtype=bool)
+        companies[company_ids] = True
+        sectors = np.zeros((company_count, sector_count), dtype=bool)
+        if pairs:
+            rows, columns = zip(*pairs)
+            sectors[list(rows), list(columns)] = True
+        with self._lock:
+            self._companies = companies
+            self._sectors = sectors
+            self._loaded = True
+
+    def clear(self) -> None:
+        """Forget the loaded sectors; they are loaded again on first use."""
+        with self._lock:
+            self._sectors = np.zeros((0, 0), dtype=bool)
+            self._companies = np.zeros(0, dtype=bool)
+            self._loaded = False
+
+    def add(self, company_id: int, sector_id: int | None = None) -> None:
+        """Record that a company exists and, if given, that it is in a sector."""
+        if not self._loaded:
+            return  # read from the database when the index is loaded
+        with self._lock:
+            rows, columns = self._sectors.shape
+            if sector_id is not None:
+                columns = max(columns, sector_id + 1)
+            # copy, so readers holding the old matrix are unaffected
+            sectors = np.zeros((max(rows, company_id + 1), columns), dtype=bool)
+            sectors[:rows, : self._sectors.shape[1]] = self._sectors
+            companies = np.zeros(len(sectors), dtype=bool)
+            companies[:rows] = self._companies
+            companies[company_id] = True
+            if sector_id is not None:
+                sectors[company_id, sector_id] = True
+            self._sectors, self._companies = sectors, companies
+
+    def recommend(
+        self, sector_ids: list[int], exclude: list[int], k: int
+    ) -> list[tuple[int, int]]:
+        """Return the `k` (company id, distance) pairs with the lowest distance to the given sectors, lowest company
+        id first among equals, leaving out the `exclude`d companies. The distance of a company is the number of the
+        sectors it is not in."""
+        if not self._loaded:
+            from flask import has_app_context
+
+            if has_app_context():
+                self.load()
+        with self._lock:
+            sectors, companies = self._sectors, self._companies
+
+        columns = [s for s in sector_ids if s < sectors.shape[1]]
+        distances = len(sector_ids) - sectors[:, columns].sum(axis=1)
+        candidates = companies.copy()
+        candidates[[c for c in exclude if c < len(candidates)]] = False
+        ids = np.flatnonzero(candidates)
+        if k <= 0 or len(ids) == 0:
+            return []
+
+        # rank by distance then id, as one integer key
+        keys = distances[ids].astype(np.int64) * len(candidates) + ids
+        if k < len(ids):
+            keys = keys[np.argpartition(keys, k - 1)[:k]]
+        keys.sort()
+        return [
+            (int(key % len(candidates)), int(key // len(candidates))) for key in keys
+        ]
+
+
+registry = ModelRegistry(constants.REC_MODEL_PATH)
+interactions = InteractionMatrix()
+sector_index = SectorIndex()
+similar_companies = SimilarityIndex(constants.SIMILAR_COMPANIES)
+registry.subscribe(similar_companies.build)
+trainer = TrainingWorker(constants.REC_TRAIN_DEBOUNCE, constants.REC_REFIT_INTERVAL)
+# Don't lose a published model if the app stops while it is being saved
+atexit.register(registry.flush)
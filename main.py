@@ -4,6 +4,7 @@ from threading import Thread
 from dotenv import load_dotenv
 
 from data.interface import update_loop
+from data.recommender import trainer
 from server import constants
 from server.app import create_app
 
@@ -21,6 +22,11 @@ if __name__ == "__main__":
     update_thread.daemon = True
     update_thread.start()
 
+    # Start the recommender training worker
+    training_thread = Thread(target=trainer.run, args=(app,))
+    training_thread.daemon = True
+    training_thread.start()
+
     app.run(
         host=constants.FLASK_HOST,
         port=constants.FLASK_PORT,
@@ -1,7 +1,7 @@
-import IStock, {extractStockData, StockViewType} from "../types/IStock";
+import IStock, {extractStockData, extractStockTimes, StockViewType} from "../types/IStock";
 import {useState} from "react";
 import {ICompany} from "../types/ICompany";
-import {calculateMean, capitalise, createDateArray, formatDate, formatDateTime, formatNumber} from "../util";
+import {calculateMean, capitalise, formatDate, formatDateTime, formatNumber} from "../util";
 import ChartAnnotation from "chartjs-plugin-annotation";
 import Chart, {ChartOptions} from "chart.js/auto";
 import { Line } from "react-chartjs-2";
@@ -45,40 +45,6 @@ export const StockInformation = ({ stock, company }: IProps) => {
 
 export default StockInformation;
 
-/** Given a stock type, return [start, end] dates. */
-function stockTypeToDates(type: StockViewType): [Date, Date] {
- switch (type) {
-   case "day":
-     return [
-       new Date(Date.now() - 1000 * 60 * 60 * 24),
-       new Date()
-     ];
-   case "week":
-     return [
-       new Date(Date.now() - 1000 * 60 * 60 * 24 * 7),
-       new Date()
-     ];
-   case "month":
-     return [
-       (function () {
-         const date = new Date();
-         date.setMonth(date.getMonth() - 1);
-         return date;
-       })(),
-       new Date()
-     ];
-   case "year":
-     return [
-       (function () {
-         const date = new Date();
-         date.setFullYear(date.getFullYear() - 1);
-         return date;
-       })(),
-       new Date()
-     ];
- }
-}
-
 /** Generate line chart. */
 function generateLineGraph(stock: IStock, type: StockViewType) {
   const stockData = extractStockData(stock, type);
@@ -87,7 +53,7 @@ function generateLineGraph(stock: IStock, type: StockViewType) {
   const mean = calculateMean(stockData);
 
   const data = {
-      labels: createDateArray(...stockTypeToDates(type), stockData.length).map(type === "day" ? formatDateTime : formatDate),
+      labels: extractStockTimes(stock, type).map(type === "day" ? formatDateTime : formatDate),
       datasets: [
         {
           label: stock.symbol,
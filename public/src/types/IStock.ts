@@ -9,6 +9,11 @@ export interface IStock {
   stockWeek: number[];
   stockMonth: number[];
   stockYear: number[];
+  /** Time of each price in the matching series, in milliseconds since the epoch. */
+  stockDayTimes: number[];
+  stockWeekTimes: number[];
+  stockMonthTimes: number[];
+  stockYearTimes: number[];
 }
 
 export default IStock;
@@ -24,3 +29,13 @@ export function extractStockData(stock: IStock, type: StockViewType): number[] {
     case "year": return stock.stockYear;
   }
 }
+
+/** Given the stock view type, return the time of each price of the stock data. */
+export function extractStockTimes(stock: IStock, type: StockViewType): number[] {
+  switch (type) {
+    case "day": return stock.stockDayTimes;
+    case "week": return stock.stockWeekTimes;
+    case "month": return stock.stockMonthTimes;
+    case "year": return stock.stockYearTimes;
+  }
+}
@@ -1,12 +1,12 @@
 import mimetypes
 from os import getcwd, getenv, path
 
-import scipy.sparse as sp
 from flask import Flask, render_template
-from implicit.als import AlternatingLeastSquares
-from joblib import dump
+from sqlalchemy import event
 
-from data.database import User, UserCompany, db
+from analysis.analysis import enable_sentiment_cache, set_sentiment_limits
+from data.database import db
+from data.migrations import upgrade_database
 from server import constants
 from server.mail import mail
 from server.routes import create_endpoints
@@ -21,20 +21,25 @@ def create_app() -> Flask:
         template_folder="public/dist",
     )
     app.secret_key = getenv("FLASK_SECRET")
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + path.join(
-        path.abspath(getcwd()), constants.DATABASE_PATH
-    )
 
     # Attach the database
     db.app = app
-    db.init_app(app)
+    configure_database(app, path.join(path.abspath(getcwd()), constants.DATABASE_PATH))
+
+    # Re-use sentiment scores of previously seen articles
+    enable_sentiment_cache(
+        constants.SENTIMENT_CACHE_PATH, constants.SENTIMENT_CACHE_CAPACITY
+    )
+    set_sentiment_limits(
+        constants.SENTIMENT_MAX_SENTENCES, constants.SENTIMENT_CONFIDENCE_WIDTH
+    )
 
     # Attach the email service
     mail.app = app
     mail.init_app(app)
 
     with app.app_context():
+        upgrade_database()
         init_train_hard()
 
     # Setup file MIME types correctly -
@@ -56,25 +61,41 @@ def create_app() -> Flask:
     return app
 
 
-def init_train_hard():
-    user_items = (
-        db.session.query(UserCompany)
-        .join(User, User.id == UserCompany.user_id)
-        .filter(User.hard_ready >= 0, UserCompany.distance < 0)
-    )
-    users = []
-    items = []
-    feedback = []
-    for entry in user_items:
-        users.append(entry.user_id)
-        items.append(entry.company_id)
-        if entry.distance == -1:
-            feedback.append(1)
+def configure_database(
+    app: Flask, database_path: str, mode: str = constants.SQLITE_MODE
+) -> None:
+    """Attach the SQLite database at `database_path` to the app. Every connection is set up for the storage
+    `mode`: "wal" lets requests read while the update loop writes, "default" keeps SQLite's rollback journal.
+    """
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + database_path
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        # request threads, the update loop and the training worker each hold a connection
+        "pool_size": constants.SQLITE_POOL_SIZE,
+        "max_overflow": constants.SQLITE_MAX_OVERFLOW,
+        "pool_timeout": constants.SQLITE_POOL_TIMEOUT,
+        "connect_args": {"timeout": constants.SQLITE_BUSY_TIMEOUT / 1000},
+    }
+    db.init_app(app)
+
+    def set_pragmas(connection, _record) -> None:
+        cursor = connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {constants.SQLITE_BUSY_TIMEOUT}")
+        if mode == "wal":
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.execute(f"PRAGMA mmap_size = {constants.SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size = -{constants.SQLITE_CACHE_SIZE}")
         else:
-            feedback.append(-1)
+            cursor.execute("PRAGMA journal_mode = DELETE")
+        cursor.close()
 
-    sparse_data = sp.csr_matrix((feedback, (users, items)))
+    with app.app_context():
+        event.listen(db.engine, "connect", set_pragmas)
+
+
+def init_train_hard():
+    from data.recommender import load_model
 
-    model = AlternatingLeastSquares(factors=10, regularization=0.5, iterations=50)
-    model.fit(sparse_data)
-    dump(model, "data/rec_model.npz")
+    # Reuse the saved model if it is up to date, otherwise refit it in the background
+    load_model(constants.REC_MODEL_MAX_AGE)
@@ -5,7 +5,46 @@ FLASK_PORT = 5000
 # Application parameters
 APP_NAME = "I-2-I"
 DATABASE_PATH = "data/database.db"
+SENTIMENT_CACHE_PATH = "data/sentiment_cache.db"
+SENTIMENT_CACHE_CAPACITY = 500_000  # entries (articles and sentences)
+REC_MODEL_PATH = "data/rec_model.npz"
+# Follows are retrained together once no follow has arrived for this many seconds
+REC_TRAIN_DEBOUNCE = 2.0
+# Seconds between full refits of the recommender model
+REC_REFIT_INTERVAL = 24 * 60 * 60
+# Number of recommendations precomputed and stored per user
+REC_PRECOMPUTE_K = 20
+# Number of most similar companies stored per company
+SIMILAR_COMPANIES = 20
+# A saved model older than this is refitted on start-up (in the background)
+REC_MODEL_MAX_AGE = REC_REFIT_INTERVAL
 APP_HTML_FILE = "index.html"
 
+# SQLite storage mode: "wal" (requests read while the update loop writes) or "default" (rollback journal)
+SQLITE_MODE = "wal"
+SQLITE_BUSY_TIMEOUT = 5000  # ms a connection waits for a lock before failing
+SQLITE_CACHE_SIZE = 64 * 1024  # KiB of page cache per connection
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database file memory mapped
+# Connection pool: connections kept open, extra connections allowed under load, and seconds to wait for one
+SQLITE_POOL_SIZE = 10
+SQLITE_MAX_OVERFLOW = 20
+SQLITE_POOL_TIMEOUT = 30
+
+# Full-text search: hits returned per kind (companies, articles) and tokens of text around the matches in a snippet
+SEARCH_LIMIT = 10
+SEARCH_SNIPPET_TOKENS = 12
+# If set, only the most recently added this many matches are ranked. This bounds the time of a query that matches
+# most rows, but older rows are then never returned however well they match. None ranks every match.
+SEARCH_CANDIDATES = None
+
+# Number of worker processes used to score a batch of articles (0 or 1 scores in-process)
+SENTIMENT_PROCESSES = 0
+# Score article batches with the vectorized NumPy kernel instead of NLTK's per-sentence VADER
+SENTIMENT_VECTORIZED = False
+# Long articles are scored sentence by sentence: stop after this many sentences (None reads the whole article)
+SENTIMENT_MAX_SENTENCES = 500
+# ... or once the 95% confidence interval of the mean score is within +/- this width (None never stops early)
+SENTIMENT_CONFIDENCE_WIDTH = 0.05
+
 # Are we defaulting log-in to a user?
 USER_DEFAULT = None
@@ -1,5 +1,4 @@
 import threading
-from collections import Counter
 from functools import wraps
 from typing import Callable
 
@@ -317,7 +316,7 @@ def create_endpoints(app: Flask) -> None:
         """
 
         sort_by = request.form.get("sort_by")
-        companies = [obj for _, obj in interface.get_followed_companies(user.id)]
+        companies = interface.get_followed_companies(user.id)
 
         if sort_by == "marketCapAsc":
             companies.sort(key=lambda x: x["marketCap"])
@@ -354,6 +353,22 @@ def create_endpoints(app: Flask) -> None:
         """Defaults to 10 most recent articles"""
         return jsonify(interface.recent_articles())
 
+    @app.route("/search", methods=("POST",))
+    def search():
+        """
+        Full-text search of companies and articles. Accepts `query` and optionally `count` (default 10) of each.
+        Words match as prefixes. Returns the best companies and articles, each with a `score` (higher is better) and
+        an HTML `snippet` with the matched words in <mark> tags.
+        """
+        try:
+            query = str(request.form["query"])
+            count = int(get_form_or_default("count", constants.SEARCH_LIMIT))
+        except (ValueError, KeyError):
+            abort(400)
+            return
+
+        return jsonify(interface.search(query, max(count, 1)))
+
     @app.route("/user/for-you", methods=("POST",))
     @ensure_auth
     def recommend(user: User):
@@ -368,20 +383,10 @@ def create_endpoints(app: Flask) -> None:
         }[]
         """
 
-        def to_dict(uc: UserCompany) -> dict:
-            return {
-                **uc.to_dict(),
-                "company": interface.get_company_details_by_id(uc.company_id, user.id)[
-                    1
-                ],
-            }
-
-        def to_dict2(company_id: int) -> dict:
+        def company_details(company_ids: list[int]) -> dict[int, dict]:
             return {
-                "companyId": int(company_id),
-                "company": interface.get_company_details_by_id(
-                    int(company_id), user.id
-                )[1],
+                company["id"]: company
+                for company in interface.get_company_details_many(company_ids, user.id)
             }
 
         try:
@@ -390,15 +395,32 @@ def create_endpoints(app: Flask) -> None:
             count = 5
         if user.hard_ready >= 0:
             user.hard_train()
-            recommendations = user.hard_recommend(count)
+            recommendations = user.get_recommendations(count)
             for i in range(len(recommendations)):
                 if int(recommendations[i]) == 0:
                     recommendations = recommendations[:i]
                     break
             if len(recommendations) != 0:
-                return jsonify(list(map(to_dict2, recommendations)))
+                companies = company_details(list(map(int, recommendations)))
+                return jsonify(
+                    [
+                        {
+                            "companyId": int(company_id),
+                            "company": companies[int(company_id)],
+                        }
+                        for company_id in recommendations
+                        if int(company_id) in companies
+                    ]
+                )
         recommendations = user.soft_recommend(count)
-        return jsonify(list(map(to_dict, recommendations)))
+        companies = company_details([uc.company_id for uc in recommendations])
+        return jsonify(
+            [
+                {**uc.to_dict(), "company": companies[uc.company_id]}
+                for uc in recommendations
+                if uc.company_id in companies
+            ]
+        )
 
     @app.route("/company/follow", methods=("POST",))
     @ensure_auth
@@ -456,6 +478,50 @@ def create_endpoints(app: Flask) -> None:
 
         return jsonify({"error": False, "data": response[1]})
 
+    @app.route("/company/sentiment-history", methods=("POST",))
+    @ensure_auth
+    def get_company_sentiment_history(user: User):
+        """
+        Accepts: 'id' of company and 'days' of history (default 365).
+        Returns the daily sentiment series (oldest first) and the precomputed 1/7/30/365 day windows.
+        """
+        try:
+            company_id = int(request.form["id"])
+            days = int(get_form_or_default("days", 365))
+        except (ValueError, KeyError):
+            abort(400)
+            return
+
+        history = interface.get_sentiment_history(company_id, max(days, 1))
+        if history is None:
+            return jsonify(
+                {"error": True, "message": f"Cannot find company with id #{company_id}"}
+            )
+
+        return jsonify({"error": False, "data": history})
+
+    @app.route("/company/similar", methods=("POST",))
+    @ensure_auth
+    def get_similar_companies(user: User):
+        """
+        Accepts: 'id' of company and 'count' of similar companies (default 5).
+        Returns the companies most similar to it (by the recommender's company factors), most similar first.
+        """
+        try:
+            company_id = int(request.form["id"])
+            count = int(get_form_or_default("count", 5))
+        except (ValueError, KeyError):
+            abort(400)
+            return
+
+        similar = interface.get_similar_companies(company_id, user.id, max(count, 0))
+        if similar is None:
+            return jsonify(
+                {"error": True, "message": f"Cannot find company with id #{company_id}"}
+            )
+
+        return jsonify({"error": False, "data": similar})
+
     @app.route("/company/popular", methods=("POST",))
     @ensure_auth
     def get_popular_companies(user: User):
@@ -465,17 +531,14 @@ def create_endpoints(app: Flask) -> None:
         except (ValueError, KeyError):
             max_count = 10
 
-        company_ids = [
-            user_company.company_id
-            for user_company in db.session.query(UserCompany).all()
-        ]
         most_common_companies = [
-            elem for elem, _ in Counter(company_ids).most_common(max_count)
-        ]
-        popular = [
-            interface.get_company_details_by_id(company_id, user.id)[1]
-            for company_id in most_common_companies
+            company_id
+            for (company_id,) in db.session.query(UserCompany.company_id)
+            .group_by(UserCompany.company_id)
+            .order_by(db.func.count().desc(), UserCompany.company_id)
+            .limit(max_count)
         ]
+        popular = interface.get_company_details_many(most_common_companies, user.id)
         return jsonify(popular)
 
     @app.route("/company/stock", methods=("POST",))
@@ -553,7 +616,5 @@ def create_endpoints(app: Flask) -> None:
             )
 
             return jsonify(
-                list(
-                    map(lambda c: interface.get_company_details(c, user.id), companies)
-                )
+                interface.get_company_details_many([c.id for c in companies], user.id)
             )
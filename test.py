@@ -7,9 +7,45 @@ import argparse
 import sys
 
 # Import tests:
+from testing.analysis.sentiment_bench_test import run as run_sentiment_bench
+from testing.analysis.sentiment_cache_test import run as run_sentiment_cache_test
 from testing.analysis.sentiment_test import run as run_sentiment_test
+from testing.analysis.stream_test import run as run_stream_test
+from testing.analysis.vectorized_test import run as run_vectorized_test
+from testing.database.contention_bench_test import run as run_contention_bench
+from testing.database.ingest_test import run as run_ingest_test
+from testing.database.migration_test import run as run_migration_test
+from testing.database.notification_bench_test import run as run_notification_bench
+from testing.database.query_count_test import run as run_query_count_test
+from testing.database.query_plan_test import run as run_query_plan_test
+from testing.database.search_bench_test import run as run_search_bench
+from testing.database.search_test import run as run_search_test
+from testing.database.unit_of_work_test import run as run_unit_of_work_test
+from testing.recommender.recommender_bench_test import run as run_recommender_bench
+from testing.recommender.sector_index_test import run as run_sector_index_test
+from testing.recommender.training_test import run as run_training_test
+from testing.startup.startup_test import run as run_startup_test
 
-available_tests = ["sentiment"]
+available_tests = [
+    "sentiment",
+    "vectorized",
+    "stream",
+    "sentiment-cache",
+    "startup",
+    "query-plan",
+    "query-count",
+    "unit-of-work",
+    "ingest",
+    "migration",
+    "search",
+    "training",
+    "sector-index",
+    "sentiment-bench",
+    "recommender-bench",
+    "contention-bench",
+    "notification-bench",
+    "search-bench",
+]
 
 BUFFER = "\u001b[33;5m==============================\033[0m"  # Yellow
 NBUFFER = BUFFER + "\n"
@@ -37,6 +73,11 @@ parser.add_argument(
 parser.add_argument(
     "-v", "--verbose", action="store_true", help="prints results of passed tests"
 )
+parser.add_argument(
+    "--update-baseline",
+    action="store_true",
+    help="benchmarks overwrite their stored baseline instead of comparing against it",
+)
 
 args = parser.parse_args()
 argsdict = vars(args)
@@ -47,6 +88,30 @@ def default_script(verbose, narrate):
     print(NBUFFER)
     run_sentiment_test(show_pass=verbose, narrate=narrate)
     print(BUFFER)
+    run_vectorized_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_stream_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_sentiment_cache_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_startup_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_query_plan_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_query_count_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_unit_of_work_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_ingest_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_migration_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_search_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_training_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
+    run_sector_index_test(show_pass=verbose, narrate=narrate)
+    print(BUFFER)
 
 
 if argsdict["list"]:
@@ -57,6 +122,7 @@ if argsdict["list"]:
 
 verbose = argsdict["verbose"]
 narrate = not argsdict["quiet"]
+update_baseline = argsdict["update_baseline"]
 
 # Execute tests that are requested
 if argsdict["test"] is None:
@@ -68,6 +134,48 @@ else:
         print("")
         if test == "sentiment":
             run_sentiment_test(show_pass=verbose, narrate=narrate)
+        elif test == "vectorized":
+            run_vectorized_test(show_pass=verbose, narrate=narrate)
+        elif test == "stream":
+            run_stream_test(show_pass=verbose, narrate=narrate)
+        elif test == "sentiment-cache":
+            run_sentiment_cache_test(show_pass=verbose, narrate=narrate)
+        elif test == "startup":
+            run_startup_test(show_pass=verbose, narrate=narrate)
+        elif test == "query-plan":
+            run_query_plan_test(show_pass=verbose, narrate=narrate)
+        elif test == "query-count":
+            run_query_count_test(show_pass=verbose, narrate=narrate)
+        elif test == "unit-of-work":
+            run_unit_of_work_test(show_pass=verbose, narrate=narrate)
+        elif test == "ingest":
+            run_ingest_test(show_pass=verbose, narrate=narrate)
+        elif test == "migration":
+            run_migration_test(show_pass=verbose, narrate=narrate)
+        elif test == "search":
+            run_search_test(show_pass=verbose, narrate=narrate)
+        elif test == "training":
+            run_training_test(show_pass=verbose, narrate=narrate)
+        elif test == "sector-index":
+            run_sector_index_test(show_pass=verbose, narrate=narrate)
+        elif test == "sentiment-bench":
+            run_sentiment_bench(
+                show_pass=verbose, narrate=narrate, update_baseline=update_baseline
+            )
+        elif test == "recommender-bench":
+            run_recommender_bench(
+                show_pass=verbose, narrate=narrate, update_baseline=update_baseline
+            )
+        elif test == "contention-bench":
+            run_contention_bench(show_pass=verbose, narrate=narrate)
+        elif test == "notification-bench":
+            run_notification_bench(
+                show_pass=verbose, narrate=narrate, update_baseline=update_baseline
+            )
+        elif test == "search-bench":
+            run_search_bench(
+                show_pass=verbose, narrate=narrate, update_baseline=update_baseline
+            )
         else:  # This should never be executed as the argparse should catch this
             print("Test not found: ", test)
         print(BUFFER)
@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+from random import Random
+from statistics import quantiles
+from time import perf_counter
+
+from nltk import tokenize
+
+from analysis.analysis import SentimentScorer, load_nltk
+from testing.helpers import BUFFER, run_results
+
+try:
+    from resource import RUSAGE_SELF, getrusage
+except ImportError:  # not available on Windows
+    getrusage = None
+
+BASELINE_FILE = "testing/analysis/data/sentiment_bench_baseline.json"
+# Fail if throughput drops by more than this percentage compared to the baseline
+MAX_REGRESSION = 20
+# The synthetic corpus is this many times larger than the dummy corpus
+SYNTHETIC_SCALE = 100
+
+
+def load_dummy_corpus() -> list[str]:
+    conn = sqlite3.connect("testing/analysis/data/dummy.db")
+    texts = [record[0] for record in conn.execute("SELECT Text FROM Articles;")]
+    conn.close()
+    return texts
+
+
+def make_synthetic_corpus(texts: list[str], scale: int, seed: int = 0) -> list[str]:
+    """Build `scale` times as many articles by shuffling the sentences of `texts` into new articles of similar
+    length."""
+    random = Random(seed)
+    sentences = [s for text in texts for s in tokenize.sent_tokenize(text)]
+    lengths = [len(tokenize.sent_tokenize(text)) for text in texts]
+    return [
+        " ".join(random.choices(sentences, k=random.choice(lengths)))
+        for _ in range(len(texts) * scale)
+    ]
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process, in MB (Linux reports KB)."""
+    if getrusage is None:
+        return None
+    return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark(texts: list[str]) -> dict:
+    """Score every text, returning throughput, latency percentiles and peak RSS. A new scorer without a cache is
+    used, so that every text is scored rather than looked up."""
+    scorer = SentimentScorer()
+    scorer.score(texts[0])  # warm up: load the lexicon outside of the measurement
+
+    latencies = []
+    start = perf_counter()
+    for text in texts:
+        article_start = perf_counter()
+        scorer.score(text)
+        latencies.append(perf_counter() - article_start)
+    elapsed = perf_counter() - start
+
+    percentiles = quantiles(latencies, n=100)
+    return {
+        "articles": len(texts),
+        "articles_per_sec": len(texts) / elapsed,
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run(show_pass=False, show_fail=True, narrate=True, update_baseline=False):
+    if narrate:
+        print("Starting Sentiment Benchmark")
+        print(BUFFER)
+
+    load_nltk()
+    dummy = load_dummy_corpus()
+    measurements = {
+        "dummy": benchmark(dummy),
+        "synthetic": benchmark(make_synthetic_corpus(dummy, SYNTHETIC_SCALE)),
+    }
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE) and not update_baseline:
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)
+    else:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(measurements, f, indent=2)
+        if narrate:
+            print("Baseline written to", BASELINE_FILE)
+            print(BUFFER)
+
+    results = {}
+    for corpus, result in measurements.items():
+        if narrate:
+            rss = result["peak_rss_mb"]
+            print(f"Corpus: {corpus} ({result['articles']} articles)")
+            print(f"Throughput: {result['articles_per_sec']:.1f} articles/sec")
+            print(
+                f"Latency p50: {result['p50_ms']:.2f}ms, p95: {result['p95_ms']:.2f}ms"
+            )
+            print("Peak RSS: ", "unavailable" if rss is None else f"{rss:.1f}MB")
+            print(BUFFER)
+
+        if baseline is None or corpus not in baseline:
+            continue
+
+        expected = baseline[corpus]["articles_per_sec"]
+        change = (result["articles_per_sec"] - expected) / expected * 100
+        results[f"{corpus} throughput"] = (
+            change >= -MAX_REGRESSION,
+            f"Throughput change from baseline: {change:+.1f}% (allowed -{MAX_REGRESSION}%)",
+        )
+
+    return run_results(results, "Sentiment Benchmark", show_pass, show_fail, narrate)
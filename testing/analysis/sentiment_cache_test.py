@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import tempfile
+from time import sleep
+
+from analysis.analysis import get_scorer, sentiment_label, sentiment_label_batch
+from analysis.cache import SentimentCache, content_hash
+from testing.helpers import BUFFER, run_results
+
+# Entries kept by the cache under eviction test
+CAPACITY = 3
+# Pause between cache operations, so that each gets a later last used time
+TICK = 0.01
+
+# Texts that differ only in whitespace or Unicode composition, and so share a key
+EQUIVALENT_TEXTS = {
+    "Whitespace": ("Shares rose  sharply.\n", " Shares rose sharply."),
+    "Unicode composition": ("Caf\u00e9 chain expands", "Cafe\u0301 chain expands"),
+}
+
+TEXT = "Shares rose sharply. Investors are delighted."
+
+
+def count_scored(cache: SentimentCache, action) -> int:
+    """Number of sentences scored by VADER while `action` runs with `cache` attached to the shared scorer."""
+    scorer = get_scorer()
+    scored = []
+    previous = scorer.cache
+    scorer.cache = cache
+    score = scorer.sentence_scores
+
+    def counting(sentences: list[str]) -> list[float]:
+        scored.extend(sentences)
+        return score(sentences)
+
+    scorer.sentence_scores = counting
+    try:
+        action()
+    finally:
+        del scorer.sentence_scores
+        scorer.cache = previous
+    return len(scored)
+
+
+def last_used(path: str, key: str) -> float:
+    """The last used time of `key` as stored in the cache's database."""
+    conn = sqlite3.connect(path)
+    try:
+        query = "SELECT last_used FROM SentimentCache WHERE hash = ?"
+        return conn.execute(query, (key,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Sentiment Cache Test")
+        print(BUFFER)
+
+    results = {
+        f"{name} is normalized": (
+            content_hash(first) == content_hash(second),
+            f"Hashes: {content_hash(first)}, {content_hash(second)}",
+        )
+        for name, (first, second) in EQUIVALENT_TEXTS.items()
+    }
+    results["Case is kept"] = (
+        content_hash("Shares rose") != content_hash("shares rose"),
+        "",
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SentimentCache(os.path.join(directory, "cache.db"))
+        results["Unknown keys miss"] = (
+            (found := cache.get_many(["a", "b"])) == {},
+            f"Found: {found}",
+        )
+        cache.put_many({"a": 0.5, "b": -0.25})
+        results["Stored keys hit"] = (
+            (found := cache.get_many(["a", "b", "c"])) == {"a": 0.5, "b": -0.25},
+            f"Found: {found}",
+        )
+        first, second = EQUIVALENT_TEXTS["Whitespace"]
+        cache.put_many({content_hash(first): 0.75})
+        results["Equivalent texts hit the same entry"] = (
+            (found := cache.get_many([content_hash(second)]))
+            == {content_hash(second): 0.75},
+            f"Found: {found}",
+        )
+        cache.put_many({"a": 1.0})
+        results["Stored keys are not overwritten"] = (
+            (found := cache.get_many(["a"])) == {"a": 0.5},
+            f"Found: {found}",
+        )
+
+        # hits are only marked as used in the database in batches
+        path = os.path.join(directory, "cache.db")
+        stored = last_used(path, "b")
+        sleep(TICK)
+        cache.get_many(["b"])
+        deferred = last_used(path, "b") == stored
+        cache.flush()
+        results["Hits are marked as used in batches"] = (
+            deferred and last_used(path, "b") > stored,
+            f"Written on lookup: {not deferred}",
+        )
+
+        # the public API looks the cache up before running VADER
+        cache = SentimentCache(os.path.join(directory, "scorer.db"))
+        scored = [count_scored(cache, lambda: sentiment_label(TEXT)) for _ in range(2)]
+        results["Scored texts are not scored again"] = (
+            scored[0] > 0 and scored[1] == 0,
+            f"Sentences scored: {scored}",
+        )
+        scored = count_scored(
+            cache, lambda: sentiment_label_batch(["Markets fell. " + TEXT])
+        )
+        results["Known sentences are not scored again"] = (
+            scored == 1,
+            f"Sentences scored: {scored}",
+        )
+
+        # the least recently used key is evicted, even if it was stored later than the others
+        cache = SentimentCache(os.path.join(directory, "lru.db"), CAPACITY)
+        for key in ("a", "b", "c"):
+            cache.put_many({key: 0.0})
+            sleep(TICK)
+        cache.get_many(["a"])
+        sleep(TICK)
+        cache.put_many({"d": 0.0})
+        kept = sorted(cache.get_many(["a", "b", "c", "d"]))
+        results["Least recently used key is evicted"] = (
+            kept == ["a", "c", "d"],
+            f"Kept: {kept}",
+        )
+        results["Size is capped at capacity"] = (
+            len(cache) == CAPACITY,
+            f"Size: {len(cache)}",
+        )
+        reopened = SentimentCache(os.path.join(directory, "lru.db"), CAPACITY)
+        results["Size is restored when reopened"] = (
+            len(reopened) == CAPACITY,
+            f"Size: {len(reopened)}",
+        )
+
+    return run_results(results, "Sentiment Cache Test", show_pass, show_fail, narrate)
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import tempfile
+
+from analysis.analysis import SentimentScorer, get_scorer, text_chunks
+from analysis.cache import SentimentCache
+from analysis.vectorized import TOLERANCE
+from testing.helpers import BUFFER, run_results
+
+# Small chunks, so that many sentences are split across chunk boundaries
+CHUNK_SIZE = 256
+# Sentence cap used for the capped stream
+MAX_SENTENCES = 5
+# Confidence interval half width used for the early stopping check
+CONFIDENCE_WIDTH = 0.1
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    conn = sqlite3.connect("testing/analysis/data/dummy.db")
+    records = conn.execute("SELECT ArticleID, Text FROM Articles;").fetchall()
+    conn.close()
+
+    if narrate:
+        print("Starting Streaming Sentiment Test")
+        print(BUFFER)
+
+    scorer = get_scorer()
+
+    # Each article: the uncapped stream matches the whole-text score and the capped stream stops at the cap
+    long_text = " ".join(text for _, text in records)
+    records.append(("all articles", long_text))
+    results = {}
+    for article_id, text in records:
+        expected = scorer.score(text)
+        streamed = scorer.score_stream(text_chunks(text, CHUNK_SIZE))
+        capped = 0
+        for estimate in scorer.stream_scores(
+            text_chunks(text, CHUNK_SIZE), MAX_SENTENCES
+        ):
+            capped = estimate.count
+        results[f"Article ID: {article_id}"] = (
+            abs(expected - streamed) <= TOLERANCE and capped <= MAX_SENTENCES,
+            f"Score: {expected}, streamed: {streamed}\n"
+            f"Sentences read with a cap of {MAX_SENTENCES}: {capped}",
+        )
+
+    # Early stopping: the long article stops once the interval is narrow enough, with the full score inside it
+    estimate = None
+    for estimate in scorer.stream_scores(
+        text_chunks(long_text), confidence_width=CONFIDENCE_WIDTH
+    ):
+        pass
+    expected = scorer.score(long_text)
+    stopped_early = estimate.half_width() <= CONFIDENCE_WIDTH
+    results["Early stop"] = (
+        stopped_early and abs(estimate.mean - expected) <= estimate.half_width() * 2,
+        f"Stopped after {estimate.count} sentences\n"
+        f"Estimate: {estimate.mean}, score: {expected}\n"
+        f"Interval half width: {estimate.half_width()}",
+    )
+
+    # A capped score in a shared cache is not served to a scorer without the cap, or with the other kernel
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SentimentCache(os.path.join(directory, "cache.db"))
+        capped = SentimentScorer(cache=cache, max_sentences=MAX_SENTENCES)
+        uncapped = SentimentScorer(cache=cache)
+        vectorized = SentimentScorer(vectorized=True, cache=cache)
+        capped_score = capped.score(long_text)
+        uncapped_score = uncapped.score(long_text)
+        vectorized_score = vectorized.score(long_text)
+        expected = get_scorer().score_stream(text_chunks(long_text))
+        expected_vectorized = get_scorer(True).score_stream(text_chunks(long_text))
+
+    results["Cached scores are kept apart per cap and kernel"] = (
+        capped_score != expected
+        and uncapped_score == expected
+        and vectorized_score == expected_vectorized,
+        f"Capped: {capped_score}\n"
+        f"Uncapped: {uncapped_score}, expected: {expected}\n"
+        f"Vectorized: {vectorized_score}, expected: {expected_vectorized}",
+    )
+
+    return run_results(
+        results, "Streaming Sentiment Test", show_pass, show_fail, narrate
+    )
@@ -0,0 +1,56 @@
+import sqlite3
+from time import perf_counter
+
+from nltk import tokenize
+
+from analysis.analysis import get_scorer
+from analysis.vectorized import TOLERANCE
+from testing.helpers import BUFFER, run_results
+
+# Number of times the dummy corpus is repeated for the throughput comparison
+THROUGHPUT_REPEAT = 20
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    conn = sqlite3.connect("testing/analysis/data/dummy.db")
+    records = conn.execute("SELECT ArticleID, Text FROM Articles;").fetchall()
+    conn.close()
+
+    if narrate:
+        print("Starting Vectorized Sentiment Test")
+        print(BUFFER)
+
+    exact = get_scorer()
+    vectorized = get_scorer(vectorized=True)
+
+    results = {}
+    for article_id, text in records:
+        # Compare every sentence, then the article score
+        sentences = tokenize.sent_tokenize(text)
+        expected = [exact.analyzer.polarity_scores(s)["compound"] for s in sentences]
+        result = vectorized.kernel.polarity_compound(sentences)
+        worst = max(
+            (abs(e - r) for e, r in zip(expected, result)),
+            default=0.0,
+        )
+        article_diff = abs(exact.score(text) - vectorized.score(text))
+        results[f"Article ID: {article_id}"] = (
+            worst <= TOLERANCE and article_diff <= TOLERANCE,
+            f"Largest sentence difference: {worst}\n"
+            f"Article difference: {article_diff}",
+        )
+
+    if narrate:
+        sentences = [
+            s for _, text in records for s in tokenize.sent_tokenize(text)
+        ] * THROUGHPUT_REPEAT
+        for name, scorer in (("NLTK VADER", exact), ("Vectorized", vectorized)):
+            start = perf_counter()
+            scorer.sentence_scores(sentences)
+            elapsed = perf_counter() - start
+            print(f"{name}: {len(sentences) / elapsed:.1f} sentences/sec")
+        print(BUFFER)
+
+    return run_results(
+        results, "Vectorized Sentiment Test", show_pass, show_fail, narrate
+    )
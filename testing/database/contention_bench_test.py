@@ -0,0 +1,190 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from random import Random
+from statistics import quantiles
+from time import perf_counter, sleep
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from data.database import Article, Company, db
+from server.routes import USER_ID, create_endpoints
+from testing.helpers import BUFFER, make_app, run_results
+
+RESULTS_FILE = "testing/database/data/contention_bench_results.json"
+MODES = ("default", "wal")
+# Seconds each mode is hammered for
+DURATION = 3.0
+READERS = 4
+COMPANIES = 20
+# Articles written per update transaction, and seconds the transaction stays open after writing them (scoring the
+# next batch). A batch is larger than SQLite's default page cache, so under the rollback journal the writer spills
+# it to the database file and holds the exclusive lock, blocking readers, until it commits.
+ARTICLES_PER_UPDATE = 500
+SUMMARY = "Summary " * 800
+UPDATE_HOLD = 0.2
+READ_ENDPOINTS = (
+    ("GET", "/news/recent", None),
+    ("POST", "/company/sentiment-history", {"id": "1", "days": "30"}),
+)
+
+
+def make_server(path: str, mode: str) -> Flask:
+    """Flask app serving the endpoints from a scratch database at `path` in the given storage mode."""
+    app = make_app("contention-bench", path, mode)
+    app.secret_key = "contention-bench"
+    # let database errors reach the readers instead of becoming HTTP 500s
+    app.testing = True
+    create_endpoints(app)
+    return app
+
+
+def populate() -> None:
+    """A handful of companies, each with a few days of articles."""
+    db.create_all()
+    companies = [
+        Company(f"Company {i}", "", "", "", 0, "", None)
+        for i in range(1, COMPANIES + 1)
+    ]
+    db.session.add_all(companies)
+    db.session.flush()
+    write_articles(Random(0), companies, 100)
+    db.session.commit()
+
+
+def write_articles(random: Random, companies: list[Company], count: int) -> None:
+    """Add `count` articles linked to random companies. DOES NOT commit."""
+    now = datetime.now()
+    articles = [
+        Article(
+            f"https://example.com/{random.getrandbits(64)}",
+            "Headline",
+            "Publisher",
+            now - timedelta(days=random.randint(0, 30)),
+            SUMMARY,
+        )
+        for _ in range(count)
+    ]
+    for article in articles:
+        article.sentiment = random.uniform(-1, 1)
+    db.session.add_all(articles)
+    db.session.flush()
+    for article in articles:
+        random.choice(companies).add_article(article)
+
+
+def update(app: Flask, stop: threading.Event, stats: dict) -> None:
+    """Emulate the update loop: large write transactions held open, one after another, until stopped."""
+    random = Random(1)
+    with app.app_context():
+        companies = db.session.query(Company).all()
+        while not stop.is_set():
+            try:
+                write_articles(random, companies, ARTICLES_PER_UPDATE)
+                sleep(UPDATE_HOLD)
+                db.session.commit()
+                stats["updates"] += 1
+            except OperationalError:
+                db.session.rollback()
+                stats["update_errors"] += 1
+        db.session.remove()
+
+
+def read(app: Flask, stop: threading.Event, latencies: list, errors: list) -> None:
+    """Request the read endpoints in turn until stopped."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session[USER_ID] = 1
+    i = 0
+    while not stop.is_set():
+        method, url, form = READ_ENDPOINTS[i % len(READ_ENDPOINTS)]
+        i = i + 1
+        start = perf_counter()
+        try:
+            response = client.open(url, method=method, data=form)
+            if response.status_code == 200:
+                latencies.append(perf_counter() - start)
+            else:
+                errors.append(response.status_code)
+        except OperationalError as error:
+            errors.append(str(error.orig))
+
+
+def benchmark(mode: str) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_server(os.path.join(directory, "bench.db"), mode)
+        with app.app_context():
+            populate()
+            db.session.remove()
+
+        stop = threading.Event()
+        stats = {"updates": 0, "update_errors": 0}
+        latencies, errors = [], []
+        threads = [threading.Thread(target=update, args=(app, stop, stats))] + [
+            threading.Thread(target=read, args=(app, stop, latencies, errors))
+            for _ in range(READERS)
+        ]
+        for thread in threads:
+            thread.start()
+        sleep(DURATION)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            db.engine.dispose()
+
+    percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "reads_per_s": len(latencies) / DURATION,
+        "read_p50_ms": percentiles[49] * 1000,
+        "read_p95_ms": percentiles[94] * 1000,
+        "read_errors": len(errors),
+        "updates_per_s": stats["updates"] / DURATION,
+        "update_errors": stats["update_errors"],
+    }
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Contention Benchmark")
+        print(BUFFER)
+
+    measurements = {mode: benchmark(mode) for mode in MODES}
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "w") as f:
+        json.dump(measurements, f, indent=2)
+
+    if narrate:
+        print(f"{READERS} readers against one update loop for {DURATION}s per mode")
+        print("Results written to", RESULTS_FILE)
+        print(BUFFER)
+        for mode, result in measurements.items():
+            print(f"Mode: {mode}")
+            for metric, value in result.items():
+                print(f"{metric}: {value:.4f}")
+            print(BUFFER)
+
+    # In WAL mode neither readers nor the update loop may fail with "database is locked"; under the rollback
+    # journal readers blocked for longer than the busy timeout do, which is the contention WAL removes
+    default, wal = measurements["default"], measurements["wal"]
+    results = {
+        "No lock errors in wal mode": (
+            wal["read_errors"] == 0 and wal["update_errors"] == 0,
+            f"Read errors: {wal['read_errors']}, update errors: {wal['update_errors']}",
+        ),
+    }
+    # WAL lets requests read while the update loop writes, which is what the storage mode is for
+    for metric, better in (
+        ("reads_per_s", wal["reads_per_s"] > default["reads_per_s"]),
+        ("read_p95_ms", wal["read_p95_ms"] < default["read_p95_ms"]),
+    ):
+        results[f"WAL improves {metric}"] = (
+            better,
+            f"WAL {metric}: {wal[metric]:.1f}, default: {default[metric]:.1f}",
+        )
+
+    return run_results(results, "Contention Benchmark", show_pass, show_fail, narrate)
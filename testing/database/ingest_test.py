@@ -0,0 +1,144 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import data.interface as interface
+from data.database import (
+    Article,
+    ArticleCompany,
+    Company,
+    CompanySentimentDaily,
+    db,
+)
+from testing.database.unit_of_work_test import FakeApi
+from testing.helpers import BUFFER, make_app, run_results
+
+# url -> its normalized form
+NORMALIZED_URLS = {
+    "https://example.com/news/1": "https://example.com/news/1",
+    "http://Example.com/news/1/": "https://example.com/news/1",
+    "https://example.com/news/1?utm_source=feed&utm_medium=rss": "https://example.com/news/1",
+    "https://example.com/news?b=2&a=1&fbclid=abc#comments": "https://example.com/news?a=1&b=2",
+}
+
+
+class NewsApi(FakeApi):
+    """Every company gets the same news; `tracking` adds tracking parameters to the urls and `delay` is added to
+    their dates."""
+
+    tracking = False
+    delay = timedelta(0)
+
+    @staticmethod
+    def get_news(_name: str) -> list[dict]:
+        suffix = "?utm_source=feed" if NewsApi.tracking else ""
+        return [
+            {
+                "url": f"http://example.com/news/{i}/{suffix}",
+                "headline": f"Headline {i}",
+                "publisher": "Publisher",
+                "date": datetime.now() - timedelta(days=i) + NewsApi.delay,
+                "summary": "Summary",
+                "full_text": "Shares rose sharply. Investors are delighted.",
+            }
+            for i in range(3)
+        ]
+
+
+def refresh(company_id: int) -> None:
+    """Fetch the company's news again, as if it was last scraped long ago."""
+    db.session.get(Company, company_id).last_scraped = datetime(2000, 1, 1)
+    db.session.commit()
+    interface.get_company_articles(company_id)
+
+
+def daily_rollups() -> list[tuple]:
+    return db.session.query(
+        CompanySentimentDaily.company_id,
+        CompanySentimentDaily.day,
+        CompanySentimentDaily.sentiment_sum,
+        CompanySentimentDaily.article_count,
+    ).all()
+
+
+def rebuilt_matches_live() -> tuple[bool, str]:
+    """Whether rebuilding the daily rollups gives the rollups kept up to date when an undated article is added."""
+    CompanySentimentDaily.rebuild()
+    article = Article("https://example.com/undated", "Undated", "Publisher", None, "")
+    article.sentiment = 0.5
+    db.session.add(article)
+    db.session.flush()
+    db.session.get(Company, 1).add_article(article)
+    db.session.commit()
+    live = daily_rollups()
+    CompanySentimentDaily.rebuild()
+    rebuilt = daily_rollups()
+    db.session.rollback()
+    return sorted(live) == sorted(rebuilt), f"Live: {live}, rebuilt: {rebuilt}"
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Ingest Test")
+        print(BUFFER)
+
+    results = {
+        f"Normalize {url}": (
+            Article.normalize_url(url) == expected,
+            f"Normalized: {Article.normalize_url(url)}",
+        )
+        for url, expected in NORMALIZED_URLS.items()
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("ingest", os.path.join(directory, "test.db"))
+        with app.app_context(), NewsApi():
+            db.create_all()
+            db.session.add(Company("Company A", "", "", "", 0, "", None))
+            db.session.add(Company("Company B", "", "", "", 0, "", None))
+            db.session.commit()
+
+            interface.get_company_articles(1)
+            # a known article keeps its score instead of being scored again
+            db.session.get(Article, 1).sentiment = 0.123
+            NewsApi.tracking = True
+            refresh(1)
+            articles = db.session.query(Article).count()
+            company = db.session.get(Company, 1)
+            results["Known urls are not inserted again"] = (
+                articles == 3 and company.article_count == 3,
+                f"Articles: {articles}, company article count: {company.article_count}",
+            )
+            results["Known urls are not scored again"] = (
+                db.session.get(Article, 1).sentiment == 0.123,
+                f"Sentiment: {db.session.get(Article, 1).sentiment}",
+            )
+
+            # another company with the same news only links the stored articles
+            refresh(2)
+            articles = db.session.query(Article).count()
+            links = db.session.query(ArticleCompany).count()
+            results["Shared articles are linked, not duplicated"] = (
+                articles == 3 and links == 6,
+                f"Articles: {articles}, links: {links}",
+            )
+
+            # a story dated differently when seen again keeps the day its sentiment was counted on
+            dates = [date for (date,) in db.session.query(Article.date)]
+            days = db.session.query(CompanySentimentDaily.day).count()
+            NewsApi.delay = timedelta(days=2)
+            refresh(1)
+            new_dates = [date for (date,) in db.session.query(Article.date)]
+            new_days = db.session.query(CompanySentimentDaily.day).count()
+            results["Known articles keep their first date"] = (
+                new_dates == dates and new_days == days,
+                f"Dates: {dates} -> {new_dates}, daily rollups: {days} -> {new_days}",
+            )
+            results["Rebuilt daily rollups match the live ones"] = (
+                rebuilt_matches_live()
+            )
+            NewsApi.tracking = False
+            NewsApi.delay = timedelta(0)
+            db.session.remove()
+            db.engine.dispose()
+
+    return run_results(results, "Ingest Test", show_pass, show_fail, narrate)
@@ -0,0 +1,145 @@
+import os
+import tempfile
+
+from sqlalchemy import text
+
+import data.interface as interface
+from data.database import Article, ArticleCompany, Company, Notification, Stock, db
+from data.migrations import MIGRATIONS, get_version, upgrade_database
+from testing.helpers import BUFFER, make_app, run_results
+
+# The schema of a database created before any migration existed, as `db.create_all()` created it then
+BASELINE_SCHEMA = [
+    """CREATE TABLE "User" (id INTEGER NOT NULL, email VARCHAR, name VARCHAR, password VARCHAR,
+    opt_email BOOLEAN, hard_ready INTEGER, PRIMARY KEY (id), UNIQUE (email))""",
+    """CREATE TABLE "Notification" (id INTEGER NOT NULL, target_id INTEGER, target_type INTEGER,
+    message VARCHAR, PRIMARY KEY (id))""",
+    'CREATE TABLE "Sector" (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id))',
+    """CREATE TABLE "Company" (id INTEGER NOT NULL, name VARCHAR, url VARCHAR, description VARCHAR,
+    location VARCHAR, market_cap INTEGER, ceo VARCHAR, sentiment FLOAT, last_scraped DATETIME,
+    PRIMARY KEY (id))""",
+    """CREATE TABLE "Article" (id INTEGER NOT NULL, url VARCHAR, headline VARCHAR, publisher VARCHAR,
+    date DATETIME, summary VARCHAR, sentiment FLOAT, PRIMARY KEY (id))""",
+    """CREATE TABLE "UserNotification" (user_id INTEGER NOT NULL, notification_id INTEGER NOT NULL,
+    received DATETIME, read BOOLEAN, PRIMARY KEY (user_id, notification_id),
+    FOREIGN KEY(user_id) REFERENCES "User" (id), FOREIGN KEY(notification_id) REFERENCES "Notification" (id))""",
+    """CREATE TABLE "UserSector" (user_id INTEGER NOT NULL, sector_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, sector_id), FOREIGN KEY(user_id) REFERENCES "User" (id),
+    FOREIGN KEY(sector_id) REFERENCES "Sector" (id))""",
+    """CREATE TABLE "CompanySector" (company_id INTEGER NOT NULL, sector_id INTEGER NOT NULL,
+    PRIMARY KEY (company_id, sector_id), FOREIGN KEY(company_id) REFERENCES "Company" (id),
+    FOREIGN KEY(sector_id) REFERENCES "Sector" (id))""",
+    """CREATE TABLE "Stock" (symbol VARCHAR NOT NULL, company_id INTEGER, exchange VARCHAR,
+    market_cap INTEGER, stock_price FLOAT, stock_change FLOAT, stock_day VARCHAR, stock_week VARCHAR,
+    stock_month VARCHAR, stock_year VARCHAR, PRIMARY KEY (symbol),
+    FOREIGN KEY(company_id) REFERENCES "Company" (id))""",
+    """CREATE TABLE "UserCompany" (user_id INTEGER NOT NULL, company_id INTEGER NOT NULL, distance INTEGER,
+    PRIMARY KEY (user_id, company_id), FOREIGN KEY(user_id) REFERENCES "User" (id),
+    FOREIGN KEY(company_id) REFERENCES "Company" (id))""",
+    """CREATE TABLE "Story" (id INTEGER NOT NULL, company_id INTEGER, title VARCHAR, sentiment FLOAT,
+    PRIMARY KEY (id), FOREIGN KEY(company_id) REFERENCES "Company" (id))""",
+    """CREATE TABLE "ArticleCompany" (article_id INTEGER NOT NULL, company_id INTEGER NOT NULL,
+    PRIMARY KEY (article_id, company_id), FOREIGN KEY(article_id) REFERENCES "Article" (id),
+    FOREIGN KEY(company_id) REFERENCES "Company" (id))""",
+    """CREATE TABLE "StoryArticle" (story_id INTEGER NOT NULL, article_id INTEGER NOT NULL,
+    PRIMARY KEY (story_id, article_id), FOREIGN KEY(story_id) REFERENCES "Story" (id),
+    FOREIGN KEY(article_id) REFERENCES "Article" (id))""",
+    """CREATE TABLE "StoryCompany" (stock_id INTEGER NOT NULL, company_id INTEGER NOT NULL,
+    PRIMARY KEY (stock_id, company_id), FOREIGN KEY(stock_id) REFERENCES "Story" (id),
+    FOREIGN KEY(company_id) REFERENCES "Company" (id))""",
+]
+
+# The same article stored three times, as the old ingest could, one other article and two without a url
+BASELINE_ROWS = [
+    """INSERT INTO "Company" VALUES (1, 'Company A', 'a.com', 'Makes things', '', 0, 'CEO', 0.5, NULL),
+    (2, 'Company B', 'b.com', 'Sells things', '', 0, 'CEO', 0.0, NULL)""",
+    """INSERT INTO "Article" VALUES
+    (1, 'https://example.com/news/1', 'Shares rise', 'P', '2024-01-01 10:00:00.000000', 'S', 0.5),
+    (2, 'https://example.com/news/1', 'Shares rise', 'P', '2024-01-01 10:00:00.000000', 'S', 0.5),
+    (3, 'http://example.com/news/1/?utm_source=feed', 'Shares rise', 'P', '2024-01-01 10:00:00.000000', 'S', 0.5),
+    (4, 'https://example.com/news/2', 'Shares fall', 'P', '2024-01-02 10:00:00.000000', 'S', -0.5),
+    (5, NULL, 'Shares steady', 'P', '2024-01-03 10:00:00.000000', 'S', 0.0),
+    (6, '', 'Shares drift', 'P', '2024-01-03 10:00:00.000000', 'S', 0.0)""",
+    'INSERT INTO "ArticleCompany" VALUES (1, 1), (2, 1), (3, 2), (4, 1), (5, 1), (6, 2)',
+    "INSERT INTO \"Notification\" VALUES (1, 3, 2, 'Shares rise')",
+    """INSERT INTO "Stock" VALUES ('AAA', 1, 'X', 0, 11.0, 10.0, '10 11', '10 11', '10 11', '10 11')""",
+]
+
+
+def populate() -> None:
+    """A database in the baseline schema, holding duplicate articles."""
+    for statement in BASELINE_SCHEMA + BASELINE_ROWS:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+
+def url_index_is_unique() -> bool:
+    indexes = db.session.execute(text('PRAGMA index_list("Article")')).all()
+    return any(index[1] == "ix_Article_url" and index[2] for index in indexes)
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Migration Test")
+        print(BUFFER)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("migration", os.path.join(directory, "test.db"))
+        with app.app_context():
+            populate()
+            try:
+                upgrade_database()
+                error = None
+            except Exception as e:
+                error = e
+                db.session.rollback()
+            results = {
+                "Baseline database upgrades": (
+                    error is None,
+                    f"Error: {error}" if error else "",
+                ),
+                "Upgraded to the latest version": (
+                    (version := get_version()) == len(MIGRATIONS),
+                    f"Version: {version} of {len(MIGRATIONS)}",
+                ),
+            }
+            if error is None:
+                urls = (
+                    db.session.query(Article.id, Article.url).order_by(Article.id).all()
+                )
+                links = db.session.query(ArticleCompany.article_id).all()
+                results["Duplicate articles are merged"] = (
+                    urls
+                    == [
+                        (1, "https://example.com/news/1"),
+                        (4, "https://example.com/news/2"),
+                        (5, None),
+                        (6, None),
+                    ],
+                    f"Articles: {urls}",
+                )
+                results["Links move to the kept article"] = (
+                    sorted(links) == [(1,), (1,), (4,), (5,), (6,)],
+                    f"Linked articles: {links}",
+                )
+                results["Notifications move to the kept article"] = (
+                    (target := db.session.get(Notification, 1).target_id) == 1,
+                    f"Target: {target}",
+                )
+                results["Sentiment totals are rebuilt"] = (
+                    (count := db.session.get(Company, 1).article_count) == 3,
+                    f"Company article count: {count}",
+                )
+                results["Url index is unique"] = (url_index_is_unique(), "")
+                results["Search index is built"] = (
+                    len(found := interface.search("shares")["articles"]) == 4,
+                    f"Found: {[article['headline'] for article in found]}",
+                )
+                results["Price series are converted"] = (
+                    len(points := db.session.get(Stock, "AAA").stock_day) == 2,
+                    f"Points: {points}",
+                )
+            db.session.remove()
+            db.engine.dispose()
+
+    return run_results(results, "Migration Test", show_pass, show_fail, narrate)
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from time import perf_counter
+
+from sqlalchemy import func, insert
+
+from data.database import (
+    Company,
+    Notification,
+    User,
+    UserCompany,
+    UserNotification,
+    db,
+)
+from data.interface import add_company_notification
+from testing.helpers import BUFFER, make_app, run_results
+
+BASELINE_FILE = "testing/database/data/notification_bench_baseline.json"
+# Fail if fan-out throughput drops by more than this percentage compared to the baseline
+MAX_REGRESSION = 30
+# Followers of each benchmarked company; every company also has this many / UNFOLLOWED_RATIO unfollowed users
+FOLLOWERS = (1_000, 10_000, 100_000)
+UNFOLLOWED_RATIO = 10
+
+
+def populate() -> list[Company]:
+    """One company per follower count. Users are inserted in bulk, with empty passwords, as hashing 100k passwords
+    would dominate the benchmark."""
+    db.create_all()
+    companies = [Company(f"Company {n}", "", "", "", 0, "", None) for n in FOLLOWERS]
+    db.session.add_all(companies)
+    db.session.flush()
+
+    users = max(FOLLOWERS) + max(FOLLOWERS) // UNFOLLOWED_RATIO
+    db.session.execute(
+        insert(User),
+        [
+            {"email": f"user{i}@example.com", "name": f"User {i}", "password": ""}
+            for i in range(1, users + 1)
+        ],
+    )
+    for company, followers in zip(companies, FOLLOWERS):
+        unfollowed = followers // UNFOLLOWED_RATIO
+        db.session.execute(
+            insert(UserCompany),
+            [
+                {"user_id": i, "company_id": company.id, "distance": -1}
+                for i in range(1, followers + 1)
+            ]
+            + [
+                {"user_id": i, "company_id": company.id, "distance": -2}
+                for i in range(followers + 1, followers + unfollowed + 1)
+            ],
+        )
+    db.session.commit()
+    return companies
+
+
+def benchmark() -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("notification-bench", os.path.join(directory, "bench.db"))
+        with app.app_context():
+            for company, followers in zip(populate(), FOLLOWERS):
+                start = perf_counter()
+                add_company_notification(company, 1.0)
+                elapsed = perf_counter() - start
+
+                notification = (
+                    db.session.query(Notification)
+                    .filter(Notification.target_id == company.id)
+                    .one()
+                )
+                notified = (
+                    db.session.query(func.count())
+                    .select_from(UserNotification)
+                    .filter(UserNotification.notification_id == notification.id)
+                    .scalar()
+                )
+                results[str(followers)] = {
+                    "followers": followers,
+                    "notified": notified,
+                    "seconds": elapsed,
+                    "users_per_sec": notified / elapsed,
+                }
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+def run(show_pass=False, show_fail=True, narrate=True, update_baseline=False):
+    if narrate:
+        print("Starting Notification Benchmark")
+        print(BUFFER)
+
+    measurements = benchmark()
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE) and not update_baseline:
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)
+    else:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(measurements, f, indent=2)
+        if narrate:
+            print("Baseline written to", BASELINE_FILE)
+            print(BUFFER)
+
+    results = {}
+    for size, result in measurements.items():
+        if narrate:
+            print(f"Followers: {result['followers']}")
+            print(f"Fan-out: {result['seconds'] * 1000:.1f}ms")
+            print(f"Throughput: {result['users_per_sec']:.0f} users/sec")
+            print(BUFFER)
+
+        # Exactly the followers are notified; unfollowed users are not
+        results[f"{size} followers are notified"] = (
+            result["notified"] == result["followers"],
+            f"Notified {result['notified']} of {result['followers']} followers",
+        )
+
+        if baseline is None or size not in baseline:
+            continue
+
+        expected = baseline[size]["users_per_sec"]
+        change = (result["users_per_sec"] - expected) / expected * 100
+        results[f"{size} followers throughput"] = (
+            change >= -MAX_REGRESSION,
+            f"Throughput change from baseline: {change:+.1f}% (allowed -{MAX_REGRESSION}%)",
+        )
+
+    return run_results(results, "Notification Benchmark", show_pass, show_fail, narrate)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from random import Random
+
+from sqlalchemy import event
+
+import data.interface as interface
+from data.database import (
+    Article,
+    ArticleCompany,
+    Company,
+    CompanySector,
+    Sector,
+    Stock,
+    db,
+)
+from testing.helpers import BUFFER, make_app, run_results
+
+# Articles per company, and the page sizes each read path is measured at
+ARTICLES = 60
+PAGE_SIZES = (10, 50)
+COMPANIES = 50
+SECTORS = 3
+
+
+def populate() -> None:
+    """Companies in a few sectors, recently scraped, each with many articles shared with other companies."""
+    random = Random(0)
+    db.create_all()
+    db.session.add_all(Sector(f"Sector {i}") for i in range(1, SECTORS + 1))
+    companies = [
+        Company(f"Company {i}", "", "", "", 0, "", datetime.now())
+        for i in range(1, COMPANIES + 1)
+    ]
+    db.session.add_all(companies)
+    db.session.flush()
+    for company in companies:
+        db.session.add(CompanySector(company.id, random.randint(1, SECTORS)))
+        db.session.add(
+            Stock(f"S{company.id}", company.id, "X", 0, 1.0, 0.0, [], [], [], [])
+        )
+        articles = [
+            Article(
+                f"https://example.com/{company.id}/{i}",
+                "Headline",
+                "Publisher",
+                datetime.now() - timedelta(hours=random.randint(0, 1000)),
+                "Summary",
+            )
+            for i in range(ARTICLES)
+        ]
+        db.session.add_all(articles)
+        db.session.flush()
+        for article in articles:
+            linked = random.sample(companies, random.randint(1, 3))
+            for other in {company, *linked}:
+                db.session.add(ArticleCompany(article.id, other.id))
+    db.session.commit()
+
+
+def count_queries(action) -> int:
+    """Number of SQL statements executed by `action`, starting from an empty session."""
+    db.session.remove()
+    statements = []
+
+    def count(*_args):
+        statements.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        action()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    return len(statements)
+
+
+# Read paths, called with a page size, and the most queries each may run. The number of queries must not depend
+# on the page size.
+READ_PATHS = {
+    "Recent articles": (lambda size: interface.recent_articles(size), 2),
+    "Company page articles": (
+        lambda size: interface.get_company_details_by_id(
+            1, 1, load_articles=True, article_count=size
+        ),
+        7,
+    ),
+    "Article by id": (lambda _size: interface.article_by_id(1).to_dict(), 2),
+    "Company list": (
+        lambda size: interface.get_company_details_many(list(range(1, size + 1)), 1),
+        4,
+    ),
+    "Search": (lambda size: interface.search("headline", size), 5),
+}
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Query Count Test")
+        print(BUFFER)
+
+    app = make_app("query-count")
+    results = {}
+    with app.app_context():
+        populate()
+        for name, (read, max_queries) in READ_PATHS.items():
+            counts = [count_queries(lambda: read(size)) for size in PAGE_SIZES]
+            results[name] = (
+                len(set(counts)) == 1 and counts[0] <= max_queries,
+                ", ".join(
+                    f"Queries for {size}: {count}"
+                    for size, count in zip(PAGE_SIZES, counts)
+                )
+                + f" (allowed {max_queries})",
+            )
+        db.session.remove()
+
+    return run_results(results, "Query Count Test", show_pass, show_fail, narrate)
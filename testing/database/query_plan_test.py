@@ -0,0 +1,62 @@
+from sqlalchemy import create_engine, desc, select
+
+from data.database import (
+    Article,
+    ArticleCompany,
+    Company,
+    CompanySector,
+    Stock,
+    UserCompany,
+    UserNotification,
+    db,
+)
+from testing.helpers import BUFFER, run_results
+
+# The hot queries of the app; none of them may scan a whole table
+HOT_QUERIES = {
+    "Articles of a company": select(Article)
+    .join(ArticleCompany, Article.id == ArticleCompany.article_id)
+    .where(ArticleCompany.company_id == 1)
+    .order_by(desc(Article.date)),
+    "Followers of a company": select(UserCompany.user_id).where(
+        UserCompany.company_id == 1, UserCompany.distance == -1
+    ),
+    "Stocks of a company": select(Stock).where(Stock.company_id == 1),
+    "Recent articles": select(Article).order_by(desc(Article.date)).limit(50),
+    "Article by url": select(Article).where(Article.url == "https://example.com"),
+    "Sectors of a company": select(CompanySector).where(CompanySector.company_id == 1),
+    "Notifications of a user": select(UserNotification).where(
+        UserNotification.user_id == 1
+    ),
+    "Company by name": select(Company).where(Company.name == "Example"),
+}
+
+
+def query_plan(connection, statement) -> list[str]:
+    """Return the lines of SQLite's EXPLAIN QUERY PLAN for the statement."""
+    sql = str(
+        statement.compile(connection.engine, compile_kwargs={"literal_binds": True})
+    )
+    return [row[3] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Query Plan Test")
+        print(BUFFER)
+
+    # An empty database with the current schema
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+
+    results = {}
+    with engine.connect() as connection:
+        for name, statement in HOT_QUERIES.items():
+            plan = query_plan(connection, statement)
+            # "SCAN table" without "USING ... INDEX" reads every row of the table
+            scans = [
+                line for line in plan if line.startswith("SCAN") and "INDEX" not in line
+            ]
+            results[name] = (not scans, "\n".join(plan))
+
+    return run_results(results, "Query Plan Test", show_pass, show_fail, narrate)
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from itertools import accumulate
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from sqlalchemy import insert
+
+import data.interface as interface
+from data.database import Article, db
+from testing.helpers import BUFFER, make_app, run_results
+
+BASELINE_FILE = "testing/database/data/search_bench_baseline.json"
+# Fail if a query's latency grows by more than this percentage compared to the baseline
+MAX_REGRESSION = 30
+ARTICLES = 1_000_000
+BATCH = 50_000
+# Words per headline and summary, drawn from a vocabulary with Zipf-distributed frequencies like natural text
+VOCABULARY = 30_000
+HEADLINE_WORDS = 8
+SUMMARY_WORDS = 40
+# Times each query is run; its median latency is reported
+REPEATS = 5
+# Frequency ranks of the words queried: common, medium and rare
+QUERY_RANKS = (20, 1_000, 20_000)
+
+
+def make_vocabulary(random: Random) -> list[str]:
+    """Distinct made-up words of two to four syllables."""
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(random.choices(syllables, k=random.randint(2, 4))))
+    return sorted(words, key=lambda _: random.random())
+
+
+def populate(random: Random, vocabulary: list[str]) -> None:
+    """Articles of random text; inserting them keeps the search index up to date as the app would."""
+    db.create_all()
+    weights = list(accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+    now = datetime.now()
+    for start in range(0, ARTICLES, BATCH):
+        db.session.execute(
+            insert(Article),
+            [
+                {
+                    "url": f"https://example.com/{i}",
+                    "headline": " ".join(
+                        random.choices(
+                            vocabulary, cum_weights=weights, k=HEADLINE_WORDS
+                        )
+                    ),
+                    "publisher": "Publisher",
+                    "date": now - timedelta(minutes=ARTICLES - i),
+                    "summary": " ".join(
+                        random.choices(vocabulary, cum_weights=weights, k=SUMMARY_WORDS)
+                    ),
+                    "sentiment": 0.0,
+                }
+                for i in range(start, start + BATCH)
+            ],
+        )
+    db.session.commit()
+
+
+def make_queries(vocabulary: list[str]) -> list[str]:
+    """Single words, prefixes of them as if still being typed, and pairs of words."""
+    queries = []
+    for rank in QUERY_RANKS:
+        word = vocabulary[rank - 1]
+        queries += [word, word[:3], word[:5]]
+    common, medium, rare = (vocabulary[rank - 1] for rank in QUERY_RANKS)
+    queries += [f"{common} {medium}", f"{medium} {rare[:4]}", f"{common} {common[:3]}"]
+    return queries
+
+
+def benchmark() -> dict:
+    random = Random(0)
+    vocabulary = make_vocabulary(random)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("search-bench", os.path.join(directory, "bench.db"))
+        with app.app_context():
+            start = perf_counter()
+            populate(random, vocabulary)
+            results["populate_seconds"] = perf_counter() - start
+            for query in make_queries(vocabulary):
+                latencies = []
+                for _ in range(REPEATS):
+                    db.session.remove()
+                    start = perf_counter()
+                    found = interface.search(query)
+                    latencies.append(perf_counter() - start)
+                results[query] = {
+                    "hits": len(found["articles"]),
+                    "ms": median(latencies) * 1000,
+                }
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+def run(show_pass=False, show_fail=True, narrate=True, update_baseline=False):
+    if narrate:
+        print("Starting Search Benchmark")
+        print(BUFFER)
+
+    measurements = benchmark()
+    if narrate:
+        print(f"Indexed {ARTICLES} articles in {measurements['populate_seconds']:.1f}s")
+        print(BUFFER)
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE) and not update_baseline:
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)
+    else:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(measurements, f, indent=2)
+        if narrate:
+            print("Baseline written to", BASELINE_FILE)
+            print(BUFFER)
+
+    results = {}
+    for query, result in measurements.items():
+        if query == "populate_seconds":
+            continue
+        if narrate:
+            print(f"Query: {query}")
+            print(f"Latency: {result['ms']:.1f}ms")
+            print(BUFFER)
+
+        # Every query is made of indexed words, so it must find articles
+        results[f"{query} finds articles"] = (
+            result["hits"] > 0,
+            f"Found {result['hits']} articles",
+        )
+
+        if baseline is None or query not in baseline:
+            continue
+
+        expected = baseline[query]["ms"]
+        change = (result["ms"] - expected) / expected * 100
+        results[f"{query} latency"] = (
+            change <= MAX_REGRESSION,
+            f"Latency change from baseline: {change:+.1f}% (allowed +{MAX_REGRESSION}%)",
+        )
+
+    return run_results(results, "Search Benchmark", show_pass, show_fail, narrate)
@@ -0,0 +1,148 @@
+from datetime import datetime
+
+import data.interface as interface
+from data.database import ARTICLE_SEARCH, Article, Company, db
+from testing.helpers import BUFFER, make_app, run_results
+
+# Companies that only pad the index, so that the searched words are rare
+FILLER_COMPANIES = 20
+
+
+def populate() -> None:
+    db.create_all()
+    db.session.add_all(
+        [
+            Company("Orchard Holdings", "", "Farmland", "", 0, "Tim Cook", None),
+            Company("Applied Materials", "", "Chips <and> wafers", "", 0, "Gary", None),
+            Company("Fruit Co", "", "Grows apples in an orchard", "", 0, "Ann", None),
+        ]
+        + [
+            Company(f"Filler {i}", "", "Nothing to see", "", 0, "", None)
+            for i in range(FILLER_COMPANIES)
+        ]
+    )
+    db.session.flush()
+    Article.upsert_many(
+        [
+            {
+                "url": f"https://example.com/{i}",
+                "headline": headline,
+                "publisher": "Publisher",
+                "date": datetime.now(),
+                "summary": "Summary",
+            }
+            for i, headline in enumerate(
+                (
+                    "Chip makers rally",
+                    "Orchard sold",
+                    "Harvest harvest harvest",
+                    "Late harvest report",
+                )
+            )
+        ]
+    )
+    db.session.commit()
+
+
+def company_names(query: str) -> list[str]:
+    return [company["name"] for company in interface.search(query)["companies"]]
+
+
+def article_headlines(query: str) -> list[str]:
+    return [article["headline"] for article in interface.search(query)["articles"]]
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Search Test")
+        print(BUFFER)
+
+    app = make_app("search")
+    with app.app_context():
+        populate()
+        results = {
+            "The last word matches as a prefix": (
+                (names := company_names("appl")) == ["Applied Materials", "Fruit Co"],
+                f"Companies: {names}",
+            ),
+            "Every word must match": (
+                (names := company_names("applied mat")) == ["Applied Materials"],
+                f"Companies: {names}",
+            ),
+            "Names rank above descriptions": (
+                (names := company_names("orchard")) == ["Orchard Holdings", "Fruit Co"],
+                f"Companies: {names}",
+            ),
+            "Articles are searched": (
+                (headlines := article_headlines("chip")) == ["Chip makers rally"],
+                f"Articles: {headlines}",
+            ),
+            "Snippets are escaped and highlighted": (
+                (snippet := interface.search("wafer")["companies"][0]["snippet"])
+                == "Chips &lt;and&gt; <mark>wafers</mark>",
+                f"Snippet: {snippet}",
+            ),
+            "Queries without words find nothing": (
+                (found := interface.search('"*:')) == {"companies": [], "articles": []},
+                f"Found: {found}",
+            ),
+            "Filter by CEO": (
+                (names := [c.name for c in interface.search_companies(ceo="tim")])
+                == ["Orchard Holdings"],
+                f"Companies: {names}",
+            ),
+            "Filters match inside words": (
+                (names := [c.name for c in interface.search_companies(ceo="ook")])
+                == ["Orchard Holdings"],
+                f"Companies: {names}",
+            ),
+            "Every match is ranked": (
+                (headlines := article_headlines("harvest"))
+                == ["Harvest harvest harvest", "Late harvest report"],
+                f"Articles: {headlines}",
+            ),
+            # an older, better match is left out when the candidates are capped
+            "Capped candidates are the latest matches": (
+                (
+                    headlines := [
+                        article.headline
+                        for article, _, _ in ARTICLE_SEARCH.search("harvest", 10, 1)
+                    ]
+                )
+                == ["Late harvest report"],
+                f"Articles: {headlines}",
+            ),
+        }
+
+        # the index follows inserts, updates and deletes
+        db.session.get(Company, 1).name = "Grove Holdings"
+        Article.upsert_many(
+            [
+                {
+                    "url": "https://example.com/0",
+                    "headline": "Semiconductor makers rally",
+                    "publisher": "Publisher",
+                    "date": datetime.now(),
+                    "summary": "Summary",
+                }
+            ]
+        )
+        db.session.delete(db.session.get(Article, 2))
+        db.session.commit()
+        results["Index follows updated companies"] = (
+            (names := company_names("grove")) == ["Grove Holdings"]
+            and company_names("orchard") == ["Fruit Co"],
+            f"Companies: {names}",
+        )
+        results["Index follows upserted articles"] = (
+            (headlines := article_headlines("semi")) == ["Semiconductor makers rally"]
+            and article_headlines("chip") == [],
+            f"Articles: {headlines}",
+        )
+        results["Index follows deleted articles"] = (
+            (headlines := article_headlines("sold")) == [],
+            f"Articles: {headlines}",
+        )
+        db.session.remove()
+
+    return run_results(results, "Search Test", show_pass, show_fail, narrate)
@@ -0,0 +1,168 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import data.api as api
+import data.interface as interface
+from data.database import Company, Sector, Stock, User, UserCompany, db, unit_of_work
+from testing.helpers import BUFFER, make_app, run_results
+
+
+class FakeApi:
+    """Stands in for the network calls of `data.api`, recording whether the database was write locked during any
+    of them."""
+
+    FUNCTIONS = ("get_symbols", "get_stock_info", "get_company_info", "get_news")
+
+    def __init__(self):
+        self.calls = 0
+        self.locked_calls = 0
+        self._originals = {}
+
+    def __enter__(self):
+        for name in FakeApi.FUNCTIONS:
+            self._originals[name] = getattr(api, name)
+            setattr(api, name, self._wrap(getattr(self, name)))
+        return self
+
+    def __exit__(self, *_args):
+        for name, function in self._originals.items():
+            setattr(api, name, function)
+
+    def _wrap(self, function):
+        async def call(*args):
+            self.calls = self.calls + 1
+            # sqlite3 only begins a transaction once something is written
+            if db.session.connection().connection.dbapi_connection.in_transaction:
+                self.locked_calls = self.locked_calls + 1
+            return function(*args)
+
+        return call
+
+    @staticmethod
+    def get_symbols(_name: str) -> list[str]:
+        return ["AAA", "AAB"]
+
+    @staticmethod
+    def get_stock_info(_symbol: str) -> dict:
+        now = datetime.now().timestamp()
+        series = [(now - 3600, 10.0), (now, 11.0)]
+        return {
+            "stock_day": series,
+            "stock_week": series,
+            "stock_month": series,
+            "stock_year": series,
+            "market_cap": 1000,
+            "exchange": "X",
+        }
+
+    @staticmethod
+    def get_company_info(symbol: str) -> dict:
+        return {
+            "name": f"Company {symbol}",
+            "url": "",
+            "description": "",
+            "location": "",
+            "market_cap": 1000,
+            "ceo": "",
+            "sector": "Technology",
+        }
+
+    @staticmethod
+    def get_news(name: str) -> list[dict]:
+        return [
+            {
+                "url": f"https://example.com/{name}/{i}",
+                "headline": "Headline",
+                "publisher": "Publisher",
+                "date": datetime.now() - timedelta(days=i),
+                "summary": "Summary",
+                "full_text": "Shares rose sharply. Investors are delighted.",
+            }
+            for i in range(3)
+        ]
+
+
+def count_commits(action) -> int:
+    """Number of transactions committed by `action`."""
+    commits = []
+
+    def count(*_args):
+        commits.append(1)
+
+    event.listen(db.engine, "commit", count)
+    try:
+        action()
+    finally:
+        event.remove(db.engine, "commit", count)
+    return len(commits)
+
+
+def populate() -> None:
+    """A followed company with one stock, last scraped long ago."""
+    db.create_all()
+    company = Company("Company AAA", "", "", "", 0, "", datetime(2000, 1, 1))
+    db.session.add(company)
+    db.session.add(User("user@example.com", "User", ""))
+    db.session.flush()
+    db.session.add(Stock("AAA", company.id, "X", 0, 1.0, 0.0, [], [], [], []))
+    db.session.add(UserCompany(1, company.id, -1))
+    db.session.commit()
+
+
+def rolled_back() -> bool:
+    """A unit of work that raises leaves nothing behind, including its nested units."""
+    try:
+        with unit_of_work():
+            db.session.add(Sector("Rolled back"))
+            with unit_of_work():
+                db.session.add(Sector("Nested"))
+            raise ValueError
+    except ValueError:
+        pass
+    return db.session.query(Sector).count() == 0
+
+
+def nested_commits() -> int:
+    def action():
+        with unit_of_work():
+            db.session.add(Sector("Outer"))
+            with unit_of_work():
+                db.session.add(Sector("Inner"))
+
+    return count_commits(action)
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Unit of Work Test")
+        print(BUFFER)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("unit-of-work", os.path.join(directory, "test.db"))
+        with app.app_context(), FakeApi() as fake:
+            populate()
+            results = {
+                "Rollback": (rolled_back(), ""),
+                "Nested units commit once": (
+                    (commits := nested_commits()) == 1,
+                    f"Commits: {commits}",
+                ),
+            }
+            commits = count_commits(lambda: interface.update_company_info(1))
+            results["Company refresh commits once"] = (
+                commits == 1,
+                f"Commits: {commits}",
+            )
+            commits = count_commits(lambda: interface.add_company("AAC"))
+            results["New company commits once"] = (commits == 1, f"Commits: {commits}")
+            results["No api call while the database is write locked"] = (
+                fake.calls > 0 and fake.locked_calls == 0,
+                f"Locked api calls: {fake.locked_calls} of {fake.calls}",
+            )
+            db.session.remove()
+            db.engine.dispose()
+
+    return run_results(results, "Unit of Work Test", show_pass, show_fail, narrate)
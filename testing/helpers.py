@@ -0,0 +1,61 @@
+from flask import Flask
+
+from data.database import db
+from server import constants
+from server.app import configure_database
+
+BUFFER = "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
+
+
+def make_app(name: str, path: str = None, mode: str = constants.SQLITE_MODE) -> Flask:
+    """Flask app for a test. With a `path`, its database is stored there and configured as the server configures
+    it (in the given storage mode); otherwise it is an empty in-memory database."""
+    app = Flask(name)
+    if path is None:
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        db.init_app(app)
+    else:
+        configure_database(app, path, mode)
+    return app
+
+
+def run_results(
+    results: dict[str, tuple[bool, str]],
+    title: str,
+    show_pass=False,
+    show_fail=True,
+    narrate=True,
+) -> tuple[int, int]:
+    """Print the outcome of named test results, each a (passed, detail) pair, then the totals of the test called
+    `title`. Returns (fails, tests)."""
+    fails = 0
+    tests = 0
+    for name, (passed, detail) in results.items():
+        tests = tests + 1
+        if passed:
+            if show_pass:
+                print("\033[092m", end="")  # Green
+                print("Test Passed")
+                print("Test: ", name)
+                if detail:
+                    print(detail)
+                print("\033[0m", end="")
+                print(BUFFER)
+        else:
+            if show_fail:
+                print("\033[091m", end="")  # Red
+                print("Test Failed")
+                print("Test: ", name)
+                if detail:
+                    print(detail)
+                print("\033[0m", end="")
+                print(BUFFER)
+            fails = fails + 1
+
+    if narrate:
+        print(f"End of {title}")
+        print("Total Fails: ", fails)
+        print("Total Tests: ", tests)
+
+    return fails, tests
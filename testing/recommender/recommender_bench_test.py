@@ -0,0 +1,277 @@
+import json
+import os
+import tempfile
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter
+
+from sqlalchemy import insert
+
+from data.database import (
+    Company,
+    CompanySector,
+    Sector,
+    User,
+    UserCompany,
+    UserSector,
+    db,
+)
+from data.recommender import (
+    fit_model,
+    interactions,
+    precompute_recommendations,
+    registry,
+    sector_index,
+)
+from server import constants
+from testing.helpers import BUFFER, make_app, run_results
+
+RESULTS_FILE = "testing/recommender/data/recommender_bench_results.json"
+BASELINE_FILE = "testing/recommender/data/recommender_bench_baseline.json"
+# Fail if precision@k or recall@k drops by more than this (absolute) compared to the baseline
+MAX_QUALITY_DROP = 0.05
+# Synthetic population, by default
+USERS = 20_000
+COMPANIES = 2_000
+SECTORS = 15
+# Follows per user (before holding out), and the share of them in the user's own sectors
+FOLLOWS = (8, 25)
+IN_SECTOR = 0.8
+# Share of each user's follows that is later unfollowed, and share of the rest that is held out for evaluation
+UNFOLLOWED = 0.1
+HELD_OUT = 0.2
+K = 10
+# Users whose recommendations are evaluated, drawn at random from the population
+EVALUATED = 2_000
+
+
+def make_population(
+    users: int, companies: int, seed: int = 0
+) -> tuple[dict, dict, dict, dict]:
+    """Return (company sectors, user sectors, training feedback, held out follows). Users mostly follow companies
+    in their own sectors; a few of their follows are unfollowed again."""
+    random = Random(seed)
+    company_sectors = {
+        company: random.sample(range(1, SECTORS + 1), random.choice((1, 1, 2)))
+        for company in range(1, companies + 1)
+    }
+    by_sector = {sector: [] for sector in range(1, SECTORS + 1)}
+    for company, sectors in company_sectors.items():
+        for sector in sectors:
+            by_sector[sector].append(company)
+
+    user_sectors, feedback, held_out = {}, {}, {}
+    for user in range(1, users + 1):
+        sectors = random.sample(range(1, SECTORS + 1), random.randint(1, 3))
+        candidates = sorted({c for sector in sectors for c in by_sector[sector]})
+        follows = set()
+        for _ in range(random.randint(*FOLLOWS)):
+            pool = (
+                candidates if random.random() < IN_SECTOR else range(1, companies + 1)
+            )
+            follows.add(random.choice(pool))
+        follows = sorted(follows)
+        random.shuffle(follows)
+
+        unfollowed = follows[: int(len(follows) * UNFOLLOWED)]
+        followed = follows[len(unfollowed) :]
+        held = max(int(len(followed) * HELD_OUT), 1)
+        user_sectors[user] = sectors
+        held_out[user] = set(followed[:held])
+        feedback[user] = {c: -1 for c in followed[held:]} | {c: -2 for c in unfollowed}
+    return company_sectors, user_sectors, feedback, held_out
+
+
+def populate(company_sectors: dict, user_sectors: dict, feedback: dict) -> float:
+    """Fill the scratch database, returning the time spent preparing soft recommendations (loading the sector
+    index). Rows are inserted in bulk, as constructing a User hashes its password."""
+    db.session.execute(
+        insert(Sector),
+        [{"id": i, "name": f"Sector {i}"} for i in range(1, SECTORS + 1)],
+    )
+    db.session.execute(
+        insert(Company), [{"id": i, "name": f"Company {i}"} for i in company_sectors]
+    )
+    db.session.execute(
+        insert(User),
+        [
+            # every synthetic user has enough activity
+            {
+                "id": i,
+                "email": f"user{i}@example.com",
+                "name": f"User {i}",
+                "hard_ready": 0,
+            }
+            for i in user_sectors
+        ],
+    )
+    db.session.execute(
+        insert(CompanySector),
+        [
+            {"company_id": company, "sector_id": sector}
+            for company, sectors in company_sectors.items()
+            for sector in sectors
+        ],
+    )
+    db.session.execute(
+        insert(UserSector),
+        [
+            {"user_id": user, "sector_id": sector}
+            for user, sectors in user_sectors.items()
+            for sector in sectors
+        ],
+    )
+    db.session.execute(
+        insert(UserCompany),
+        [
+            {"user_id": user, "company_id": company, "distance": distance}
+            for user, companies in feedback.items()
+            for company, distance in companies.items()
+        ],
+    )
+    db.session.commit()
+
+    start = perf_counter()
+    sector_index.load()
+    return perf_counter() - start
+
+
+def evaluate(recommend, held_out: dict) -> dict:
+    """Precision@K, recall@K and latency of `recommend(user) -> company ids` over every user."""
+    precision, recall, latencies = [], [], []
+    for user_id, expected in held_out.items():
+        user = db.session.get(User, user_id)
+        start = perf_counter()
+        recommended = [int(c) for c in recommend(user)][:K]
+        latencies.append(perf_counter() - start)
+        hits = len(expected.intersection(recommended))
+        precision.append(hits / K)
+        recall.append(hits / len(expected))
+    percentiles = quantiles(latencies, n=100)
+    return {
+        f"precision@{K}": mean(precision),
+        f"recall@{K}": mean(recall),
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+    }
+
+
+def benchmark(users: int, companies: int) -> dict:
+    company_sectors, user_sectors, feedback, held_out = make_population(
+        users, companies
+    )
+    sample = Random(0).sample(sorted(held_out), min(EVALUATED, len(held_out)))
+    evaluated = {user: held_out[user] for user in sample}
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("recommender-bench", os.path.join(directory, "bench.db"))
+        registry.switch(os.path.join(directory, "rec_model.npz"))
+        try:
+            with app.app_context():
+                db.create_all()
+                soft_setup = populate(company_sectors, user_sectors, feedback)
+
+                start = perf_counter()
+                fit_model()
+                training = perf_counter() - start
+                model, _ = registry.get()
+                start = perf_counter()
+                precompute_recommendations()
+                precompute = perf_counter() - start
+
+                soft = evaluate(
+                    lambda user: [uc.company_id for uc in user.soft_recommend(K)],
+                    evaluated,
+                )
+                hard = evaluate(lambda user: user.hard_recommend(K), evaluated)
+                db.session.remove()
+            registry.flush()
+        finally:
+            # the app's own data is loaded again on first use
+            registry.switch(constants.REC_MODEL_PATH)
+            interactions.clear()
+            sector_index.clear()
+
+    soft["setup_s"] = soft_setup
+    hard["training_s"] = training
+    hard["precompute_s"] = precompute
+    hard["model_mb"] = (model.user_factors.nbytes + model.item_factors.nbytes) / 2**20
+    return {
+        "population": {
+            "users": users,
+            "companies": companies,
+            "sectors": SECTORS,
+            "interactions": sum(len(f) for f in feedback.values()),
+            "held_out": sum(len(h) for h in held_out.values()),
+            "evaluated": len(evaluated),
+        },
+        "soft": soft,
+        "hard": hard,
+    }
+
+
+def run(
+    show_pass=False,
+    show_fail=True,
+    narrate=True,
+    update_baseline=False,
+    users=USERS,
+    companies=COMPANIES,
+):
+    if narrate:
+        print("Starting Recommender Benchmark")
+        print(BUFFER)
+
+    measurements = benchmark(users, companies)
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "w") as f:
+        json.dump(measurements, f, indent=2)
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE) and not update_baseline:
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)
+        # quality depends on the population, so only the same population is compared
+        if baseline["population"] != measurements["population"]:
+            baseline = None
+            if narrate:
+                print(
+                    "Baseline population differs, not compared; use --update-baseline"
+                )
+                print(BUFFER)
+    else:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(measurements, f, indent=2)
+        if narrate:
+            print("Baseline written to", BASELINE_FILE)
+            print(BUFFER)
+
+    if narrate:
+        population = measurements["population"]
+        print(
+            f"Population: {population['users']} users, {population['companies']} companies, "
+            f"{population['interactions']} interactions, {population['held_out']} held out, "
+            f"{population['evaluated']} users evaluated"
+        )
+        print("Results written to", RESULTS_FILE)
+        print(BUFFER)
+
+    results = {}
+    for path in ("soft", "hard"):
+        result = measurements[path]
+        if narrate:
+            print(f"Path: {path}")
+            for metric, value in result.items():
+                print(f"{metric}: {value:.4f}")
+            print(BUFFER)
+
+        if baseline is None:
+            continue
+
+        for metric in (f"precision@{K}", f"recall@{K}"):
+            change = result[metric] - baseline[path][metric]
+            results[f"{path} {metric}"] = (
+                change >= -MAX_QUALITY_DROP,
+                f"{metric} change from baseline: {change:+.4f} (allowed -{MAX_QUALITY_DROP})",
+            )
+
+    return run_results(results, "Recommender Benchmark", show_pass, show_fail, narrate)
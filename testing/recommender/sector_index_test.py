@@ -0,0 +1,78 @@
+from data.database import Company, CompanySector, Sector, db
+from data.recommender import sector_index
+from testing.helpers import BUFFER, make_app, run_results
+
+
+def populate() -> None:
+    db.create_all()
+    db.session.add_all([Sector("Technology"), Sector("Energy")])
+    db.session.add_all(
+        [
+            Company("Company A", "", "", "", 0, "", None),
+            Company("Company B", "", "", "", 0, "", None),
+        ]
+    )
+    db.session.flush()
+    db.session.add_all([CompanySector(1, 1), CompanySector(2, 2)])
+    db.session.commit()
+
+
+def add_company(name: str, sector_id: int, commit: bool) -> int:
+    """Create a company in a sector directly through the session, as the scraper and update paths do."""
+    company = Company(name, "", "", "", 0, "", None)
+    db.session.add(company)
+    db.session.flush()
+    db.session.add(CompanySector(company.id, sector_id))
+    company_id = company.id
+    if commit:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return company_id
+
+
+def recommended(sector_ids: list[int]) -> list[int]:
+    return [company_id for company_id, _ in sector_index.recommend(sector_ids, [], 10)]
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Sector Index Test")
+        print(BUFFER)
+
+    app = make_app("sector-index")
+    try:
+        with app.app_context():
+            populate()
+            sector_index.load()
+            # a company already indexed, in a sector already indexed
+            db.session.add(CompanySector(1, 2))
+            db.session.commit()
+            results = {
+                "Committed sectors are added": (
+                    (found := sector_index.recommend([1, 2], [], 1)) == [(1, 0)],
+                    f"Recommended: {found}",
+                ),
+            }
+            loaded = sector_index._sectors
+            sector_index.add(2, 1)
+            results["Readers keep an unchanged copy"] = (
+                not loaded[2, 1] and sector_index._sectors[2, 1],
+                f"Loaded matrix: {loaded.tolist()}",
+            )
+            added = add_company("Company C", 2, commit=True)
+            results["Committed companies are added"] = (
+                added in (companies := recommended([2])),
+                f"Recommended: {companies}",
+            )
+            rolled_back = add_company("Company D", 1, commit=False)
+            results["Rolled back companies are not added"] = (
+                rolled_back not in (companies := recommended([1])),
+                f"Recommended: {companies}",
+            )
+            db.session.remove()
+    finally:
+        # the app's own sectors are loaded again on first use
+        sector_index.clear()
+
+    return run_results(results, "Sector Index Test", show_pass, show_fail, narrate)
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import threading
+
+from data.database import Company, User, UserCompany, db
+from data.recommender import interactions, partial_fit, registry, sector_index
+from server import constants
+from testing.helpers import BUFFER, make_app, run_results
+
+# Companies, and the companies each user follows
+COMPANIES = 4
+FOLLOWS = {1: (1, 2), 2: (2, 3)}
+# Activity of a user due for retraining
+ACTIVITY = 6
+
+
+def populate() -> None:
+    db.create_all()
+    db.session.add_all(
+        Company(f"Company {i}", "", "", "", 0, "", None)
+        for i in range(1, COMPANIES + 1)
+    )
+    db.session.add_all(
+        User(f"user{user}@example.com", f"User {user}", "") for user in FOLLOWS
+    )
+    db.session.flush()
+    db.session.add_all(
+        UserCompany(user, company, -1)
+        for user, companies in FOLLOWS.items()
+        for company in companies
+    )
+    for user in db.session.query(User):
+        user.hard_ready = ACTIVITY
+    db.session.commit()
+
+
+def in_thread(app, action) -> None:
+    """Run `action` in another thread, with its own session, as a concurrent request would."""
+
+    def target():
+        with app.app_context():
+            action()
+            db.session.remove()
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def activity(user_id: int) -> int:
+    db.session.expire_all()
+    return db.session.get(User, user_id).hard_ready
+
+
+def follow_while_training(app) -> int:
+    """Activity of a user who follows a company while being retrained."""
+    copy = registry.copy
+
+    def copy_and_follow():
+        in_thread(app, lambda: db.session.get(User, 1).add_company(3))
+        return copy()
+
+    registry.copy = copy_and_follow
+    try:
+        partial_fit([1])
+    finally:
+        registry.copy = copy
+    return activity(1)
+
+
+def follow_after_reset(app) -> int:
+    """Activity of a user who follows a company, loaded before the training worker reset their activity."""
+    user = db.session.get(User, 2)
+    in_thread(app, lambda: partial_fit([2]))
+    user.add_company(4)
+    return activity(2)
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Training Test")
+        print(BUFFER)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app("training", os.path.join(directory, "test.db"))
+        registry.switch(os.path.join(directory, "rec_model.npz"))
+        try:
+            with app.app_context():
+                populate()
+                results = {
+                    "Follows made while training are kept": (
+                        (count := follow_while_training(app)) == 1,
+                        f"Activity: {count}",
+                    ),
+                    "Follows of stale users are counted": (
+                        (count := follow_after_reset(app)) == 1,
+                        f"Activity: {count}",
+                    ),
+                }
+                db.session.remove()
+                db.engine.dispose()
+            registry.flush()
+        finally:
+            # the app's own data is loaded again on first use
+            registry.switch(constants.REC_MODEL_PATH)
+            interactions.clear()
+            sector_index.clear()
+
+    return run_results(results, "Training Test", show_pass, show_fail, narrate)
@@ -0,0 +1,62 @@
+import subprocess
+import sys
+from statistics import median
+
+from testing.helpers import BUFFER, run_results
+
+# Maximum time (seconds) a cold `import main` may take - this is the work `python main.py` does before the app
+# is created
+STARTUP_BUDGET = 2.0
+# Number of fresh interpreters timed; the median is compared against the budget
+RUNS = 3
+# Modules that must only be imported on first use
+LAZY_MODULES = [
+    "nltk",
+    "scipy",
+    "sklearn",
+    "pandas",
+    "implicit",
+    "joblib",
+    "newspaper",
+    "yfinance",
+]
+
+TIMING_SCRIPT = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import main
+print(perf_counter() - start)
+print(",".join(sorted(m for m in sys.modules if m.split(".")[0] in sys.argv[1:])))
+"""
+
+
+def run(show_pass=False, show_fail=True, narrate=True):
+    if narrate:
+        print("Starting Startup Test")
+        print(BUFFER)
+
+    times = []
+    eager = set()
+    for _ in range(RUNS):
+        output = subprocess.run(
+            [sys.executable, "-c", TIMING_SCRIPT, *LAZY_MODULES],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+        times.append(float(output[0]))
+        eager.update(m.split(".")[0] for m in output[1].split(",") if m)
+
+    results = {
+        "Cold import time": (
+            median(times) <= STARTUP_BUDGET,
+            f"{median(times):.3f}s (budget {STARTUP_BUDGET}s)",
+        ),
+        "Lazy modules": (
+            len(eager) == 0,
+            "imported at start-up: " + (", ".join(sorted(eager)) or "none"),
+        ),
+    }
+
+    return run_results(results, "Startup Test", show_pass, show_fail, narrate)
@@ -0,0 +1,11 @@
+# Download the NLTK resources used for sentiment analysis into the bundled data/nltk_data folder,
+# so the application can start with NLTK_OFFLINE=true and no network access. Both sentence tokenizer
+# packages are bundled, as older NLTK versions read 'punkt' and newer ones 'punkt_tab'.
+# Run from the repository root with `python -m util.download_nltk_data`.
+from nltk import download as nltk_download
+
+from analysis.analysis import NLTK_DATA_PATH, NLTK_RESOURCES
+
+if __name__ == "__main__":
+    for package in NLTK_RESOURCES:
+        nltk_download(package, download_dir=NLTK_DATA_PATH)